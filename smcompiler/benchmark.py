@@ -0,0 +1,325 @@
+"""
+Benchmarks of the SMC protocol, swept over the size of the circuits and compared to a baseline.
+
+Run `python benchmark.py parties multiplications --output results.json` to run two sweeps and store
+their results, and `python benchmark.py --baseline results.json` to compare all the sweeps with them.
+
+Each point of a sweep simulates all the parties in this process, see simulator.py, so no server is
+started. The circuit of a point is built again for each run, and the time of a run includes the
+compilation of its program and the generation of its triplets. The first runs of a point are a warm-up and are not measured. The measurements are stored
+as JSON with the environment of the run, and a later run compared with them reports the points
+which became slower, exchange more bytes or take more rounds.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from expression import Expression, Scalar, Secret, sum_of
+from instrumentation import round_phase
+from protocol import ProtocolSpec
+from secret_sharing import Share, np
+from simulator import simulate
+
+
+# Version of the format of the stored results.
+FORMAT_VERSION = 1
+# Time in seconds after which a run is considered stuck.
+RUN_TIMEOUT = 600.0
+# Relative increase of a measurement over the baseline reported as a regression.
+DEFAULT_TOLERANCE = 0.25
+
+# The circuits of the sweeps other than "parties" are computed by three parties.
+PARTIES = ("Alice", "Bob", "Charlie")
+
+
+class Circuit(NamedTuple):
+    """
+    Computation of a benchmark point: its protocol, the secrets of each party and the expected result.
+    """
+    protocol_spec: ProtocolSpec
+    value_dicts: Dict[str, Dict[Secret, int]]
+    expected: int
+
+
+class Measurement(NamedTuple):
+    """
+    Measurements of a benchmark point over its repeated runs.
+
+    Attributes:
+        sweep: Name of the sweep
+        parameter: Size of the circuit in the sweep, e.g. its number of multiplications
+        times: Wall-clock time in seconds of each measured run
+        median_time: Median of the times
+        min_time: Minimum of the times
+        bytes_sent: Bytes sent by the party sending the most, in the last run
+        bytes_received: Bytes received by the party receiving the most, in the last run
+        rounds: Number of opening rounds of the Beaver multiplications
+    """
+    sweep: str
+    parameter: int
+    times: List[float]
+    median_time: float
+    min_time: float
+    bytes_sent: int
+    bytes_received: int
+    rounds: int
+
+
+class Regression(NamedTuple):
+    """
+    Measurement of a benchmark point worse than the one of the baseline.
+    """
+    sweep: str
+    parameter: int
+    metric: str
+    baseline: float
+    value: float
+
+    def __str__(self):
+        return f"{self.sweep}[{self.parameter}] {self.metric}: {self.baseline:g} -> {self.value:g}"
+
+
+def spread(secrets: Sequence[Secret], values: Sequence[int]) -> Dict[str, Dict[Secret, int]]:
+    """
+    Secrets held by the three parties in turn, with the given values.
+    """
+    value_dicts: Dict[str, Dict[Secret, int]] = {party: {} for party in PARTIES}
+    for i, (secret, value) in enumerate(zip(secrets, values)):
+        value_dicts[PARTIES[i % len(PARTIES)]][secret] = value
+    return value_dicts
+
+
+def circuit(expr: Expression, value_dicts: Dict[str, Dict[Secret, int]], expected: int) -> Circuit:
+    """Circuit computing the expression with the secrets of the given parties."""
+    return Circuit(ProtocolSpec(list(value_dicts), expr), value_dicts, expected % Share.prime)
+
+
+def parties_circuit(count: int) -> Circuit:
+    """Sum of one secret per party."""
+    secrets = [Secret() for _ in range(count)]
+    value_dicts = {f"party{i}": {secret: i + 1} for i, secret in enumerate(secrets)}
+    return circuit(sum_of(secrets), value_dicts, count * (count + 1) // 2)
+
+
+def additions_circuit(count: int) -> Circuit:
+    """Sum of count + 1 secrets."""
+    secrets = [Secret() for _ in range(count + 1)]
+    return circuit(sum_of(secrets), spread(secrets, [1] * len(secrets)), count + 1)
+
+
+def multiplications_circuit(count: int) -> Circuit:
+    """Sum of count independent products of secrets, computed in a single round."""
+    secrets = [Secret() for _ in range(2 * count)]
+    expr = sum_of(secrets[2 * i] * secrets[2 * i + 1] for i in range(count))
+    return circuit(expr, spread(secrets, [2, 3] * count), 6 * count)
+
+
+def depth_circuit(count: int) -> Circuit:
+    """Sequence of count products, each one using the result of the previous one."""
+    secrets = [Secret() for _ in range(count + 1)]
+    # The scalar added after each product prevents the rebalancing of the chain of products.
+    expr: Expression = secrets[0]
+    for secret in secrets[1:]:
+        expr = expr * secret + Scalar(1)
+    return circuit(expr, spread(secrets, [1] * len(secrets)), count + 1)
+
+
+def scalar_additions_circuit(count: int) -> Circuit:
+    """Sum of three secrets plus count scalars."""
+    secrets = [Secret() for _ in PARTIES]
+    expr: Expression = sum_of(secrets)
+    for _ in range(count):
+        expr = expr + Scalar(5)
+    return circuit(expr, spread(secrets, [3, 14, 3]), 20 + 5 * count)
+
+
+def scalar_multiplications_circuit(count: int) -> Circuit:
+    """Sum of three secrets multiplied count times by a scalar."""
+    secrets = [Secret() for _ in PARTIES]
+    expr: Expression = sum_of(secrets)
+    for _ in range(count):
+        expr = expr * Scalar(5)
+    return circuit(expr, spread(secrets, [3, 14, 3]), 20 * pow(5, count, Share.prime))
+
+
+# Circuit builder and default parameters of each sweep.
+SWEEPS: Dict[str, Tuple[Callable[[int], Circuit], Tuple[int, ...]]] = {
+    "parties": (parties_circuit, (3, 10, 50, 100)),
+    "additions": (additions_circuit, (10, 100, 1000)),
+    "multiplications": (multiplications_circuit, (10, 100, 1000)),
+    "depth": (depth_circuit, (1, 5, 10, 20)),
+    "scalar_additions": (scalar_additions_circuit, (10, 100, 1000)),
+    "scalar_multiplications": (scalar_multiplications_circuit, (10, 100, 1000)),
+}
+
+
+def measure(
+        sweep: str,
+        parameter: int,
+        repeat: int = 5,
+        warmup: int = 1
+    ) -> Measurement:
+    """
+    Run a benchmark point warmup + repeat times, checking the result of each run.
+    """
+    build = SWEEPS[sweep][0]
+    times = []
+    for run in range(warmup + repeat):
+        point = build(parameter)
+        started = time.perf_counter()
+        simulation = simulate(point.protocol_spec, point.value_dicts, timeout=RUN_TIMEOUT)
+        elapsed = time.perf_counter() - started
+        if set(simulation.results.values()) != {point.expected}:
+            raise ValueError(f"{sweep}[{parameter}] computed {simulation.results}, expected {point.expected}")
+        if run >= warmup:
+            times.append(elapsed)
+
+    metrics = list(simulation.metrics.values())
+    rounds = 0
+    while round_phase(rounds + 1) in metrics[0].phases:
+        rounds += 1
+    return Measurement(
+        sweep,
+        parameter,
+        times,
+        statistics.median(times),
+        min(times),
+        max(m.bytes_sent for m in metrics),
+        max(m.bytes_received for m in metrics),
+        rounds
+    )
+
+
+def environment(repeat: int, warmup: int) -> Dict[str, Optional[str]]:
+    """
+    Metadata of the environment of a benchmark run, to tell apart results of different setups.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": str(os.cpu_count()),
+        "numpy": None if np is None else np.__version__,
+        "repeat": str(repeat),
+        "warmup": str(warmup),
+    }
+
+
+def save_results(path: str, measurements: List[Measurement], metadata: Dict[str, Optional[str]]) -> None:
+    """
+    Write measurements and the metadata of their environment as JSON.
+    """
+    results = {
+        "format": FORMAT_VERSION,
+        "environment": metadata,
+        "measurements": [measurement._asdict() for measurement in measurements],
+    }
+    with open(path, "w", encoding="UTF-8") as file:
+        json.dump(results, file, indent=2)
+
+
+def load_results(path: str) -> List[Measurement]:
+    """
+    Measurements written by save_results.
+    """
+    with open(path, encoding="UTF-8") as file:
+        results = json.load(file)
+    if results.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported format of benchmark results: {results.get('format')}")
+    return [Measurement(**measurement) for measurement in results["measurements"]]
+
+
+def compare(
+        measurements: List[Measurement],
+        baseline: List[Measurement],
+        tolerance: float = DEFAULT_TOLERANCE
+    ) -> List[Regression]:
+    """
+    Measurements worse than the ones of the same points of the baseline. The median time and the
+    bytes regress beyond the relative tolerance, the number of rounds as soon as it increases.
+    Points missing from the baseline are not compared.
+    """
+    baseline_points = {(m.sweep, m.parameter): m for m in baseline}
+    regressions = []
+    for measurement in measurements:
+        reference = baseline_points.get((measurement.sweep, measurement.parameter))
+        if reference is None:
+            continue
+        for metric, limit in (
+                ("median_time", reference.median_time * (1 + tolerance)),
+                ("bytes_sent", reference.bytes_sent * (1 + tolerance)),
+                ("bytes_received", reference.bytes_received * (1 + tolerance)),
+                ("rounds", reference.rounds)
+            ):
+            value = getattr(measurement, metric)
+            if value > limit:
+                regressions.append(Regression(
+                    measurement.sweep, measurement.parameter, metric, getattr(reference, metric), value
+                ))
+    return regressions
+
+
+def main(args: List[str]) -> int:
+    """
+    Entrypoint of the program. Returns 1 if a regression is found, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the SMC protocol.")
+    parser.add_argument("sweeps", nargs="*", help=f"sweeps to run among {', '.join(SWEEPS)} (default: all)")
+    parser.add_argument("--parameters", type=lambda s: [int(p) for p in s.split(",")],
+                        help="comma-separated sizes of the circuits, instead of the defaults of the sweeps")
+    parser.add_argument("--repeat", type=int, default=5, help="measured runs per point")
+    parser.add_argument("--warmup", type=int, default=1, help="runs per point before the measured ones")
+    parser.add_argument("--output", help="JSON file to which the results are written")
+    parser.add_argument("--baseline", help="JSON file of results to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative increase reported as a regression")
+    options = parser.parse_args(args)
+    unknown = [sweep for sweep in options.sweeps if sweep not in SWEEPS]
+    if unknown:
+        parser.error(f"unknown sweeps: {', '.join(unknown)}")
+
+    measurements = []
+    for sweep in options.sweeps or list(SWEEPS):
+        for parameter in options.parameters or SWEEPS[sweep][1]:
+            measurement = measure(sweep, parameter, options.repeat, options.warmup)
+            measurements.append(measurement)
+            print(
+                f"{sweep}[{parameter}]: {measurement.median_time:.3f} s median, "
+                f"{measurement.bytes_sent} B sent, {measurement.rounds} rounds"
+            )
+
+    if options.output is not None:
+        save_results(options.output, measurements, environment(options.repeat, options.warmup))
+
+    if options.baseline is None:
+        return 0
+    regressions = compare(measurements, load_results(options.baseline), options.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
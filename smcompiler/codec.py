@@ -0,0 +1,105 @@
+"""
+Binary encoding of the messages exchanged by the clients and the server.
+
+- Shares are packed as fixed-width big-endian field elements, concatenated for several shares.
+  The width is the one of the prime of the field, e.g. 8 bytes for MERSENNE_61.
+- Messages indexed by a key, e.g. by sender, are encoded as frames: the length of the key and the
+  key, then the length of the message and the message, each length on 4 big-endian bytes.
+
+The server answers with the binary encoding to the requests accepting BINARY_CONTENT_TYPE, and with
+JSON otherwise.
+"""
+
+import struct
+from typing import Dict, Iterable, List
+
+from secret_sharing import Share, np
+
+
+BINARY_CONTENT_TYPE = "application/octet-stream"
+JSON_CONTENT_TYPE = "application/json"
+
+# The field elements are below the prime 2^128 + 51, which takes 17 bytes.
+SHARE_BYTES = (Share.prime.bit_length() + 7) // 8
+
+LENGTH = struct.Struct(">I")
+
+
+def value_bytes(prime: int = Share.prime) -> int:
+    """
+    Width in bytes of the encoding of the field elements below prime.
+    """
+    return (prime.bit_length() + 7) // 8
+
+
+def pack_shares(shares: Iterable[Share], prime: int = Share.prime) -> bytes:
+    """
+    Concatenate the fixed-width encodings of shares.
+    """
+    return pack_values((share.value for share in shares), prime)
+
+
+def unpack_shares(data: bytes, prime: int = Share.prime) -> List[Share]:
+    """
+    Shares packed by pack_shares.
+    """
+    return [Share(value, prime) for value in unpack_values(data, prime)]
+
+
+def pack_values(values: Iterable[int], prime: int = Share.prime) -> bytes:
+    """
+    Concatenate the fixed-width encodings of field elements, e.g. of the values of a ShareVector.
+    The uint64 arrays of the 64-bit fields are encoded without converting their values.
+    """
+    width = value_bytes(prime)
+    if np is not None and isinstance(values, np.ndarray) and width == 8:
+        return values.astype(">u8").tobytes()
+    return b"".join(int(value).to_bytes(width, "big") for value in values)
+
+
+def unpack_values(data: bytes, prime: int = Share.prime) -> List[int]:
+    """
+    Field elements packed by pack_values.
+    """
+    width = value_bytes(prime)
+    if len(data) % width != 0:
+        raise ValueError(f"Packed shares have a multiple of {width} bytes, got {len(data)}")
+    if width == 8:
+        return list(struct.unpack(f">{len(data) // 8}Q", data))
+    return [
+        int.from_bytes(data[start:start + width], "big")
+        for start in range(0, len(data), width)
+    ]
+
+
+def encode_frames(messages: Dict[str, bytes]) -> bytes:
+    """
+    Encode messages indexed by key as a sequence of length-prefixed frames.
+    """
+    frames = []
+    for key, message in messages.items():
+        key_bytes = key.encode("UTF-8")
+        frames += [LENGTH.pack(len(key_bytes)), key_bytes, LENGTH.pack(len(message)), message]
+    return b"".join(frames)
+
+
+def decode_frames(data: bytes) -> Dict[str, bytes]:
+    """
+    Messages indexed by key, encoded by encode_frames.
+    """
+    messages = {}
+    position = 0
+    while position < len(data):
+        fields = []
+        for _ in range(2):
+            if position + LENGTH.size > len(data):
+                raise ValueError("Truncated frame")
+            (length,) = LENGTH.unpack_from(data, position)
+            position += LENGTH.size
+            if position + length > len(data):
+                raise ValueError("Truncated frame")
+            fields.append(data[position:position + length])
+            position += length
+        key, message = fields
+        messages[key.decode("UTF-8")] = message
+    return messages
@@ -5,37 +5,31 @@ You should not need to change this file.
 
 import json
 import time
-from typing import Union, Tuple
+from typing import Dict, List, Optional, Union, Tuple
 
-import requests
-
-from secret_sharing import Share
-
-
-def sanitize_url_param(url_param: Union[bytes, str]) -> str:
-    """
-    Sanitize URL parameter to be URL-safe.
-    """
-    if isinstance(url_param, bytes):
-        # Mypy "dislikes" variable redefinition.
-        url_param = url_param.decode("ASCII") # type: ignore
-
-    # %2F is indistinguishable from / due to WSGI standard.
-    url_param = url_param.replace(r"%2F", "_").replace(r"%2f", "_")
-
-    return url_param.replace("/", "_").replace("+", "-") # type: ignore
+from codec import unpack_shares
+from instrumentation import Instrumentation
+from secret_sharing import Share, seeded_triplet
+from transport import HttpTransport, Transport
 
 
 class Communication:
     """
-    Network communications with the server.
+    Communications with the server, through a transport.
 
     Attributes:
         server_host: hostname of the server
         server_port: port of the server
         client_id: Identifier of this client
-        poll_delay: delay between requests in seconds (default: 0.2 s)
+        poll_delay: delay between requests in seconds, if the server does not hold them (default: 0.2 s)
         protocol: network protocol to use (default: "http")
+        wait_timeout: time in seconds the server can hold a request until the message is
+            available (default: 10 s)
+        transport: transport of the messages (default: HTTP requests to the server)
+        session_id: session of the computation on the server, for the default transport
+            (default: the default session of the server)
+        prime: prime of the field of the shares (default: the one of Share)
+        instrumentation: measurements of the requests to the server, per phase of the client
     """
 
     def __init__(
@@ -44,16 +38,45 @@ class Communication:
             server_port: int,
             client_id: str,
             poll_delay: float = 0.2,
-            protocol: str = "http"
+            protocol: str = "http",
+            wait_timeout: float = 10.0,
+            transport: Optional[Transport] = None,
+            session_id: Optional[str] = None,
+            prime: int = Share.prime
     ):
-        self.base_url = f"{protocol}://{server_host}:{server_port}"
+        if transport is None:
+            transport = HttpTransport(
+                f"{protocol}://{server_host}:{server_port}", poll_delay, wait_timeout, session_id
+            )
+        self.transport = transport
         self.client_id = client_id
-        self.poll_delay = poll_delay
+        self.prime = prime
 
         # Fields for testing performance
         self.bytes_sent = 0
         self.bytes_received = 0
         self.network_delay = 0
+        self.instrumentation = Instrumentation(client_id)
+
+
+    def start_request(self) -> Tuple[float, int]:
+        """
+        Time and poll count of the transport before a request to the server.
+        """
+        return time.time(), self.transport.polls
+
+
+    def end_request(self, started: Tuple[float, int], bytes_sent: int = 0, bytes_received: int = 0) -> None:
+        """
+        Record a request to the server, given the time and poll count before it.
+        """
+        start_time, polls = started
+        wait_time = time.time() - start_time
+        self.network_delay += wait_time
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.instrumentation.record(wait_time, bytes_sent, bytes_received, self.transport.polls - polls)
+
 
     def send_private_message(
             self,
@@ -65,17 +88,9 @@ class Communication:
         Send a private message to the server.
         """
 
-        client_id_san = sanitize_url_param(self.client_id)
-        receiver_id_san = sanitize_url_param(receiver_id)
-        label_san = sanitize_url_param(label)
-
-        startTime = time.time()
-        url = f"{self.base_url}/private/{client_id_san}/{receiver_id_san}/{label_san}"
-        print(f"POST {url}")
-        requests.post(url, message)
-        endTime = time.time()
-        self.network_delay += endTime - startTime
-        self.bytes_sent += len(message)
+        started = self.start_request()
+        self.transport.send_private_message(self.client_id, receiver_id, label, _to_bytes(message))
+        self.end_request(started, bytes_sent=len(message))
 
 
     def retrieve_private_message(
@@ -86,22 +101,25 @@ class Communication:
         Retrieve a private message from the server.
         """
 
-        client_id_san = sanitize_url_param(self.client_id)
-        label_san = sanitize_url_param(label)
+        started = self.start_request()
+        content = self.transport.retrieve_private_message(self.client_id, label)
+        self.end_request(started, bytes_received=len(content))
+        return content
 
-        url = f"{self.base_url}/private/{client_id_san}/{label_san}"
-        # We can either use a websocket, or do some polling, but websockets would require asyncio.
-        # So we are doing polling to avoid introducing a new programming paradigm.
-        startTime = time.time()
-        while True:
-            print(f"GET  {url}")
-            res = requests.get(url)
-            if res.status_code == 200:
-                endTime = time.time()
-                self.network_delay += endTime - startTime
-                self.bytes_received += len(res.content)
-                return res.content
-            time.sleep(self.poll_delay)
+
+    def retrieve_private_messages(
+            self,
+            sender_ids: List[str],
+            label: str
+        ) -> Dict[str, bytes]:
+        """
+        Retrieve the private messages of all the given senders with a label, in a single response.
+        """
+
+        started = self.start_request()
+        messages = self.transport.retrieve_private_messages(self.client_id, sender_ids, label)
+        self.end_request(started, bytes_received=sum(len(message) for message in messages.values()))
+        return messages
 
 
     def publish_message(
@@ -113,16 +131,9 @@ class Communication:
         Publish a message on the server.
         """
 
-        client_id_san = sanitize_url_param(self.client_id)
-        label_san = sanitize_url_param(label)
-
-        startTime = time.time()
-        url = f"{self.base_url}/public/{client_id_san}/{label_san}"
-        print(f"POST {url}")
-        requests.post(url, message)
-        endTime = time.time()
-        self.network_delay += endTime - startTime
-        self.bytes_sent += len(message)
+        started = self.start_request()
+        self.transport.publish_message(self.client_id, label, _to_bytes(message))
+        self.end_request(started, bytes_sent=len(message))
 
 
     def retrieve_public_message(
@@ -134,24 +145,25 @@ class Communication:
         Retrieve a public message from the server.
         """
 
-        client_id_san = sanitize_url_param(self.client_id)
-        sender_id_san = sanitize_url_param(sender_id)
-        label_san = sanitize_url_param(label)
+        started = self.start_request()
+        content = self.transport.retrieve_public_message(self.client_id, sender_id, label)
+        self.end_request(started, bytes_received=len(content))
+        return content
+
 
-        url = f"{self.base_url}/public/{client_id_san}/{sender_id_san}/{label_san}"
+    def retrieve_public_messages(
+            self,
+            sender_ids: List[str],
+            label: str
+        ) -> Dict[str, bytes]:
+        """
+        Retrieve the public messages of all the given senders with a label, in a single response.
+        """
 
-        # We can either use a websocket, or do some polling, but websockets would require asyncio.
-        # So we are doing polling to avoid introducing a new programming paradigm.
-        startTime = time.time()
-        while True:
-            print(f"GET  {url}")
-            res = requests.get(url)
-            if res.status_code == 200:
-                endTime = time.time()
-                self.network_delay += endTime - startTime
-                self.bytes_received += len(res.content)
-                return res.content
-            time.sleep(self.poll_delay)
+        started = self.start_request()
+        messages = self.transport.retrieve_public_messages(self.client_id, sender_ids, label)
+        self.end_request(started, bytes_received=sum(len(message) for message in messages.values()))
+        return messages
 
 
     def retrieve_beaver_triplet_shares(
@@ -162,15 +174,75 @@ class Communication:
         Retrieve a triplet of shares generated by the trusted server.
         """
 
-        client_id_san = sanitize_url_param(self.client_id)
-        op_id_san = sanitize_url_param(op_id)
+        started = self.start_request()
+        content = self.transport.retrieve_beaver_triplet_shares(self.client_id, op_id)
+        self.end_request(started, bytes_received=len(content))
+        return tuple(unpack_shares(content, self.prime)) # type: ignore
+
+
+    def retrieve_beaver_triplets_shares(
+            self,
+            op_ids: List[str]
+        ) -> Dict[str, Tuple[Share, Share, Share]]:
+        """
+        Retrieve the triplets of shares of several operations in a single request, indexed by
+        operation.
+        """
+
+        started = self.start_request()
+        content = self.transport.retrieve_beaver_triplets_shares(self.client_id, op_ids)
+        self.end_request(started, bytes_received=len(content))
+        shares = unpack_shares(content, self.prime)
+        return {
+            op_id: tuple(shares[3 * i:3 * i + 3]) # type: ignore
+            for i, op_id in enumerate(op_ids)
+        }
+
+
+    def retrieve_seeded_triplets(
+            self,
+            op_ids: List[str]
+        ) -> Dict[str, Tuple[Share, Share, Share]]:
+        """
+        Retrieve the seed of this client, and expand the triplets of shares of several operations
+        from it, indexed by operation.
+        """
+
+        started = self.start_request()
+        content = self.transport.retrieve_seeded_triplets(self.client_id, op_ids)
+        self.end_request(started, bytes_received=len(content))
+
+        response = json.loads(content)
+        seed = bytes.fromhex(response["seed"])
+        corrections = response["corrections"] or [None] * len(op_ids)
+        return {
+            op_id: seeded_triplet(seed, op_id, correction, self.prime)
+            for op_id, correction in zip(op_ids, corrections)
+        }
+
+
+    def open_session(self, participants: List[str]) -> None:
+        """
+        Open the session of the computation on the server with its participants and the field of
+        the shares, unless another client already opened it.
+        """
+
+        started = self.start_request()
+        self.transport.open_session(participants, self.prime)
+        self.end_request(started)
+
+
+    def close_session(self) -> None:
+        """
+        Tell the server that this client is done with the session of the computation.
+        """
+
+        started = self.start_request()
+        self.transport.close_session(self.client_id)
+        self.end_request(started)
 
-        startTime = time.time()
-        url = f"{self.base_url}/shares/{client_id_san}/{op_id_san}"
-        print(f"GET  {url}")
 
-        res = requests.get(url)
-        endTime = time.time()
-        self.network_delay += endTime - startTime
-        self.bytes_received += len(res.content)
-        return tuple([Share.deserialize(s) for s in json.loads(res.text)]) # type: ignore
+def _to_bytes(message: Union[bytes, str]) -> bytes:
+    if isinstance(message, str):
+        return message.encode("UTF-8")
+    return message
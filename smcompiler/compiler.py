@@ -0,0 +1,349 @@
+"""
+Compiler lowering an arithmetic expression into a flat program of register instructions.
+
+Example:
+>>> program = compile_expression(alice_secret * bob_secret + Scalar(2))
+>>> program.instructions
+[Instruction(opcode='LOAD_SECRET', ...), ..., Instruction(opcode='OPEN', ...)]
+
+The SMC parties execute the program with a loop over the instructions, and the trusted parameter
+generator uses it to know all the multiplications requiring a Beaver triplet in advance.
+"""
+
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union
+)
+
+from expression import (
+    DotProduct,
+    Expression,
+    Secret,
+    SecretVector,
+    Scalar,
+    AddOp,
+    SubOp,
+    LinearCombination,
+    MultOp,
+    postorder
+)
+from optimizer import optimize
+from secret_sharing import Share
+
+
+# Opcodes of the instructions. The arguments of each instruction are given in comments.
+LOAD_SECRET = "LOAD_SECRET"     # (secret_id,): share of a secret received during the input phase
+LINEAR = "LINEAR"               # (k, ((c1, a1), ...)): k + c1 * a1 + ..., only the first client adds k
+MUL_BEAVER = "MUL_BEAVER"       # (a, b, op_id): share * share using the Beaver triplet of op_id
+DOT_BEAVER = "DOT_BEAVER"       # (((c1, a1, b1), ...), op_id): c1 * a1 * b1 + ..., one triplet per term
+OPEN = "OPEN"                   # (a,): reconstruct the output of the program
+
+# Instructions using Beaver triplets, whose masked values are opened in the round of their level.
+BEAVER_OPCODES = (MUL_BEAVER, DOT_BEAVER)
+
+
+class Instruction(NamedTuple):
+    """
+    Instruction of a compiled program, storing its result in register dst.
+    The level is the multiplicative depth of the result, and the length is the one of the vector
+    held by dst, or None for a single value.
+    """
+
+    opcode: str
+    dst: int
+    args: Tuple
+    level: int = 0
+    length: Optional[int] = None
+
+
+class Register(NamedTuple):
+    """
+    Register holding a share.
+    """
+
+    index: int
+
+
+class LinearForm(NamedTuple):
+    """
+    Linear combination of registers with public coefficients, plus a public constant.
+    Linear subexpressions are combined into linear forms when compiling, and a form is only
+    computed by a LINEAR instruction when its value is needed.
+    """
+
+    constant: int
+    coefficients: Dict[int, int]
+
+    def is_public(self) -> bool:
+        return not self.coefficients
+
+
+class Program:
+    """
+    Flat program computing an expression.
+
+    The multiplications using Beaver triplets are ordered by multiplicative depth, so the
+    consecutive MUL_BEAVER and DOT_BEAVER instructions of the same level form a layer that can be
+    opened in a single round.
+
+    Attributes:
+        instructions: List of instructions in execution order, the last one is OPEN
+        num_registers: Number of registers used by the instructions
+        beaver_op_ids: IDs of the Beaver triplets of the multiplications, in execution order.
+            A multiplication of vectors has one triplet per element, see vector_op_ids, and a
+            dot product one per term, see beaver_products.
+    """
+
+    def __init__(self, instructions: List[Instruction], num_registers: int):
+        self.instructions = instructions
+        self.num_registers = num_registers
+        self.beaver_op_ids = []
+        for instruction in instructions:
+            if instruction.opcode not in BEAVER_OPCODES:
+                continue
+            for _, _, _, op_id in beaver_products(instruction):
+                if instruction.length is None:
+                    self.beaver_op_ids.append(op_id)
+                else:
+                    self.beaver_op_ids += vector_op_ids(op_id, instruction.length)
+
+        # The parties get the Beaver triplet of a multiplication by its ID, so two multiplications
+        # with the same ID would share a triplet.
+        if len(set(self.beaver_op_ids)) != len(self.beaver_op_ids):
+            raise ValueError("Several multiplications of the program have the same ID")
+
+    def __repr__(self):
+        return "\n".join(
+            f"[{instruction.level}] {instruction.opcode} r{instruction.dst} {instruction.args}"
+            for instruction in self.instructions
+        )
+
+
+class Compiler:
+    """
+    Lowers an expression into a program. Each node of the expression is lowered only once, so
+    subexpressions shared by several nodes are computed a single time. The constants are reduced
+    in the field of the given prime.
+    """
+
+    def __init__(self, prime: int = Share.prime):
+        self.prime = prime
+        self.instructions: List[Instruction] = []
+        self.levels: List[int] = []
+        self.lengths: List[Optional[int]] = []
+        self.lowered: Dict[int, LinearForm] = {}
+        self.materialized: Dict[int, Register] = {}
+
+    def compile(self, expr: Expression) -> Program:
+        """
+        Compile the expression into a program whose output is the value of the expression.
+        """
+        output = self.materialize(self.lower(expr))
+
+        # Stable sort by depth, the Beaver multiplications of a depth come before the other
+        # instructions of the same depth as they only depend on values of smaller depths.
+        instructions = sorted(
+            self.instructions,
+            key=lambda instruction: (instruction.level, instruction.opcode not in BEAVER_OPCODES)
+        )
+        level = self.levels[output.index]
+        length = self.lengths[output.index]
+        instructions.append(Instruction(OPEN, output.index, (output.index,), level, length))
+
+        return Program(instructions, len(self.levels))
+
+    def emit(self, opcode: str, args: Tuple, level: int, length: Optional[int] = None) -> Register:
+        """
+        Append an instruction storing its result in a new register.
+        """
+        register = Register(len(self.levels))
+        self.levels.append(level)
+        self.lengths.append(length)
+        self.instructions.append(Instruction(opcode, register.index, args, level, length))
+        return register
+
+    def materialize(self, form: LinearForm) -> Register:
+        """
+        Register holding the value of a linear form, computed by a single LINEAR instruction.
+        """
+        if id(form) in self.materialized:
+            return self.materialized[id(form)]
+
+        if form.constant == 0 and len(form.coefficients) == 1:
+            index, coefficient = next(iter(form.coefficients.items()))
+            if coefficient == 1:
+                return Register(index)
+
+        level = max((self.levels[index] for index in form.coefficients), default=0)
+        length = common_length(self.lengths[index] for index in form.coefficients)
+        terms = tuple((coefficient, index) for index, coefficient in form.coefficients.items())
+        register = self.emit(LINEAR, (form.constant, terms), level, length)
+
+        self.materialized[id(form)] = register
+        return register
+
+    def lower(self, expr: Expression) -> LinearForm:
+        """
+        Lower an expression into a linear form of the registers computed so far.
+        The nodes are lowered after their operands, without recursion.
+        """
+        for node in postorder(expr):
+            self.lowered[id(node)] = self.lower_node(node)
+        return self.lowered[id(expr)]
+
+    def lower_node(self, expr: Expression) -> LinearForm:
+        if isinstance(expr, Secret):
+            length = expr.length if isinstance(expr, SecretVector) else None
+            register = self.emit(LOAD_SECRET, (expr.id,), 0, length)
+            return LinearForm(0, {register.index: 1})
+
+        if isinstance(expr, Scalar):
+            return LinearForm(expr.value % self.prime, {})
+
+        if isinstance(expr, AddOp):
+            return combine(
+                [(1, self.lowered[id(expr.a)]), (1, self.lowered[id(expr.b)])], self.prime
+            )
+
+        if isinstance(expr, SubOp):
+            return combine(
+                [(1, self.lowered[id(expr.a)]), (-1, self.lowered[id(expr.b)])], self.prime
+            )
+
+        if isinstance(expr, LinearCombination):
+            terms = [(coefficient, self.lowered[id(term)]) for coefficient, term in expr.terms]
+            terms.append((1, LinearForm(expr.constant % self.prime, {})))
+            return combine(terms, self.prime)
+
+        if isinstance(expr, MultOp):
+            a = self.lowered[id(expr.a)]
+            b = self.lowered[id(expr.b)]
+            return self.lower_multiplication(expr, a, b)
+
+        if isinstance(expr, DotProduct):
+            return self.lower_dot_product(expr)
+
+        raise TypeError(f"Cannot compile expression of type {type(expr).__name__}")
+
+    def lower_multiplication(
+            self,
+            expr: MultOp,
+            a: LinearForm,
+            b: LinearForm
+        ) -> LinearForm:
+
+        # Multiplications by a public value are linear.
+        if a.is_public():
+            return combine([(a.constant, b)], self.prime)
+        if b.is_public():
+            return combine([(b.constant, a)], self.prime)
+
+        # Each node is lowered once, so a node appearing several times is only multiplied once.
+        register_a = self.materialize(a)
+        register_b = self.materialize(b)
+        level = max(self.levels[register_a.index], self.levels[register_b.index]) + 1
+        length = common_length([self.lengths[register_a.index], self.lengths[register_b.index]])
+        register = self.emit(MUL_BEAVER, (register_a.index, register_b.index, expr.id), level, length)
+
+        return LinearForm(0, {register.index: 1})
+
+    def lower_dot_product(self, expr: DotProduct) -> LinearForm:
+
+        # Products by a public value are linear, the other ones are the terms of a single gate.
+        linear: List[Tuple[int, LinearForm]] = []
+        terms = []
+        for coefficient, a, b in expr.terms:
+            form_a, form_b = self.lowered[id(a)], self.lowered[id(b)]
+            if form_a.is_public():
+                linear.append((coefficient * form_a.constant, form_b))
+            elif form_b.is_public():
+                linear.append((coefficient * form_b.constant, form_a))
+            else:
+                terms.append((
+                    coefficient % self.prime, self.materialize(form_a), self.materialize(form_b)
+                ))
+
+        if terms:
+            operands = [register.index for _, a, b in terms for register in (a, b)]
+            level = max(self.levels[index] for index in operands) + 1
+            length = common_length(self.lengths[index] for index in operands)
+            args = tuple((coefficient, a.index, b.index) for coefficient, a, b in terms)
+            register = self.emit(DOT_BEAVER, (args, expr.id), level, length)
+            linear.append((1, LinearForm(0, {register.index: 1})))
+
+        return combine(linear, self.prime)
+
+
+def beaver_products(instruction: Instruction) -> List[Tuple[int, int, int, str]]:
+    """
+    Coefficient, registers and triplet ID of each product computed by a MUL_BEAVER or DOT_BEAVER
+    instruction. The terms of a dot product are identified as the elements of a vector.
+    """
+    if instruction.opcode == MUL_BEAVER:
+        a, b, op_id = instruction.args
+        return [(1, a, b, op_id)]
+
+    terms, op_id = instruction.args
+    return [
+        (coefficient, a, b, term_id)
+        for (coefficient, a, b), term_id in zip(terms, vector_op_ids(op_id, len(terms)))
+    ]
+
+
+def common_length(lengths: Iterable[Optional[int]]) -> Optional[int]:
+    """
+    Length of the result of an element-wise operation on operands of the given lengths, where
+    single values are broadcast. Raises ValueError if vectors have different lengths.
+    """
+    vector_lengths = {length for length in lengths if length is not None}
+    if len(vector_lengths) > 1:
+        raise ValueError(f"Operation on vectors of different lengths {sorted(vector_lengths)}")
+    return next(iter(vector_lengths), None)
+
+
+def vector_op_ids(op_id: Union[bytes, str], length: int) -> List[str]:
+    """
+    IDs of the Beaver triplets of the elements of a multiplication of vectors.
+    """
+    if isinstance(op_id, bytes):
+        op_id = op_id.decode("ASCII")
+    return [f"{op_id}:{i}" for i in range(length)]
+
+
+def combine(terms: List[Tuple[int, LinearForm]], prime: int = Share.prime) -> LinearForm:
+    """
+    Linear form of the sum of the given forms multiplied by coefficients, reduced modulo prime.
+    """
+    constant = 0
+    coefficients: Dict[int, int] = {}
+    for coefficient, form in terms:
+        constant += coefficient * form.constant
+        for index, form_coefficient in form.coefficients.items():
+            coefficients[index] = coefficients.get(index, 0) + coefficient * form_coefficient
+
+    # Terms cancelling each other are removed.
+    coefficients = {
+        index: coefficient % prime
+        for index, coefficient in coefficients.items()
+        if coefficient % prime != 0
+    }
+    return LinearForm(constant % prime, coefficients)
+
+
+def compile_expression(
+        expr: Expression,
+        optimized: bool = True,
+        prime: int = Share.prime
+    ) -> Program:
+    """
+    Compile an expression into a program computing in the field of the given prime, simplifying
+    the expression first unless disabled.
+    """
+    if optimized:
+        expr = optimize(expr, prime)
+    return Compiler(prime).compile(expr)
@@ -6,22 +6,50 @@ Example expression:
 >>> bob_secret = Secret()
 >>> expr = alice_secret * bob_secret * Scalar(2)
 
+Secrets have random IDs, while the IDs of the other nodes are derived from their structure: the
+kind of the node, its public values and the IDs of its operands. The operators and the helper
+functions are a hash-consing builder: a node with the ID of a node already built is replaced by the
+existing node, so identical subexpressions are a single shared node, e.g. a product written twice
+is computed once with a single triplet.
+
 MODIFY THIS FILE.
 """
 
 import base64
-import random
-from typing import Optional
+import hashlib
+import weakref
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import randomness
 
 
-ID_BYTES = 4
+# The 96-bit IDs do not collide, even for circuits of billions of nodes.
+ID_BYTES = 12
 
 
 def gen_id() -> bytes:
-    id_bytes = bytearray(
-        random.getrandbits(8) for _ in range(ID_BYTES)
-    )
-    return base64.b64encode(id_bytes)
+    """Random ID, for the nodes without structure such as secrets."""
+    return base64.b64encode(randomness.token_bytes(ID_BYTES))
+
+
+def structural_id(*parts) -> bytes:
+    """
+    Deterministic ID of a node, derived from its kind, public values and the IDs of its operands.
+    """
+    digest = hashlib.blake2b(repr(parts).encode("UTF-8"), digest_size=ID_BYTES).digest()
+    return base64.b64encode(digest)
+
+
+# Nodes built by the operators and the helper functions, by ID. The entries are dropped with
+# their nodes.
+_interned: "weakref.WeakValueDictionary[bytes, Expression]" = weakref.WeakValueDictionary()
+
+
+def intern(expr: "Expression") -> "Expression":
+    """
+    Node already built with the ID of expr, or expr itself, which is then shared.
+    """
+    return _interned.setdefault(expr.id, expr)
 
 
 class Expression:
@@ -39,15 +67,15 @@ class Expression:
         self.id = id
 
     def __add__(self, other):
-        return AddOp(self, other)
+        return LinearCombination.append(self, 1, other)
 
 
     def __sub__(self, other):
-        return SubOp(self, other)
+        return LinearCombination.append(self, -1, other)
 
 
     def __mul__(self, other):
-        return MultOp(self, other)
+        return intern(MultOp(self, other))
 
 
     def __hash__(self):
@@ -59,37 +87,128 @@ class AddOp(Expression):
     def __init__(self, a, b):
         self.a = a
         self.b = b
+        # The sum is commutative, so its ID does not depend on the order of the operands.
+        super().__init__(structural_id("AddOp", *sorted((a.id, b.id))))
 
     def __repr__(self):
-        return f"({repr(self.a)} + {repr(self.b)})"
-
-    def __hash__(self):
-        return
+        return expression_repr(self)
 
 class SubOp(Expression):
 
     def __init__(self, a, b):
         self.a = a
         self.b = b
+        super().__init__(structural_id("SubOp", a.id, b.id))
 
     def __repr__(self):
-        return f"({repr(self.a)} - {repr(self.b)})"
+        return expression_repr(self)
+
+class LinearCombination(Expression):
+    """
+    Sum of terms multiplied by public coefficients, plus a public constant.
+
+    The + and - operators build linear combinations, so a chain of additions is a single flat node
+    instead of a deep tree of binary operations. Adding a term to the last linear combination of a
+    chain appends it to a list shared by the combinations of the chain, which is done in constant time.
+    """
+
+    def __init__(
+            self,
+            terms: Iterable[Tuple[int, Expression]] = (),
+            constant: int = 0
+        ):
+        self._terms = list(terms)
+        self._length = len(self._terms)
+        self.constant = constant
+
+        combination_id = structural_id("LinearCombination", constant)
+        for coefficient, term in self._terms:
+            combination_id = LinearCombination.extend_id(combination_id, coefficient, term)
+        super().__init__(combination_id)
+
+    @property
+    def terms(self) -> List[Tuple[int, Expression]]:
+        """List of (coefficient, term) pairs."""
+        return self._terms[:self._length]
+
+    @staticmethod
+    def append(
+            expr: Expression,
+            coefficient: int,
+            term: Expression
+        ) -> "LinearCombination":
+        """
+        Linear combination expr + coefficient * term, extending expr if it is a linear combination.
+        """
+        if not isinstance(expr, LinearCombination):
+            return intern(LinearCombination([(1, expr), (coefficient, term)]))
+
+        # The ID is chained from the one of expr, so it is also computed in constant time.
+        result_id = LinearCombination.extend_id(expr.id, coefficient, term)
+        existing = _interned.get(result_id)
+        if existing is not None:
+            return existing
+
+        # The list is only shared if no other combination already extended it.
+        terms = expr._terms
+        if len(terms) != expr._length:
+            terms = terms[:expr._length]
+        terms.append((coefficient, term))
+
+        result = LinearCombination.__new__(LinearCombination)
+        result._terms = terms
+        result._length = len(terms)
+        result.constant = expr.constant
+        Expression.__init__(result, result_id)
+        return intern(result)
+
+    @staticmethod
+    def extend_id(combination_id: bytes, coefficient: int, term: Expression) -> bytes:
+        """
+        ID of the linear combination with the given ID extended by coefficient * term.
+        """
+        return structural_id(combination_id, coefficient, term.id)
+
+    def __repr__(self):
+        return expression_repr(self)
 
-    def __hash__(self):
-        return
 
 class MultOp(Expression):
 
     def __init__(self, a, b, id:Optional[bytes] = None):
         self.a = a
         self.b = b
+        # The product is commutative, so its ID does not depend on the order of the operands.
+        if id is None:
+            id = structural_id("MultOp", *sorted((a.id, b.id)))
         super().__init__(id)
 
     def __repr__(self):
-        return f"{repr(self.a)} * {repr(self.b)}"
+        return expression_repr(self)
+
+class DotProduct(Expression):
+    """
+    Sum of products of pairs of expressions with public coefficients, c1 * a1 * b1 + c2 * a2 * b2 + ...
+
+    The products are computed by a single gate, whose masked values are all opened in one round,
+    and only their sum is combined locally.
+    """
+
+    def __init__(
+            self,
+            terms: Iterable[Tuple[int, Expression, Expression]],
+            id: Optional[bytes] = None
+        ):
+        self.terms = list(terms)
+        if not self.terms:
+            raise ValueError("A dot product has at least one term")
+        if id is None:
+            id = structural_id("DotProduct", [(c, a.id, b.id) for c, a, b in self.terms])
+        super().__init__(id)
+
+    def __repr__(self):
+        return expression_repr(self)
 
-    def __hash__(self):
-        return
 
 class Scalar(Expression):
     """Term representing a scalar finite field value."""
@@ -100,6 +219,8 @@ class Scalar(Expression):
             id: Optional[bytes] = None
         ):
         self.value = value
+        if id is None:
+            id = structural_id("Scalar", value)
         super().__init__(id)
 
 
@@ -107,10 +228,6 @@ class Scalar(Expression):
         return f"{self.__class__.__name__}({repr(self.value)})"
 
 
-    def __hash__(self):
-        return
-
-
 
 class Secret(Expression):
     """Term representing a secret finite field value (variable)."""
@@ -130,3 +247,185 @@ class Secret(Expression):
         )
 
 
+class SecretVector(Secret):
+    """
+    Term representing a vector of secret finite field values. The operations on vectors are
+    element-wise, and single values are broadcast to the length of the vector.
+    """
+
+    def __init__(
+            self,
+            length: int,
+            value: Optional[int] = None,
+            id: Optional[bytes] = None
+        ):
+        if length < 1:
+            raise ValueError("A secret vector has at least one element")
+        self.length = length
+        super().__init__(value, id)
+
+
+def sum_of(terms: Iterable[Expression]) -> LinearCombination:
+    """
+    Sum of the given expressions, as a single linear combination.
+    """
+    return intern(LinearCombination((1, term) for term in terms))
+
+
+def linear_combination(
+        terms: Iterable[Tuple[int, Expression]],
+        constant: int = 0
+    ) -> LinearCombination:
+    """
+    Sum of the given (coefficient, term) pairs plus a constant, as a single linear combination.
+    """
+    return intern(LinearCombination(terms, constant))
+
+
+def dot_product(a: Iterable[Expression], b: Iterable[Expression]) -> DotProduct:
+    """
+    Sum of the products of the expressions of a and b with the same index, as a single node.
+    """
+    a, b = list(a), list(b)
+    if len(a) != len(b):
+        raise ValueError(f"Dot product of {len(a)} and {len(b)} expressions")
+    return intern(DotProduct((1, x, y) for x, y in zip(a, b)))
+
+
+def children(expr: Expression) -> List[Expression]:
+    """
+    Operands of an expression, in order.
+    """
+    if isinstance(expr, (AddOp, SubOp, MultOp)):
+        return [expr.a, expr.b]
+    if isinstance(expr, LinearCombination):
+        return [term for _, term in expr.terms]
+    if isinstance(expr, DotProduct):
+        return [operand for _, a, b in expr.terms for operand in (a, b)]
+    return []
+
+
+def postorder(expr: Expression) -> Iterator[Expression]:
+    """
+    Iterate over the distinct nodes of an expression, each node coming after its operands.
+    The traversal uses an explicit stack, so it works for expressions of any depth.
+    """
+    visited = set()
+    stack: List[Tuple[Expression, bool]] = [(expr, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+            continue
+        if id(node) in visited:
+            continue
+
+        visited.add(id(node))
+        stack.append((node, True))
+        for child in reversed(children(node)):
+            if id(child) not in visited:
+                stack.append((child, False))
+
+
+def expression_repr(expr: Expression) -> str:
+    """
+    Representation of an expression, built with an explicit stack of the parts left to write.
+    Linear combinations have the same representation as the chain of binary operations.
+    """
+    parts = []
+    stack: List[Union[str, Expression]] = [expr]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+
+        elif isinstance(item, AddOp):
+            stack.extend([")", item.b, " + ", item.a, "("])
+
+        elif isinstance(item, SubOp):
+            stack.extend([")", item.b, " - ", item.a, "("])
+
+        elif isinstance(item, MultOp):
+            stack.extend([item.b, " * ", item.a])
+
+        elif isinstance(item, DotProduct):
+            # Written as the sum of the products.
+            products = [
+                (coefficient, MultOp(a, b, id=b"")) for coefficient, a, b in item.terms
+            ]
+            stack.append(LinearCombination(products))
+
+        elif isinstance(item, LinearCombination):
+            terms = item.terms
+            if item.constant != 0:
+                terms.append((1, Scalar(item.constant, id=b"")))
+            if not terms:
+                parts.append("Scalar(0)")
+                continue
+
+            # Pushed in reverse order: the last term is written last.
+            for i in range(len(terms) - 1, -1, -1):
+                coefficient, term = terms[i]
+                if i > 0:
+                    stack.append(")")
+                if abs(coefficient) != 1 or (i == 0 and coefficient != 1):
+                    stack.append(f" * Scalar({abs(coefficient) if i > 0 else coefficient})")
+                stack.append(term)
+                if i > 0:
+                    stack.append(" - " if coefficient < 0 else " + ")
+            stack.append("(" * (len(terms) - 1))
+
+        else:
+            parts.append(repr(item))
+
+    return "".join(parts)
+
+
+def flatten(expr: Expression) -> List[Tuple[type, dict]]:
+    """
+    Class and attributes of the nodes of an expression in post-order, where the operands of each
+    node are replaced by their index in the list. Unlike the nested nodes, the list can be pickled
+    whatever the depth of the expression.
+    """
+    indices: Dict[int, int] = {}
+    nodes = []
+    for node in postorder(expr):
+        state = dict(node.__dict__)
+        if isinstance(node, (AddOp, SubOp, MultOp)):
+            state["a"] = indices[id(node.a)]
+            state["b"] = indices[id(node.b)]
+        elif isinstance(node, LinearCombination):
+            state["_terms"] = [(coefficient, indices[id(term)]) for coefficient, term in node.terms]
+            state["_length"] = len(state["_terms"])
+        elif isinstance(node, DotProduct):
+            state["terms"] = [
+                (coefficient, indices[id(a)], indices[id(b)]) for coefficient, a, b in node.terms
+            ]
+
+        indices[id(node)] = len(nodes)
+        nodes.append((type(node), state))
+
+    return nodes
+
+
+def unflatten(nodes: List[Tuple[type, dict]]) -> Expression:
+    """
+    Rebuild an expression flattened by flatten.
+    """
+    rebuilt: List[Expression] = []
+    for cls, state in nodes:
+        if issubclass(cls, (AddOp, SubOp, MultOp)):
+            state["a"] = rebuilt[state["a"]]
+            state["b"] = rebuilt[state["b"]]
+        elif issubclass(cls, LinearCombination):
+            state["_terms"] = [(coefficient, rebuilt[index]) for coefficient, index in state["_terms"]]
+        elif issubclass(cls, DotProduct):
+            state["terms"] = [
+                (coefficient, rebuilt[a], rebuilt[b]) for coefficient, a, b in state["terms"]
+            ]
+
+        node = cls.__new__(cls)
+        node.__dict__.update(state)
+        rebuilt.append(node)
+
+    return rebuilt[-1]
@@ -0,0 +1,183 @@
+"""
+Measurements of the phases of an SMC party, exported as JSON or in the Prometheus text format.
+
+Example:
+>>> instrumentation = Instrumentation("Alice")
+>>> with instrumentation.phase(INPUT_PHASE):
+...     instrumentation.record(wait_time=0.01, bytes_sent=34)
+>>> print(export_prometheus([instrumentation]))
+
+Each request of the party to the server is recorded in the phase running when it is sent: its wait
+time, the bytes sent and received, and the poll iterations of the transport until the messages were
+available. The time of a phase which is not spent waiting for the server is local computation.
+"""
+
+import contextlib
+import json
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+
+# Phases of a party, in the order of a run. The opening rounds are numbered from 1, see round_phase.
+SESSION_PHASE = "session"
+TRIPLETS_PHASE = "triplet_fetch"
+INPUT_PHASE = "input_sharing"
+LOCAL_PHASE = "local_evaluation"
+OUTPUT_PHASE = "output"
+# Phase of the requests sent outside of the phases.
+OTHER_PHASE = "other"
+
+# Prefix of the names of the Prometheus metrics.
+PROMETHEUS_PREFIX = "smc_phase"
+
+
+def round_phase(number: int) -> str:
+    """Phase of an opening round of the Beaver multiplications."""
+    return f"opening_round_{number}"
+
+
+class PhaseMetrics:
+    """
+    Measurements of a phase of a party, accumulated over all the times it runs.
+
+    Attributes:
+        name: Name of the phase
+        requests: Number of requests to the server
+        polls: Number of poll iterations of the transport, e.g. requests sent again until the
+            messages were available
+        bytes_sent: Number of bytes of the messages sent
+        bytes_received: Number of bytes of the messages received
+        wait_time: Time in seconds spent waiting for the server
+        elapsed: Wall-clock time in seconds of the phase
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.polls = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.wait_time = 0.0
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.to_dict()})"
+
+    @property
+    def compute_time(self) -> float:
+        """Time in seconds of the phase not spent waiting for the server."""
+        return max(self.elapsed - self.wait_time, 0.0)
+
+    def to_dict(self) -> Dict[str, float]:
+        """Measurements indexed by name, including the computation time."""
+        return {
+            "requests": self.requests,
+            "polls": self.polls,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "wait_time": self.wait_time,
+            "compute_time": self.compute_time,
+            "elapsed": self.elapsed,
+        }
+
+
+class Instrumentation:
+    """
+    Measurements of the phases of a party, indexed by phase in the order they first ran. A party
+    runs a single phase at a time.
+
+    Attributes:
+        client_id: Identifier of the party
+        phases: Measurements of each phase
+        current: Phase running, or None outside of the phases
+    """
+
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.phases: Dict[str, PhaseMetrics] = {}
+        self.current: Optional[PhaseMetrics] = None
+
+    def metrics(self, name: str) -> PhaseMetrics:
+        """Measurements of a phase, created empty when it first runs."""
+        if name not in self.phases:
+            self.phases[name] = PhaseMetrics(name)
+        return self.phases[name]
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[PhaseMetrics]:
+        """
+        Run a phase, to which the requests recorded until it ends are attributed. A phase can run
+        several times, e.g. the local evaluation between the rounds, and its measurements add up.
+        """
+        metrics = self.metrics(name)
+        previous, self.current = self.current, metrics
+        started = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.elapsed += time.perf_counter() - started
+            self.current = previous
+
+    def record(
+            self,
+            wait_time: float,
+            bytes_sent: int = 0,
+            bytes_received: int = 0,
+            polls: int = 0
+        ) -> None:
+        """
+        Record a request to the server in the phase running.
+        """
+        metrics = self.current if self.current is not None else self.metrics(OTHER_PHASE)
+        metrics.requests += 1
+        metrics.polls += polls
+        metrics.bytes_sent += bytes_sent
+        metrics.bytes_received += bytes_received
+        metrics.wait_time += wait_time
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """Measurements of the phases, indexed by phase then by name."""
+        return {name: metrics.to_dict() for name, metrics in self.phases.items()}
+
+
+def export_json(instrumentations: Iterable[Instrumentation]) -> str:
+    """
+    Measurements of the phases of several parties as a JSON object, indexed by party.
+    """
+    return json.dumps(
+        {instrumentation.client_id: instrumentation.to_dict() for instrumentation in instrumentations},
+        indent=2
+    )
+
+
+# Prometheus counters: name suffix, description and attribute of PhaseMetrics.
+PROMETHEUS_COUNTERS = (
+    ("requests_total", "Requests to the server", "requests"),
+    ("polls_total", "Poll iterations of the transport", "polls"),
+    ("sent_bytes_total", "Bytes of the messages sent", "bytes_sent"),
+    ("received_bytes_total", "Bytes of the messages received", "bytes_received"),
+    ("wait_seconds_total", "Time spent waiting for the server", "wait_time"),
+    ("compute_seconds_total", "Time not spent waiting for the server", "compute_time"),
+    ("elapsed_seconds_total", "Wall-clock time", "elapsed"),
+)
+
+
+def export_prometheus(instrumentations: Iterable[Instrumentation]) -> str:
+    """
+    Measurements of the phases of several parties in the Prometheus text format, one counter per
+    measurement labelled by party and phase.
+    """
+    instrumentations = list(instrumentations)
+    lines = []
+    for suffix, description, attribute in PROMETHEUS_COUNTERS:
+        name = f"{PROMETHEUS_PREFIX}_{suffix}"
+        lines += [f"# HELP {name} {description} per phase of the SMC parties.", f"# TYPE {name} counter"]
+        for instrumentation in instrumentations:
+            for phase, metrics in instrumentation.phases.items():
+                labels = f'party="{_label_value(instrumentation.client_id)}",phase="{phase}"'
+                lines.append(f"{name}{{{labels}}} {getattr(metrics, attribute)}")
+    return "\n".join(lines) + "\n"
+
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
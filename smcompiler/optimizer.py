@@ -0,0 +1,484 @@
+"""
+Optimization passes simplifying an expression before it is compiled.
+
+Example:
+>>> optimize((Secret(1) * Scalar(2)) * (Secret(2) * Scalar(3)) + Scalar(0))
+Secret(1) * Secret(2) * Scalar(6)
+
+The pass folds operations between scalars, removes the neutral elements (+0, -0, *1), replaces
+multiplications by zero with a constant, and hoists scalar factors out of multiplications so that
+they are merged into a single scalar multiplication. Linear combinations are flattened, with their
+scalars folded into the constant and the scalar factors of their terms into the coefficients.
+
+A second pass rebalances the chains of multiplications of secret values into trees of minimal
+multiplicative depth, computing the powers of repeated factors by square-and-multiply, and turns
+the chains of binary additions and subtractions into flat linear combinations. The multiplications
+of secret values only used by a linear combination are fused into a dot product, computed by a
+single gate.
+"""
+
+import collections
+import heapq
+import itertools
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from expression import (
+    DotProduct,
+    Expression,
+    Scalar,
+    AddOp,
+    SubOp,
+    LinearCombination,
+    MultOp,
+    children,
+    postorder
+)
+from secret_sharing import Share
+
+
+# Only the IDs of the multiplications of two secret values are used by the protocol, so the nodes
+# created by the optimizer get a fixed ID instead of drawing random bytes.
+FOLDED_ID = b"folded"
+
+
+def optimize(expr: Expression, prime: int = Share.prime) -> Expression:
+    """
+    Simplify an expression, then rebalance it. The multiplications of two secret values reuse
+    the IDs of the original multiplications, so every client obtains the same optimized expression.
+    The scalars are folded in the field of the given prime.
+    """
+    return Rebalancer().rebalance(Optimizer(prime).optimize(expr))
+
+
+class Optimizer:
+
+    def __init__(self, prime: int = Share.prime):
+        self.prime = prime
+        self.optimized: Dict[int, Expression] = {}
+
+    def optimize(self, expr: Expression) -> Expression:
+        # Nodes are optimized after their operands, without recursion.
+        for node in postorder(expr):
+            self.optimized[id(node)] = self.optimize_node(node)
+        return self.optimized[id(expr)]
+
+    def optimize_node(self, expr: Expression) -> Expression:
+        if isinstance(expr, (AddOp, SubOp, MultOp)):
+            a = self.optimized[id(expr.a)]
+            b = self.optimized[id(expr.b)]
+
+            if isinstance(expr, AddOp):
+                return self.optimize_addition(expr, a, b)
+            if isinstance(expr, SubOp):
+                return self.optimize_subtraction(expr, a, b)
+            return self.optimize_multiplication(expr, a, b)
+
+        if isinstance(expr, LinearCombination):
+            terms = [(coefficient, self.optimized[id(term)]) for coefficient, term in expr.terms]
+            return self.optimize_linear_combination(expr, terms)
+
+        if isinstance(expr, DotProduct):
+            terms = [
+                (coefficient, self.optimized[id(a)], self.optimized[id(b)])
+                for coefficient, a, b in expr.terms
+            ]
+            return self.optimize_dot_product(expr, terms)
+
+        return expr
+
+    def optimize_addition(self, expr: AddOp, a: Expression, b: Expression) -> Expression:
+        if isinstance(a, Scalar) and isinstance(b, Scalar):
+            return constant(a.value + b.value, self.prime)
+        if is_constant(a, 0, self.prime):
+            return b
+        if is_constant(b, 0, self.prime):
+            return a
+        return rebuild(expr, a, b)
+
+    def optimize_subtraction(self, expr: SubOp, a: Expression, b: Expression) -> Expression:
+        if isinstance(a, Scalar) and isinstance(b, Scalar):
+            return constant(a.value - b.value, self.prime)
+        if is_constant(b, 0, self.prime):
+            return a
+        return rebuild(expr, a, b)
+
+    def optimize_linear_combination(
+            self,
+            expr: LinearCombination,
+            terms: List[Tuple[int, Expression]]
+        ) -> Expression:
+
+        # Scalars are folded into the constant, scalar factors into the coefficients, and nested
+        # linear combinations are flattened. Terms appearing several times are merged.
+        offset = expr.constant
+        coefficients: Dict[int, int] = {}
+        nodes: Dict[int, Expression] = {}
+
+        def add_term(coefficient: int, term: Expression) -> None:
+            nonlocal offset
+            if isinstance(term, LinearCombination):
+                offset += coefficient * term.constant
+                for term_coefficient, subterm in term.terms:
+                    add_term(coefficient * term_coefficient, subterm)
+                return
+
+            factor, core = split_factor(term, self.prime)
+            if core is None:
+                offset += coefficient * factor
+                return
+
+            nodes[id(core)] = core
+            coefficients[id(core)] = coefficients.get(id(core), 0) + coefficient * factor
+
+        for coefficient, term in terms:
+            add_term(coefficient, term)
+
+        offset %= self.prime
+        new_terms = [
+            (reduce_coefficient(coefficient, self.prime), nodes[key])
+            for key, coefficient in coefficients.items()
+            if coefficient % self.prime != 0
+        ]
+
+        if not new_terms:
+            return constant(offset, self.prime)
+        if offset == 0 and len(new_terms) == 1 and new_terms[0][0] == 1:
+            return new_terms[0][1]
+
+        # Reuse the node if nothing was simplified.
+        original = expr.terms
+        if (
+            offset == expr.constant and len(new_terms) == len(original)
+            and all(
+                new[0] == old[0] and new[1] is old[1]
+                for new, old in zip(new_terms, original)
+            )
+        ):
+            return expr
+
+        return LinearCombination(new_terms, offset)
+
+    def optimize_multiplication(self, expr: MultOp, a: Expression, b: Expression) -> Expression:
+        factor_a, core_a = split_factor(a, self.prime)
+        factor_b, core_b = split_factor(b, self.prime)
+        factor = (factor_a * factor_b) % self.prime
+
+        if factor == 0:
+            return constant(0, self.prime)
+
+        if core_a is None and core_b is None:
+            return constant(factor, self.prime)
+
+        # Multiplication of two secret values, with all the scalar factors moved out of it.
+        if core_a is not None and core_b is not None:
+            core = rebuild(expr, core_a, core_b)
+        else:
+            core = core_a if core_a is not None else core_b
+
+        if factor == 1:
+            return core
+
+        # Reuse the node if it is already a single scalar multiplication.
+        if core is a and is_constant(b, factor, self.prime):
+            return rebuild(expr, a, b)
+        if core is b and is_constant(a, factor, self.prime):
+            return rebuild(expr, a, b)
+
+        return MultOp(core, constant(factor, self.prime), id=FOLDED_ID)
+
+    def optimize_dot_product(
+            self,
+            expr: DotProduct,
+            terms: List[Tuple[int, Expression, Expression]]
+        ) -> Expression:
+
+        # The scalar factors of the operands are moved into the coefficients, and the products
+        # with a public operand are linear terms.
+        products: List[Tuple[int, Expression, Expression]] = []
+        linear: List[Tuple[int, Expression]] = []
+        for coefficient, a, b in terms:
+            factor_a, core_a = split_factor(a, self.prime)
+            factor_b, core_b = split_factor(b, self.prime)
+            factor = reduce_coefficient(coefficient * factor_a * factor_b, self.prime)
+            if factor == 0:
+                continue
+            if core_a is not None and core_b is not None:
+                products.append((factor, core_a, core_b))
+            else:
+                linear.append((factor, constant(1) if core_a is core_b else core_a or core_b))
+
+        if not linear and len(products) == len(terms) and all(
+            new[0] == old[0] and new[1] is old[1] and new[2] is old[2]
+            for new, old in zip(products, terms)
+        ):
+            return expr
+
+        dot = [(1, DotProduct(products, id=expr.id))] if products else []
+        combination = LinearCombination(dot + linear)
+        return self.optimize_linear_combination(combination, combination.terms)
+
+
+class Rebalancer:
+    """
+    Rebalances the chains of multiplications of secret values of a simplified expression.
+
+    A multiplication only used by another multiplication of secret values is part of the chain
+    of its parent, and the factors of a chain are multiplied back as a tree of minimal depth. The
+    new multiplications reuse the IDs of the chain, of which there are always enough.
+
+    The multiplications only used by a linear combination are fused into a dot product, which
+    takes the ID of the first of them.
+    """
+
+    def __init__(self):
+        self.rebalanced: Dict[int, Expression] = {}
+        self.depths: Dict[int, int] = {}
+        self.chains: Dict[int, Tuple[List[Expression], List[bytes]]] = {}
+        self.uses: Dict[int, int] = {}
+
+    def rebalance(self, expr: Expression) -> Expression:
+        nodes = list(postorder(expr))
+        absorbed = find_absorbed(nodes)
+        self.uses = count_uses(nodes)
+
+        for node in nodes:
+            if is_secret_multiplication(node):
+                factors, ids = self.collect_chain(node, absorbed)
+                if id(node) in absorbed:
+                    self.chains[id(node)] = (factors, ids)
+                    continue
+                result = self.build_product(node, factors, ids)
+            else:
+                result = self.rebuild_node(node)
+
+            self.rebalanced[id(node)] = result
+            self.depths.setdefault(id(result), self.node_depth(result))
+
+        return self.rebalanced[id(expr)]
+
+    def depth(self, expr: Expression) -> int:
+        """
+        Multiplicative depth of a rebalanced node.
+        """
+        return self.depths.get(id(expr), 0)
+
+    def node_depth(self, expr: Expression) -> int:
+        operand_depth = max((self.depth(child) for child in children(expr)), default=0)
+        if is_secret_multiplication(expr) or isinstance(expr, DotProduct):
+            return operand_depth + 1
+        return operand_depth
+
+    def collect_chain(
+            self,
+            node: MultOp,
+            absorbed: Set[int]
+        ) -> Tuple[List[Expression], List[bytes]]:
+        """
+        Factors and multiplication IDs of the chain ending at node. The lists of an absorbed
+        operand belong to a single chain, so the smaller lists are merged into the larger ones.
+        """
+        factors: List[Expression] = []
+        ids: List[bytes] = []
+        for operand in (node.a, node.b):
+            if id(operand) in absorbed:
+                operand_factors, operand_ids = self.chains.pop(id(operand))
+            else:
+                operand_factors, operand_ids = [self.rebalanced[id(operand)]], []
+
+            if len(operand_factors) > len(factors):
+                factors, operand_factors = operand_factors, factors
+                ids, operand_ids = operand_ids, ids
+            factors.extend(operand_factors)
+            ids.extend(operand_ids)
+
+        ids.append(node.id)
+        return factors, ids
+
+    def build_product(
+            self,
+            node: MultOp,
+            factors: List[Expression],
+            ids: List[bytes]
+        ) -> Expression:
+        """
+        Product of the factors as a tree of minimal multiplicative depth.
+        """
+        if len(factors) == 2:
+            return rebuild(node, factors[0], factors[1])
+
+        id_pool = iter(ids)
+        counter = itertools.count()
+        heap: List[Tuple[int, int, Expression]] = []
+
+        # Powers of repeated factors are computed by square-and-multiply: the squares are computed
+        # in sequence, and the ones matching the bits of the exponent become factors of the product.
+        exponents: Dict[int, int] = collections.Counter(id(factor) for factor in factors)
+        distinct = {id(factor): factor for factor in factors}
+        for key, exponent in exponents.items():
+            power = distinct[key]
+            while True:
+                if exponent & 1:
+                    heapq.heappush(heap, (self.depth(power), next(counter), power))
+                exponent >>= 1
+                if not exponent:
+                    break
+                power = self.multiply(power, power, id_pool)
+
+        # The two shallowest factors are multiplied first, which minimizes the depth of the tree.
+        while len(heap) > 1:
+            _, _, a = heapq.heappop(heap)
+            _, _, b = heapq.heappop(heap)
+            product = self.multiply(a, b, id_pool)
+            heapq.heappush(heap, (self.depth(product), next(counter), product))
+
+        return heap[0][2]
+
+    def multiply(self, a: Expression, b: Expression, id_pool: Iterator[bytes]) -> MultOp:
+        product = MultOp(a, b, id=next(id_pool))
+        self.depths[id(product)] = max(self.depth(a), self.depth(b)) + 1
+        return product
+
+    def rebuild_node(self, expr: Expression) -> Expression:
+        if isinstance(expr, MultOp):
+            return rebuild(expr, self.rebalanced[id(expr.a)], self.rebalanced[id(expr.b)])
+
+        if isinstance(expr, DotProduct):
+            terms = [
+                (coefficient, self.rebalanced[id(a)], self.rebalanced[id(b)])
+                for coefficient, a, b in expr.terms
+            ]
+            if all(new[1] is old[1] and new[2] is old[2] for new, old in zip(terms, expr.terms)):
+                return expr
+            return DotProduct(terms, id=expr.id)
+
+        # Binary additions and subtractions become terms of linear combinations.
+        if isinstance(expr, (AddOp, SubOp)):
+            sign = 1 if isinstance(expr, AddOp) else -1
+            terms = [(1, expr.a), (sign, expr.b)]
+            constant = 0
+        elif isinstance(expr, LinearCombination):
+            terms = expr.terms
+            constant = expr.constant
+        else:
+            return expr
+
+        # The products are only fused if there are several of them.
+        fusable = [
+            is_secret_multiplication(self.rebalanced[id(term)]) and self.uses.get(id(term)) == 1
+            for _, term in terms
+        ]
+        fused = sum(fusable) > 1
+
+        new_terms: List[Tuple[int, Expression]] = []
+        products: List[Tuple[int, Expression, Expression]] = []
+        dot_id = None
+        for (coefficient, term), is_fusable in zip(terms, fusable):
+            rebalanced = self.rebalanced[id(term)]
+            if isinstance(rebalanced, LinearCombination) and rebalanced is not term:
+                new_terms.extend((coefficient * c, t) for c, t in rebalanced.terms)
+                constant += coefficient * rebalanced.constant
+            elif fused and is_fusable:
+                products.append((coefficient, rebalanced.a, rebalanced.b))
+                dot_id = rebalanced.id if dot_id is None else dot_id
+            else:
+                new_terms.append((coefficient, rebalanced))
+
+        if products:
+            dot = DotProduct(products, id=dot_id)
+            self.depths[id(dot)] = self.node_depth(dot)
+            new_terms.append((1, dot))
+
+        if (
+            isinstance(expr, LinearCombination)
+            and len(new_terms) == len(terms)
+            and all(new[1] is old[1] for new, old in zip(new_terms, terms))
+        ):
+            return expr
+        return LinearCombination(new_terms, constant)
+
+
+def is_secret_multiplication(expr: Expression) -> bool:
+    """
+    Whether a node of a simplified expression is a multiplication of two secret values, knowing
+    that all the public subexpressions were folded into scalars.
+    """
+    return (
+        isinstance(expr, MultOp)
+        and not isinstance(expr.a, Scalar)
+        and not isinstance(expr.b, Scalar)
+    )
+
+
+def count_uses(nodes: List[Expression]) -> Dict[int, int]:
+    """
+    Number of uses of each node as an operand of the given nodes.
+    """
+    uses: Dict[int, int] = collections.Counter()
+    for node in nodes:
+        for child in children(node):
+            uses[id(child)] += 1
+    return uses
+
+
+def find_absorbed(nodes: List[Expression]) -> Set[int]:
+    """
+    Multiplications of secret values whose only use is in another multiplication of secret values.
+    """
+    uses = count_uses(nodes)
+
+    return {
+        id(child)
+        for node in nodes if is_secret_multiplication(node)
+        for child in (node.a, node.b)
+        if is_secret_multiplication(child) and uses[id(child)] == 1
+    }
+
+
+def constant(value: int, prime: int = Share.prime) -> Scalar:
+    return Scalar(value % prime, id=FOLDED_ID)
+
+
+def reduce_coefficient(coefficient: int, prime: int = Share.prime) -> int:
+    """
+    Coefficient reduced in the field, keeping small negative coefficients readable.
+    """
+    coefficient %= prime
+    if coefficient > prime // 2:
+        return coefficient - prime
+    return coefficient
+
+
+def is_constant(expr: Expression, value: int, prime: int = Share.prime) -> bool:
+    return isinstance(expr, Scalar) and (expr.value - value) % prime == 0
+
+
+def split_factor(expr: Expression, prime: int = Share.prime) -> Tuple[int, Optional[Expression]]:
+    """
+    Split an optimized expression into a scalar factor and the rest of the expression, or None
+    if the expression is a scalar.
+    """
+    if isinstance(expr, Scalar):
+        return expr.value % prime, None
+
+    # Optimized scalar multiplications have a single scalar operand.
+    if isinstance(expr, MultOp):
+        if isinstance(expr.b, Scalar):
+            return expr.b.value % prime, expr.a
+        if isinstance(expr.a, Scalar):
+            return expr.a.value % prime, expr.b
+
+    return 1, expr
+
+
+def rebuild(expr: Expression, a: Expression, b: Expression) -> Expression:
+    """
+    Operation of expr applied to the optimized operands, reusing expr if they did not change.
+    """
+    if a is expr.a and b is expr.b:
+        return expr
+
+    if isinstance(expr, AddOp):
+        return AddOp(a, b)
+    if isinstance(expr, SubOp):
+        return SubOp(a, b)
+    return MultOp(a, b, id=expr.id)
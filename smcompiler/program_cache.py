@@ -0,0 +1,113 @@
+"""
+On-disk cache of compiled programs.
+
+Example:
+>>> cache = ProgramCache("/var/cache/smcompiler")
+>>> program = cache.compile(expr, ["Alice", "Bob"])
+
+A program is stored in a file of the cache directory named after the hash of its circuit: the
+structure of the expression, the participants and the prime of the field. A recurring computation,
+whose secrets have the same IDs at each run, then skips the optimization and the compilation of its
+expression, and its parties know at once the Beaver triplets to request.
+
+The files are unpickled, so the directory must only be writable by trusted users.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import List, Optional
+
+from compiler import Program, compile_expression
+from expression import Expression, flatten
+from secret_sharing import Share
+
+
+# Version of the format of the cached programs, changed with the compiler to invalidate the cache.
+FORMAT_VERSION = 1
+
+
+def circuit_hash(
+        expr: Expression,
+        participant_ids: List[str],
+        prime: int = Share.prime
+    ) -> str:
+    """
+    Hash of the structure of an expression, its participants and its prime. Each node is hashed
+    with its class and attributes, its operands being replaced by their index in post-order.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(repr((FORMAT_VERSION, sorted(participant_ids), prime)).encode("UTF-8"))
+    for cls, state in flatten(expr):
+        digest.update(repr((cls.__qualname__, sorted(state.items()))).encode("UTF-8"))
+    return digest.hexdigest()
+
+
+class ProgramCache:
+    """
+    Directory of compiled programs, one file per circuit.
+
+    Attributes:
+        directory: Path of the directory, created when the first program is stored
+        hits: Number of programs loaded from the cache
+        misses: Number of programs compiled as they were not in the cache
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.expanduser(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> str:
+        """Path of the file of the program with the given circuit hash."""
+        return os.path.join(self.directory, f"{key}.program")
+
+    def load(self, key: str) -> Optional[Program]:
+        """
+        Program with the given circuit hash, or None if it is not cached or its file is unreadable.
+        """
+        try:
+            with open(self.path(key), "rb") as file:
+                program = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # A truncated or outdated file is replaced by the compiled program.
+            return None
+        return program if isinstance(program, Program) else None
+
+    def store(self, key: str, program: Program) -> None:
+        """
+        Write the program with the given circuit hash. The file is renamed once written, so
+        concurrent parties never read a partial program.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                pickle.dump(program, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.path(key))
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def compile(
+            self,
+            expr: Expression,
+            participant_ids: List[str],
+            prime: int = Share.prime
+        ) -> Program:
+        """
+        Program computing the expression, loaded from the cache or compiled and stored in it.
+        """
+        key = circuit_hash(expr, participant_ids, prime)
+        program = self.load(key)
+        if program is not None:
+            self.hits += 1
+            return program
+
+        self.misses += 1
+        program = compile_expression(expr, prime=prime)
+        self.store(key, program)
+        return program
@@ -1,4 +1,10 @@
-from expression import Expression
+import uuid
+from typing import Optional
+
+from compiler import Program, compile_expression
+from expression import Expression, flatten, unflatten
+from program_cache import ProgramCache
+from secret_sharing import Share
 
 
 class ProtocolSpec:
@@ -7,8 +13,50 @@ class ProtocolSpec:
     Attributes:
         participant_ids: List of IDs of the participating clients
         expr: Expression to be computed
+        session_id: Session of the computation on the server, shared by all the clients running
+            this specification (default: a new random id)
+        seeded_triplets: Whether the clients expand their shares of the Beaver triplets from a
+            seed, instead of downloading them (default: False)
+        prime: Prime of the field of the computation, e.g. MERSENNE_61 for the share vectors
+            computed with NumPy when the results are below 2^61 - 1 (default: the one of Share)
+        program_cache: Directory of the on-disk cache of compiled programs, from which recurring
+            computations load their program instead of compiling it (default: None, no cache)
     """
 
-    def __init__(self, participant_ids: list, expr: Expression):
+    def __init__(
+            self,
+            participant_ids: list,
+            expr: Expression,
+            session_id: Optional[str] = None,
+            seeded_triplets: bool = False,
+            prime: int = Share.prime,
+            program_cache: Optional[str] = None
+        ):
         self.participant_ids = participant_ids
         self.expr = expr
+        self.session_id = uuid.uuid4().hex if session_id is None else session_id
+        self.seeded_triplets = seeded_triplets
+        self.prime = prime
+        self.program_cache = program_cache
+        self._program: Optional[Program] = None
+
+    @property
+    def program(self) -> Program:
+        """Program computing the expression, compiled once and reused across runs."""
+        if self._program is None and self.program_cache is not None:
+            cache = ProgramCache(self.program_cache)
+            self._program = cache.compile(self.expr, self.participant_ids, self.prime)
+        elif self._program is None:
+            self._program = compile_expression(self.expr, prime=self.prime)
+        return self._program
+
+    def __getstate__(self):
+        # The expression is pickled as a flat list of nodes, as pickling nested objects recurses
+        # once per level of the expression.
+        state = self.__dict__.copy()
+        state["expr"] = flatten(self.expr)
+        return state
+
+    def __setstate__(self, state):
+        state["expr"] = unflatten(state["expr"])
+        self.__dict__.update(state)
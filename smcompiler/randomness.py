@@ -0,0 +1,138 @@
+"""
+Cryptographically secure randomness for the generation of shares and Beaver triplets.
+
+Example:
+>>> pool = RandomPool(seed=b"x")
+>>> pool.field_elements(3, 2**61 - 1)
+[1742496626934915143, 1009222288145384981, 621632089713055430]
+
+The bytes are read from os.urandom into a large buffer, or expanded from a seed with SHAKE-256 for
+reproducible runs, and the field elements are drawn in bulk by rejection sampling: the random
+integers with the bit length of the prime are accepted if they are below the prime, so the
+elements are uniform without any bias of a reduction.
+"""
+
+import hashlib
+import os
+import threading
+from typing import List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Number of bytes read at once from the source of randomness.
+BUFFER_BYTES = 1 << 16
+
+
+class RandomPool:
+    """
+    Buffer of random bytes, from which field elements are drawn in bulk. Safe to use from several
+    threads.
+
+    Attributes:
+        seed: Seed of the SHAKE-256 stream of bytes, or None to read them from os.urandom
+        buffer_bytes: Number of bytes read at once from the source
+    """
+
+    def __init__(self, seed: Optional[bytes] = None, buffer_bytes: int = BUFFER_BYTES):
+        self.seed = seed
+        self.buffer_bytes = buffer_bytes
+        self.buffer = b""
+        self.position = 0
+        self.counter = 0
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def read(self, size: int) -> bytes:
+        """
+        Random bytes, taken from the buffer which is refilled when it runs out.
+        """
+        with self.lock:
+            # A forked process must not reuse the bytes of its parent.
+            if self.seed is None and self.pid != os.getpid():
+                self.buffer, self.position, self.pid = b"", 0, os.getpid()
+
+            chunks = []
+            while size > 0:
+                if self.position == len(self.buffer):
+                    # The seeded stream is expanded by blocks of the same size, so it does not
+                    # depend on the sizes of the reads.
+                    refill_size = self.buffer_bytes
+                    if self.seed is None:
+                        refill_size = max(size, refill_size)
+                    self.buffer = self.refill(refill_size)
+                    self.position = 0
+                chunk = self.buffer[self.position:self.position + size]
+                self.position += len(chunk)
+                size -= len(chunk)
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+    def refill(self, size: int) -> bytes:
+        """
+        Next bytes of the source. Must be called with the lock held.
+        """
+        if self.seed is None:
+            return os.urandom(size)
+        self.counter += 1
+        return hashlib.shake_256(self.seed + self.counter.to_bytes(8, "big")).digest(size)
+
+    def field_elements(self, count: int, prime: int) -> List[int]:
+        """
+        Uniform elements of the field of the given prime.
+        """
+        bits = prime.bit_length()
+        width = (bits + 7) // 8
+        mask = (1 << bits) - 1
+
+        values: List[int] = []
+        while len(values) < count:
+            # A draw is accepted with probability prime / 2^bits, which is more than 1/2.
+            missing = count - len(values)
+            draws = missing * (mask + 1) // prime + 8
+            data = self.read(draws * width)
+            draws_values = (
+                int.from_bytes(data[start:start + width], "big") & mask
+                for start in range(0, len(data), width)
+            )
+            values += [value for value in draws_values if value < prime]
+        del values[count:]
+        return values
+
+    def field_array(self, count: int, prime: int):
+        """
+        Uniform elements of the field of a prime below 2^64, as a NumPy uint64 array.
+        """
+        bits = prime.bit_length()
+        mask = np.uint64((1 << bits) - 1)
+
+        arrays = []
+        missing = count
+        while missing > 0:
+            draws = missing * (1 << bits) // prime + 8
+            values = np.frombuffer(self.read(draws * 8), dtype=">u8").astype(np.uint64) & mask
+            values = values[values < np.uint64(prime)][:missing]
+            arrays.append(values)
+            missing -= len(values)
+        return np.concatenate(arrays)
+
+
+# Pool of the process, used by the shares and triplets unless another one is given.
+default_pool = RandomPool()
+
+
+def field_elements(count: int, prime: int) -> List[int]:
+    """
+    Uniform elements of the field of the given prime, from the pool of the process.
+    """
+    return default_pool.field_elements(count, prime)
+
+
+def token_bytes(size: int) -> bytes:
+    """
+    Random bytes from the pool of the process, e.g. for seeds.
+    """
+    return default_pool.read(size)
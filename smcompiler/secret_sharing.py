@@ -1,66 +1,229 @@
 """
 Secret sharing scheme.
+
+Shares are in the field of the default 129-bit prime, unless they are given another prime. In the
+field of the Mersenne prime 2^61 - 1, share vectors store their values in NumPy uint64 arrays
+when NumPy is installed, and compute their element-wise operations without Python integers.
 """
 
 from __future__ import annotations
 
-from typing import List, Final
+from typing import List, Final, Optional, Sequence, Tuple, Union
 
 # Added imports
-import random
+import hashlib
 import jsonpickle
+import randomness
 from expression import Secret
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Beginning of the jsonpickle representation of a share, followed by its value and a brace.
+SHARE_PREFIX: Final[str] = '{"py/object": "secret_sharing.Share", "value": '
+
+# Mersenne prime 2^61 - 1, whose field elements and sums fit in 64 bits.
+MERSENNE_61: Final[int] = 2**61 - 1
+
 class Share:
     """
     A secret share in a finite field.
     """
     
-    # Represents prime p in the field.
-    prime : Final[int] = 340282366920938463463374607431768211507
+    # Represents prime p in the field, unless the share is given another prime.
+    prime: int = 340282366920938463463374607431768211507
 
     # Adapt constructor arguments as you wish
-    def __init__(self, value: int):
+    def __init__(self, value: int, prime: Optional[int] = None):
 
         self.value = value
+        # Shares of the default field keep the representation they had without prime.
+        if prime is not None and prime != Share.prime:
+            self.prime = prime
 
     def __repr__(self):
         # Helps with debugging.
         return f"{self.__class__.__name__}({repr(self.value)})"
 
     def __add__(self, other):
-        return Share((self.value + other.value) % self.prime)
+        return Share((self.value + other.value) % self.prime, self.prime)
 
     def __sub__(self, other):
-        return Share((self.value - other.value) % self.prime)
+        return Share((self.value - other.value) % self.prime, self.prime)
 
     def __mul__(self, other):
-        return Share((self.value * other.value) % self.prime)
+        return Share((self.value * other.value) % self.prime, self.prime)
 
     def serialize(self):
-        """Generate a representation suitable for passing in a message."""
-        return jsonpickle.encode(self)
+        """
+        Generate a representation suitable for passing in a message.
+        The representation is the one of jsonpickle, written directly as it is much faster.
+        """
+        if self.prime != Share.prime:
+            return jsonpickle.encode(self)
+        return f"{SHARE_PREFIX}{self.value}}}"
 
     @staticmethod
     def deserialize(serialized) -> Share:
         """Restore object from its serialized representation."""
+        if isinstance(serialized, bytes):
+            serialized = serialized.decode("UTF-8")
+        # Shares of other fields also have their prime, and are decoded by jsonpickle.
+        value = serialized[len(SHARE_PREFIX):-1]
+        if serialized.startswith(SHARE_PREFIX) and serialized.endswith("}") and value.isdigit():
+            return Share(int(value))
         return jsonpickle.decode(serialized)
 
-def share_secret(secret: int, num_shares: int) -> List[Share]:
-    """Generate secret shares."""
+class ShareVector:
+    """
+    Shares of a vector of secrets in the finite field, with element-wise operations.
+    A single share is broadcast to the length of the vector.
+    The values are a uint64 array in the field of MERSENNE_61 if NumPy is installed, a list otherwise.
+    """
+
+    def __init__(self, values: Sequence[int], prime: int = Share.prime):
+        self.prime = prime
+        if uses_arrays(prime):
+            self.values = np.asarray(values, dtype=np.uint64)
+        else:
+            self.values = values if isinstance(values, list) else list(values)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({repr(self.to_list())})"
+
+    def __len__(self):
+        return len(self.values)
+
+    def __add__(self, other):
+        p, y = self.prime, self._operand(other)
+        if not isinstance(self.values, list):
+            return ShareVector(add_m61(self.values, y), p)
+        return ShareVector([(x + y) % p for x, y in zip(self.values, y)], p)
+
+    def __sub__(self, other):
+        p, y = self.prime, self._operand(other)
+        if not isinstance(self.values, list):
+            return ShareVector(sub_m61(self.values, y), p)
+        return ShareVector([(x - y) % p for x, y in zip(self.values, y)], p)
+
+    def __mul__(self, other):
+        p, y = self.prime, self._operand(other)
+        if not isinstance(self.values, list):
+            return ShareVector(mul_m61(self.values, y), p)
+        return ShareVector([(x * y) % p for x, y in zip(self.values, y)], p)
+
+    def _operand(self, other: Union[Share, ShareVector]):
+        if isinstance(other, Share):
+            if not isinstance(self.values, list):
+                return np.full(len(self.values), other.value, dtype=np.uint64)
+            return [other.value] * len(self.values)
+        if len(other.values) != len(self.values):
+            raise ValueError(f"Vectors of lengths {len(self.values)} and {len(other.values)}")
+        return other.values
+
+    def to_list(self) -> List[int]:
+        """Values of the shares as Python integers."""
+        if isinstance(self.values, list):
+            return self.values
+        return self.values.tolist()
+
+    @staticmethod
+    def broadcast(share: Union[Share, ShareVector], length: int) -> ShareVector:
+        """Vector of the given length, repeating a single share."""
+        if isinstance(share, ShareVector):
+            return share
+        return ShareVector([share.value] * length, share.prime)
+
 
-    secret_shares = []
-    sum = 0
-    for i in range(0, num_shares-1):
-        random_value = random.randint(0, Share.prime - 1)
-        sum += random_value
-        secret_shares.append(Share(random_value))
+def uses_arrays(prime: int) -> bool:
+    """Whether the share vectors of the field of the given prime store their values in arrays."""
+    return np is not None and prime == MERSENNE_61
 
-    secret_shares.insert(0, Share((secret - sum) % Share.prime))
+
+def reduce_m61(x):
+    """Reduce a uint64 array modulo 2^61 - 1, using 2^61 = 1."""
+    x = (x & np.uint64(MERSENNE_61)) + (x >> np.uint64(61))
+    return np.where(x >= np.uint64(MERSENNE_61), x - np.uint64(MERSENNE_61), x)
+
+
+def add_m61(x, y):
+    """Element-wise sum modulo 2^61 - 1 of uint64 arrays of field elements."""
+    return reduce_m61(x + y)
+
+
+def sub_m61(x, y):
+    """Element-wise difference modulo 2^61 - 1 of uint64 arrays of field elements."""
+    return reduce_m61(x + (np.uint64(MERSENNE_61) - y))
+
+
+def mul_m61(x, y):
+    """
+    Element-wise product modulo 2^61 - 1 of uint64 arrays of field elements. The 122-bit products
+    are computed from 32-bit halves, whose partial products fit in 64 bits.
+    """
+    low_mask = np.uint64(0xFFFFFFFF)
+    x_low, x_high = x & low_mask, x >> np.uint64(32)
+    y_low, y_high = y & low_mask, y >> np.uint64(32)
+
+    low = x_low * y_low  # below 2^64
+    middle = x_low * y_high + x_high * y_low  # below 2^62
+    high = x_high * y_high  # below 2^58
+
+    # x * y = high * 2^64 + middle * 2^32 + low, where 2^64 = 2^3 and 2^61 = 1 modulo 2^61 - 1.
+    middle_low = (middle & np.uint64(2**29 - 1)) << np.uint64(32)
+    total = (high << np.uint64(3)) + (middle >> np.uint64(29)) + middle_low + reduce_m61(low)
+    return reduce_m61(total)
+
+
+def share_secret(
+        secret: int,
+        num_shares: int,
+        prime: int = Share.prime,
+        random_values: Optional[List[int]] = None
+    ) -> List[Share]:
+    """
+    Generate secret shares. The num_shares - 1 random shares are drawn from the pool of
+    randomness, unless they are given, e.g. drawn together for several secrets.
+    """
+
+    if random_values is None:
+        random_values = randomness.field_elements(num_shares - 1, prime)
+
+    secret_shares = [Share(value, prime) for value in random_values]
+    secret_shares.insert(0, Share((secret - sum(random_values)) % prime, prime))
 
     return secret_shares
 
 
+def share_vector(
+        secrets: List[int],
+        num_shares: int,
+        prime: int = Share.prime
+    ) -> List[ShareVector]:
+    """
+    Generate secret shares of each element of a vector, one share vector per party.
+    The random shares of all the elements are drawn at once.
+    """
+
+    length = len(secrets)
+    if uses_arrays(prime):
+        random_values = randomness.default_pool.field_array((num_shares - 1) * length, prime)
+        random_vectors = random_values.reshape(num_shares - 1, length)
+        first = np.array([secret % prime for secret in secrets], dtype=np.uint64)
+        for values in random_vectors:
+            first = sub_m61(first, values)
+        return [ShareVector(first, prime)] + [ShareVector(values, prime) for values in random_vectors]
+
+    random_values = randomness.field_elements((num_shares - 1) * length, prime)
+    random_vectors = [random_values[i * length:(i + 1) * length] for i in range(num_shares - 1)]
+    first = [secret % prime for secret in secrets]
+    for values in random_vectors:
+        first = [(x - y) % prime for x, y in zip(first, values)]
+    return [ShareVector(first, prime)] + [ShareVector(values, prime) for values in random_vectors]
+
+
 def reconstruct_secret(shares: List[Share]) -> int:
     """Reconstruct the secret from shares."""
     
@@ -68,5 +231,44 @@ def reconstruct_secret(shares: List[Share]) -> int:
     for share in shares:
         secret = secret + share.value
 
-    return secret % Share.prime 
+    prime = shares[0].prime if shares else Share.prime
+    return secret % prime
+
+
+def reconstruct_vector(shares: List[ShareVector]) -> List[int]:
+    """Reconstruct the secret vector from share vectors."""
 
+    total = shares[0]
+    for share in shares[1:]:
+        total = total + share
+    return total.to_list()
+
+
+def prg_value(seed: bytes, op_id: Union[bytes, str], index: int, prime: int = Share.prime) -> int:
+    """
+    Pseudorandom field element derived from a seed for an operation, different for each index.
+    """
+    if isinstance(op_id, bytes):
+        op_id = op_id.decode("ASCII")
+    # The server receives the IDs in their URL form, where / and + are replaced.
+    op_id = op_id.replace("/", "_").replace("+", "-")
+
+    digest = hashlib.blake2b(f"{op_id}:{index}".encode("UTF-8"), key=seed, digest_size=32).digest()
+    # The bias of the reduction of a 256-bit integer is negligible.
+    return int.from_bytes(digest, "big") % prime
+
+
+def seeded_triplet(
+        seed: bytes,
+        op_id: Union[bytes, str],
+        correction: Optional[int] = None,
+        prime: int = Share.prime
+    ) -> Tuple[Share, Share, Share]:
+    """
+    Shares of a Beaver triplet expanded from the seed of a client. The share of c of the client
+    receiving the correction is the correction itself.
+    """
+    a = prg_value(seed, op_id, 0, prime)
+    b = prg_value(seed, op_id, 1, prime)
+    c = prg_value(seed, op_id, 2, prime) if correction is None else correction
+    return Share(a, prime), Share(b, prime), Share(c, prime)
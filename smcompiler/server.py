@@ -3,108 +3,290 @@ Trusted server that should help SMC client to communicate.
 You should not need to change this file.
 """
 
-import collections
+import argparse
+import logging
 import sys
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional
 
 from flask import Flask, request, Response, jsonify
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
 
-from ttp import TrustedParamGenerator
+from codec import BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE, encode_frames, pack_shares
+from secret_sharing import Share
+from sessions import DEFAULT_SESSION, SessionClosedError, SessionRegistry
+from transport import sanitize_url_param
 
 
 app: Flask = Flask("Trusted Third Party Server")
-store: Dict[str, Dict[Tuple[str, str], bytes]] = collections.defaultdict(dict)
-ttp: TrustedParamGenerator = TrustedParamGenerator()
+sessions: SessionRegistry = SessionRegistry()
 
+# Maximum time in seconds a request can wait for a message before the server answers 404.
+MAX_WAIT = 30.0
+# Whether each request is printed, which the production mode disables.
+verbose = True
 
-@app.route("/private/<sender_id>/<receiver_id>/<label>", methods=["POST"])
-def send_private_message(sender_id: str, receiver_id: str, label: str):
+
+def route(rule: str, **options) -> Callable:
+    """
+    Register a view both for the default session and for the session given in the URL prefix
+    /sessions/<session_id>. The view gets the session id as keyword argument session_id.
+    """
+    def decorator(view: Callable) -> Callable:
+        app.add_url_rule(rule, view.__name__, view, defaults={"session_id": DEFAULT_SESSION}, **options)
+        app.add_url_rule(f"/sessions/<session_id>{rule}", f"{view.__name__}_session", view, **options)
+        return view
+    return decorator
+
+
+@app.route("/sessions/<session_id>", methods=["POST"])
+def open_session(session_id: str):
+    """
+    Open a session with the participants given as a JSON list, unless it is already open.
+    Without a body, or for sessions opened implicitly by their first request, the participants
+    are the ones of the server. The body can also be a JSON object with the participants and the
+    prime of the field of the computation.
+    """
+    body = request.get_json(force=True, silent=True)
+    prime = Share.prime
+    if isinstance(body, dict):
+        prime = int(body.get("prime", prime))
+        body = body.get("participants")
+    participants = body
+    if participants is not None:
+        # The clients are identified by their sanitized id in the URLs.
+        participants = [sanitize_url_param(participant) for participant in participants]
+    sessions.open(session_id, participants, prime)
+    log(f"[ OPEN     ] SESSION {session_id}")
+    return Response(status=200)
+
+
+@app.errorhandler(SessionClosedError)
+def session_closed(error: SessionClosedError):
+    """
+    Requests arriving after all the participants closed their session are refused.
+    """
+    return Response(str(error), status=410)
+
+
+@app.route("/sessions/<session_id>", methods=["DELETE"])
+@app.route("/sessions/<session_id>/<client_id>", methods=["DELETE"])
+def close_session(session_id: str, client_id: Optional[str] = None):
+    """
+    A client is done with a session, which is discarded once all its participants are.
+    Without a client, the session is discarded right away.
+    """
+    sessions.close(session_id, client_id)
+    log(f"[ CLOSE    ] SESSION {session_id} / CLIENT {client_id}")
+    return Response(status=200)
+
+
+@route("/private/<sender_id>/<receiver_id>/<label>", methods=["POST"])
+def send_private_message(sender_id: str, receiver_id: str, label: str, session_id: str):
     """
     The client send a private message to the server.
     """
-    print(
+    log(
         f"[ SEND     ] SENDER {sender_id} / LABEL {label} / RECEIVER {receiver_id}"
     )
-    _set_value("private", (receiver_id, label), request.get_data())
+    store = sessions.get(session_id).store
+    store.set_value("private", (receiver_id, label), request.get_data(), sender_id)
     return Response(status=200)
 
 
-@app.route("/private/<receiver_id>/<label>", methods=["GET"])
-def retrieve_private_message(receiver_id: str, label: str):
+@route("/private/<receiver_id>/<label>", methods=["GET"])
+def retrieve_private_message(receiver_id: str, label: str, session_id: str):
     """
     The client retrieve a private message from the server.
+    With a count parameter, the client retrieve all its private messages with the label, indexed by
+    sender, once at least count of them were sent.
     """
-    res = _get_value("private", (receiver_id, label))
+    store = sessions.get(session_id).store
+    if "count" in request.args:
+        count = request.args.get("count", 1, type=int)
+        messages = store.get_private_messages(receiver_id, label, count, _wait_time())
+        if len(messages) < count:
+            return Response(status=404)
+
+        log(f"[ RETRIEVE ] RECEIVER {receiver_id} / LABEL {label} / {len(messages)} SENDERS")
+        return _messages_response(messages)
+
+    res = store.get_value("private", (receiver_id, label), _wait_time())
     if res is not None:
-        print(f"[ RETRIEVE ] RECEIVER {receiver_id} / LABEL {label}")
+        log(f"[ RETRIEVE ] RECEIVER {receiver_id} / LABEL {label}")
         return res, 200
 
     return Response(status=404)
 
 
-@app.route("/public/<sender_id>/<label>", methods=["POST"])
-def publish_message(sender_id: str, label: str):
+@route("/public/<sender_id>/<label>", methods=["POST"])
+def publish_message(sender_id: str, label: str, session_id: str):
     """
     The client publish a public message on the server.
     """
-    print(f"[ PUBLISH  ] SENDER {sender_id} / LABEL {label}")
-    _set_value("public", (sender_id, label), request.get_data())
+    log(f"[ PUBLISH  ] SENDER {sender_id} / LABEL {label}")
+    sessions.get(session_id).store.set_value("public", (sender_id, label), request.get_data())
     return Response(status=200)
 
 
-@app.route("/public/<receiver_id>/<sender_id>/<label>", methods=["GET"])
-def retrieve_public_message(receiver_id: str, sender_id: str, label: str):
+@route("/public/<receiver_id>/<sender_id>/<label>", methods=["GET"])
+def retrieve_public_message(receiver_id: str, sender_id: str, label: str, session_id: str):
     """
     The client retrieve a public message from the server.
     """
-    res = _get_value("public", (sender_id, label))
+    res = sessions.get(session_id).store.get_value("public", (sender_id, label), _wait_time())
     if res is not None:
-        print(
+        log(
             f"[ RETRIEVE ] RECEIVER {receiver_id}. LABEL {label} / SENDER {sender_id}"
         )
         return res, 200
     return Response(status=404)
 
 
-@app.route("/shares/<client_id>/<op_id>", methods=["GET"])
-def retrieve_share(client_id: str, op_id: str):
+@route("/public/<receiver_id>/<label>", methods=["GET"])
+def retrieve_public_messages(receiver_id: str, label: str, session_id: str):
+    """
+    The client retrieve all the public messages with a label, once at least count of them
+    were published.
+    """
+    count = request.args.get("count", 1, type=int)
+    messages = sessions.get(session_id).store.get_public_messages(label, count, _wait_time())
+    if len(messages) < count:
+        return Response(status=404)
+
+    log(f"[ RETRIEVE ] RECEIVER {receiver_id}. LABEL {label} / {len(messages)} SENDERS")
+    return _messages_response(messages)
+
+
+@route("/shares/<client_id>/<op_id>", methods=["GET"])
+def retrieve_share(client_id: str, op_id: str, session_id: str):
     """
     The client retrieve Beaver triplets generated by the server.
     """
+    ttp = sessions.get(session_id).ttp
     shares = ttp.retrieve_share(client_id, op_id)
+    if _accepts_binary():
+        return Response(pack_shares(shares, ttp.prime), mimetype=BINARY_CONTENT_TYPE)
     return jsonify([share.serialize() for share in shares]), 200
 
 
-def _set_value(pool: str, channel: Tuple[str, str], data: bytes) -> None:
+@route("/shares/<client_id>", methods=["POST"])
+def retrieve_shares(client_id: str, session_id: str):
     """
-    Push data to a channel in a given pool and send an event.
+    The client retrieve the Beaver triplets of the operations given as a JSON list, in one request.
+    In binary, the shares of all the triplets are packed one after the other.
     """
-    store[pool][channel] = data
+    op_ids = request.get_json(force=True, silent=True)
+    if not isinstance(op_ids, list):
+        return Response("Expected a JSON list of operation IDs", status=400)
 
+    ttp = sessions.get(session_id).ttp
+    log(f"[ SHARES   ] CLIENT {client_id} / {len(op_ids)} OPERATIONS")
+    triplets = ttp.retrieve_shares(client_id, [sanitize_url_param(op_id) for op_id in op_ids])
+    if _accepts_binary():
+        packed = pack_shares((share for shares in triplets for share in shares), ttp.prime)
+        return Response(packed, mimetype=BINARY_CONTENT_TYPE)
+    return jsonify([[share.serialize() for share in shares] for shares in triplets]), 200
 
-def _get_value(pool: str, channel: Tuple[str, str]) -> Optional[bytes]:
+
+@route("/seeded/<client_id>", methods=["POST"])
+def retrieve_seeded(client_id: str, session_id: str):
     """
-    Subscribe to a channel in a given pool and get it once ready.
+    The client retrieve its seed, from which it expands its shares of the Beaver triplets of the
+    operations given as a JSON list. The designated client also gets the corrections of the triplets.
     """
-    if channel not in store[pool]:
-        return None
-    return store[pool][channel]
+    op_ids = request.get_json(force=True, silent=True)
+    if not isinstance(op_ids, list):
+        return Response("Expected a JSON list of operation IDs", status=400)
+
+    ttp = sessions.get(session_id).ttp
+    seed, corrections = ttp.retrieve_seeded(client_id, [sanitize_url_param(op_id) for op_id in op_ids])
+    log(f"[ SEEDED   ] CLIENT {client_id} / {len(op_ids)} OPERATIONS")
+    return jsonify({"seed": seed.hex(), "corrections": corrections}), 200
 
 
-def run(host: str, port: int, participants: List[str]) -> None:
+def _accepts_binary() -> bool:
+    """
+    Whether the client prefers the binary encoding of codec.py to JSON.
+    """
+    best_match = request.accept_mimetypes.best_match([JSON_CONTENT_TYPE, BINARY_CONTENT_TYPE])
+    return best_match == BINARY_CONTENT_TYPE
+
+
+def _messages_response(messages: Dict[str, bytes]) -> Response:
+    """
+    Messages indexed by sender, as frames or as a JSON object of the messages decoded in UTF-8.
+    """
+    if _accepts_binary():
+        return Response(encode_frames(messages), mimetype=BINARY_CONTENT_TYPE)
+    return jsonify({sender: data.decode("UTF-8") for sender, data in messages.items()})
+
+
+def _wait_time() -> float:
+    """
+    Time the client accepts to wait for a message, given by the wait parameter of the request.
+    """
+    return min(request.args.get("wait", 0.0, type=float), MAX_WAIT)
+
+
+def log(message: str) -> None:
+    """
+    Print a message about a request, unless the server runs in production mode.
+    """
+    if verbose:
+        print(message)
+
+
+class RelayServer(ThreadedWSGIServer):
+    """
+    Server of the production mode: each request has its own thread, and the connections of
+    hundreds of parties polling at once can wait to be accepted.
+    """
+    request_queue_size = 4096
+    daemon_threads = True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """
+    Request handler which only logs errors.
+    """
+
+    def log_request(self, *args, **kwargs) -> None:
+        pass
+
+
+def run(host: str, port: int, participants: List[str], production: bool = False) -> None:
     """
     Register the participants, then run the server.
+    The server listens on a Unix domain socket if host is of the form unix://<path>.
+
+    The production mode runs without the debugger and without logging each request.
     """
-    for participant in participants:
-        ttp.add_participant(participant)
-    app.run(host, port, debug=True, threaded=False, processes=1, use_reloader=False)
+    global sessions, verbose
+    # A server started in a forked process does not keep the sessions of its parent.
+    sessions = SessionRegistry(sanitize_url_param(participant) for participant in participants)
+
+    if production:
+        verbose = False
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        RelayServer(host, port, app, handler=QuietRequestHandler).serve_forever()
+        return
+
+    # Requests waiting for messages must not block the others, so each request has its own thread.
+    app.run(host, port, debug=True, threaded=True, processes=1, use_reloader=False)
 
 
 def main(args: List[str]) -> None:
     """
     Entrypoint of the program.
     """
-    run("localhost", 5000, args)
+    parser = argparse.ArgumentParser(description="Trusted server of the SMC clients.")
+    parser.add_argument("participants", nargs="*", help="identifiers of the participants")
+    parser.add_argument("--host", default="localhost", help="host, or unix://<path> for a Unix socket")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--production", action="store_true", help="run the production server")
+    options = parser.parse_args(args)
+
+    run(options.host, options.port, options.participants, options.production)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""
+Sessions of the trusted server: each computation has its own messages and Beaver triplets, so
+several computations can run on the same server, and they are discarded once it is over.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from secret_sharing import Share
+from store import MessageStore
+from ttp import TrustedParamGenerator
+
+
+# Session of the clients which do not give one.
+DEFAULT_SESSION = "default"
+# Time in seconds after which an unused session is discarded.
+SESSION_TTL = 3600.0
+# Time in seconds during which the requests on a closed session are refused.
+CLOSED_TTL = 600.0
+
+
+class SessionClosedError(Exception):
+    """
+    Raised on the use of a session which all its participants closed.
+    """
+
+
+class Session:
+    """
+    Messages and Beaver triplets of a computation. The triplets are generated in the background
+    from the creation of the session until it is closed, in the field of the given prime.
+
+    Attributes:
+        store: Messages exchanged by the clients
+        ttp: Trusted parameter generator of the Beaver triplets
+        closed_by: Clients which are done with the session
+        last_used: Time of the last use of the session, from time.monotonic
+    """
+
+    def __init__(self, participants: Iterable[str], prime: int = Share.prime):
+        self.store = MessageStore()
+        self.ttp = TrustedParamGenerator(prime=prime)
+        for participant in participants:
+            self.ttp.add_participant(participant)
+        self.ttp.start()
+
+        self.closed_by: Set[str] = set()
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        """
+        Stop generating Beaver triplets for the session.
+        """
+        self.ttp.stop()
+
+
+class SessionRegistry:
+    """
+    Sessions of the server, created on their first use.
+    A session is discarded once all its participants closed it, or once it was unused for ttl seconds.
+    Requests arriving late on a closed session are refused for closed_ttl seconds, instead of
+    creating an empty session again.
+
+    Attributes:
+        participants: Participants of the sessions created without explicit participants
+        ttl: Time in seconds after which an unused session is discarded
+        closed_ttl: Time in seconds during which the requests on a closed session are refused
+        closed: Time of closing of the recently closed sessions, from time.monotonic
+    """
+
+    def __init__(
+            self,
+            participants: Iterable[str] = (),
+            ttl: float = SESSION_TTL,
+            closed_ttl: float = CLOSED_TTL
+        ):
+        self.participants: List[str] = list(participants)
+        self.ttl = ttl
+        self.closed_ttl = closed_ttl
+        self.sessions: Dict[str, Session] = {}
+        self.closed: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.last_eviction = time.monotonic()
+
+    def add_participant(self, participant_id: str) -> None:
+        """
+        Add a participant of the sessions created without explicit participants.
+        """
+        self.participants.append(participant_id)
+
+    def open(
+            self,
+            session_id: str,
+            participants: Optional[Iterable[str]] = None,
+            prime: int = Share.prime
+        ) -> Session:
+        """
+        Session with the given id, created with the given participants and the field of the given
+        prime unless it is already open.
+        Every client of a computation opens its session, so that the first of them creates it.
+        A closed session can be opened again for a new computation.
+        """
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                self.closed.pop(session_id, None)
+                session = self.sessions[session_id] = Session(
+                    self.participants if participants is None else participants, prime
+                )
+            session.last_used = time.monotonic()
+            return session
+
+    def get(self, session_id: str) -> Session:
+        """
+        Session with the given id, created with the default participants if it does not exist.
+        Raises SessionClosedError if the session was recently closed.
+        """
+        now = time.monotonic()
+        with self.lock:
+            # Expired sessions are discarded at most ten times per TTL.
+            if now - self.last_eviction > min(self.ttl, self.closed_ttl) / 10:
+                self._evict_expired(now)
+
+            session = self.sessions.get(session_id)
+            if session is None:
+                if session_id in self.closed:
+                    raise SessionClosedError(f"The session {session_id} is closed")
+                session = self.sessions[session_id] = Session(self.participants)
+            session.last_used = now
+            return session
+
+    def close(self, session_id: str, client_id: Optional[str] = None) -> None:
+        """
+        Record that a client is done with a session, discarding the session once all its participants
+        are. Without a client, the session is discarded right away.
+        The client and participant ids must be written the same way, e.g. both sanitized for URLs.
+        """
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return
+
+            if client_id is not None:
+                session.closed_by.add(client_id)
+                # The default session is shared by all the computations without session, and a
+                # session without known participants cannot tell when they are all done: both are
+                # only discarded once unused.
+                participants = session.ttp.participant_ids
+                if session_id == DEFAULT_SESSION or not participants:
+                    return
+                if not session.closed_by >= participants:
+                    return
+            del self.sessions[session_id]
+            session.close()
+            self.closed[session_id] = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def _evict_expired(self, now: float) -> None:
+        """
+        Discard the sessions unused for more than ttl seconds, and forget the sessions closed more
+        than closed_ttl seconds ago. Must be called with the lock held.
+        """
+        expired = [
+            session_id for session_id, session in self.sessions.items()
+            if now - session.last_used > self.ttl
+        ]
+        for session_id in expired:
+            self.sessions.pop(session_id).close()
+
+        forgotten = [
+            session_id for session_id, closed_at in self.closed.items()
+            if now - closed_at > self.closed_ttl
+        ]
+        for session_id in forgotten:
+            del self.closed[session_id]
+        self.last_eviction = now
@@ -0,0 +1,149 @@
+"""
+Simulation of an SMC protocol with all the parties in a single process.
+
+Each party runs in its own thread and the messages go through an in-memory relay instead of the
+server, so large numbers of parties can be simulated without starting processes or a server.
+
+Example:
+>>> alice_secret = Secret()
+>>> bob_secret = Secret()
+>>> prot = ProtocolSpec(expr=alice_secret * bob_secret, participant_ids=["Alice", "Bob"])
+>>> simulation = simulate(prot, {"Alice": {alice_secret: 3}, "Bob": {bob_secret: 4}})
+>>> simulation.results
+{'Alice': 12, 'Bob': 12}
+
+Run `python simulator.py <number of parties>` to simulate the sum of one secret per party.
+"""
+
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from expression import Secret, sum_of
+from instrumentation import PhaseMetrics
+from protocol import ProtocolSpec
+from smc_party import SMCParty
+from transport import InMemoryRelay, InMemoryTransport
+
+
+# Time in seconds between two checks by a waiting party that the simulation was not cancelled.
+CANCEL_CHECK_DELAY = 0.5
+
+class PartyMetrics(NamedTuple):
+    """
+    Performance measurements of a party, as written to the performance data by SMCParty.run,
+    and the measurements of each of its phases.
+    """
+    total_time: float
+    computation_time: float
+    bytes_sent: int
+    bytes_received: int
+    phases: Dict[str, PhaseMetrics]
+
+
+class SimulationResult(NamedTuple):
+    """
+    Results and measurements of the parties of a simulation, indexed by party.
+    """
+    results: Dict[str, int]
+    metrics: Dict[str, PartyMetrics]
+    elapsed: float
+
+
+def simulate(
+        protocol_spec: ProtocolSpec,
+        value_dicts: Dict[str, Dict[Secret, int]],
+        timeout: Optional[float] = None
+    ) -> SimulationResult:
+    """
+    Run all the parties of a protocol in threads of this process, sharing a single relay and trusted
+    parameter generator. Parties missing from value_dicts have no secret.
+
+    The metrics are returned instead of being written to the performance data.
+
+    Raises the first error of a party, or TimeoutError if the parties do not finish in time. The
+    parties still running are then cancelled, and stop within CANCEL_CHECK_DELAY seconds.
+    """
+    participants = protocol_spec.participant_ids
+    relay = InMemoryRelay(participants, protocol_spec.prime)
+    # The program is compiled once before the threads share the protocol, and its Beaver triplets
+    # are generated before the parties start.
+    relay.ttp.preprocess(protocol_spec.program, protocol_spec.seeded_triplets)
+
+    finished: "queue.Queue" = queue.Queue()
+
+    def run_party(client_id: str) -> None:
+        party = SMCParty(
+            client_id,
+            None,
+            None,
+            protocol_spec=protocol_spec,
+            value_dict=value_dicts.get(client_id, {}),
+            transport=InMemoryTransport(relay, wait_timeout=CANCEL_CHECK_DELAY),
+            metrics_path=None
+        )
+        try:
+            started = time.time()
+            result = party.run()
+            total_time = time.time() - started
+        except Exception as error:
+            finished.put((client_id, None, error))
+            return
+
+        metrics = PartyMetrics(
+            total_time,
+            total_time - party.comm.network_delay,
+            party.comm.bytes_sent,
+            party.comm.bytes_received,
+            party.instrumentation.phases
+        )
+        finished.put((client_id, (result, metrics), None))
+
+    started = time.time()
+    # Parties blocked by the failure of another party must not prevent the interpreter from exiting
+    # until they notice the cancellation.
+    for client_id in participants:
+        threading.Thread(target=run_party, args=(client_id,), daemon=True).start()
+
+    results = {}
+    metrics = {}
+    deadline = None if timeout is None else started + timeout
+    try:
+        for _ in participants:
+            try:
+                remaining = None if deadline is None else max(deadline - time.time(), 0)
+                client_id, outcome, error = finished.get(timeout=remaining)
+            except queue.Empty:
+                relay.cancel()
+                raise TimeoutError(f"{len(participants) - len(results)} parties did not finish in time")
+            if error is not None:
+                relay.cancel()
+                raise error
+            results[client_id], metrics[client_id] = outcome
+    finally:
+        relay.close()
+
+    return SimulationResult(results, metrics, time.time() - started)
+
+
+def main(args: List[str]) -> None:
+    """
+    Entrypoint of the program.
+    """
+    num_parties = int(args[0]) if args else 100
+    participants = [f"party{i}" for i in range(num_parties)]
+    secrets = [Secret() for _ in participants]
+
+    prot = ProtocolSpec(expr=sum_of(secrets), participant_ids=participants)
+    value_dicts = {client_id: {secret: i} for i, (client_id, secret) in enumerate(zip(participants, secrets))}
+    simulation = simulate(prot, value_dicts)
+
+    print(f"{num_parties} parties computed {set(simulation.results.values())} in {simulation.elapsed:.2f} s")
+    print(f"Bytes sent per party: {max(m.bytes_sent for m in simulation.metrics.values())}")
+    print(f"Bytes received per party: {max(m.bytes_received for m in simulation.metrics.values())}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -9,32 +9,55 @@ import collections
 import json
 from typing import (
     Dict,
+    Optional,
     Set,
     Tuple,
     Union, 
     List
 )
 
+from codec import decode_frames, encode_frames, pack_values, unpack_values
 from communication import Communication
-from expression import (
-    Expression,
-    Secret, 
-    Scalar,
-    AddOp, 
-    SubOp, 
-    MultOp
+from compiler import (
+    Instruction,
+    Program,
+    LOAD_SECRET,
+    LINEAR,
+    BEAVER_OPCODES,
+    OPEN,
+    beaver_products,
+    vector_op_ids
+)
+from expression import Secret, SecretVector
+from instrumentation import (
+    INPUT_PHASE,
+    LOCAL_PHASE,
+    OUTPUT_PHASE,
+    SESSION_PHASE,
+    TRIPLETS_PHASE,
+    Instrumentation,
+    round_phase
 )
 from protocol import ProtocolSpec
 from secret_sharing import(
-    reconstruct_secret,
     share_secret,
+    share_vector,
     Share,
+    ShareVector,
 )
+from transport import Transport
 
 # Feel free to add as many imports as you want.
+import itertools
 import time
 import csv
 
+# Label of the messages with the input shares, which every client sends to every client.
+INPUT_LABEL = "input_shares"
+# File to which the first client appends its performance measurements.
+METRICS_PATH = "performance_data.csv"
+
+
 class SMCParty:
     """
     A client that executes an SMC protocol to collectively compute a value of an expression together
@@ -45,7 +68,13 @@ class SMCParty:
         server_host: hostname of the server
         server_port: port of the server
         protocol_spec (ProtocolSpec): Protocol specification
-        value_dict (dict): Dictionary assigning values to secrets belonging to this client.
+        value_dict (dict): Dictionary assigning values to secrets belonging to this client, lists of
+            values to secret vectors.
+        transport: Transport of the messages (default: HTTP requests to the server)
+        session_id: Session of the computation on the server (default: the one of the protocol)
+        metrics_path: CSV file to which the first client appends its performance measurements,
+            or None to not write them
+        instrumentation: Measurements of each phase of the run, see instrumentation.py
     """
 
     def __init__(
@@ -54,34 +83,60 @@ class SMCParty:
             server_host: str,
             server_port: int,
             protocol_spec: ProtocolSpec,
-            value_dict: Dict[Secret, int]
+            value_dict: Dict[Secret, int],
+            transport: Optional[Transport] = None,
+            session_id: Optional[str] = None,
+            metrics_path: Optional[str] = METRICS_PATH
         ):
-        self.comm = Communication(server_host, server_port, client_id)
+        if session_id is None:
+            session_id = protocol_spec.session_id
+        self.comm = Communication(
+            server_host,
+            server_port,
+            client_id,
+            transport=transport,
+            session_id=session_id,
+            prime=protocol_spec.prime
+        )
 
         self.client_id = client_id
         self.protocol_spec = protocol_spec
         self.value_dict = value_dict
+        self.metrics_path = metrics_path
+        self.prime = protocol_spec.prime
 
         self.secret_shares_received = {}
+        self.beaver_triplets: Dict[str, Tuple[Share, Share, Share]] = {}
         self.client_zero = sorted(self.protocol_spec.participant_ids)[0] 
+        self.instrumentation: Instrumentation = self.comm.instrumentation
 
-    def run(self) -> int:
+    def run(self) -> Union[int, List[int]]:
         """
-        The method the client use to do the SMC.
+        The method the client use to do the SMC. The result of an expression of secret vectors is
+        a list.
         """
 
         startTime = time.time()
 
-        # Sending shares of my secret to other clients.
-        # First we compute shares for all secrets that this client has, then we send the appropriate shares to other clients. 
-        num_of_shares = len(self.protocol_spec.participant_ids)
-        for secretObj, value in self.value_dict.items():
-            my_secret_shares = share_secret(value, num_of_shares)
-            for i, client in enumerate(self.protocol_spec.participant_ids):
-                self.comm.send_private_message(client, secretObj.id, my_secret_shares[i].serialize())
-        
-        # Processing the expression and returning the reconstructed result.
-        res_share: Share = self.process_expression(self.protocol_spec.expr)
+        # The Beaver triplets of the session are shared between the participants of the protocol.
+        with self.instrumentation.phase(SESSION_PHASE):
+            self.comm.open_session(self.protocol_spec.participant_ids)
+
+        # The triplets of all the multiplications are known in advance, and retrieved in one request.
+        with self.instrumentation.phase(TRIPLETS_PHASE):
+            self.retrieve_beaver_triplets(self.protocol_spec.program)
+
+        # Input phase: each client sends one message to every client, with its shares of all
+        # the secrets of the sender, and receives one message from every client.
+        with self.instrumentation.phase(INPUT_PHASE):
+            self.send_input_shares()
+            self.receive_input_shares()
+
+        # Executing the compiled program of the expression, which returns the reconstructed result.
+        result = self.execute_program(self.protocol_spec.program)
+        # The server discards the messages of the computation once all the clients are done.
+        with self.instrumentation.phase(SESSION_PHASE):
+            self.comm.close_session()
 
         # Writing performance measurements to file
         endTime = time.time()
@@ -90,99 +145,283 @@ class SMCParty:
         total_bytes_sent = self.comm.bytes_sent
         total_bytes_received = self.comm.bytes_received
 
-        if self.client_id == self.client_zero:
+        if self.client_id == self.client_zero and self.metrics_path is not None:
             data = ["", totalTime, compTime, total_bytes_sent, total_bytes_received]
-            with open('performance_data.csv', 'a', encoding='UTF8') as f:
+            with open(self.metrics_path, 'a', encoding='UTF8') as f:
                 writer = csv.writer(f)
                 writer.writerow(data)
 
-        return self.reconstruction_of_secret("public_res", res_share)
+        return result
 
-    # Processing of the expression (traversing the abstract syntax tree). 
-    def process_expression(
+    def execute_program(
             self,
-            expr: Expression
-        ):
-        if isinstance(expr, AddOp):
-            a = self.process_expression(expr.a)
-            b = self.process_expression(expr.b)
-
-            if isinstance(a, Share) and isinstance(b, Share):
-                return a + b 
-
-            if isinstance(a, Scalar) and isinstance(b, Scalar):
-                return Scalar(a.value + b.value)
-            
-            # In case a or b is a Scalar, only one client adds the Scalar. 
-            if self.client_id != self.client_zero:
-                if isinstance(a, Scalar):
-                    return b
-                return a
-            
-            return a + b
-
-        if isinstance(expr, SubOp):
-            a = self.process_expression(expr.a)
-            b = self.process_expression(expr.b)
-            
-            if isinstance(a, Share) and isinstance(b, Share):
-                return a - b
-        
-            if isinstance(a, Scalar) and isinstance(b, Scalar):
-                return Scalar(a.value - b.value)
-            
-            if self.client_id != self.client_zero:
-                if isinstance(a, Scalar):
-                    return -b
-                return a
-            
-            return a - b
-        
-        if isinstance(expr, MultOp):
-            a = self.process_expression(expr.a)
-            b = self.process_expression(expr.b)
-
-            if isinstance(a, Scalar) and isinstance(b, Scalar):
-                return Scalar(a.value * b.value)
-
-            # Case where both are of type Share. Get the beaver triplet shares, and do the computation needed.
-            # Names of the variables are similar to the docs on git. 
-            if isinstance(a, Share) and isinstance(b, Share):
-                beaver_triplet_shares = self.get_beaver_triplet(expr.id)
-                x_a_share = a - beaver_triplet_shares[0]
-                y_b_share = b - beaver_triplet_shares[1]
-
-                x_a = self.reconstruction_of_secret("public_x_a_share" + str(expr.id), x_a_share)
-                y_b = self.reconstruction_of_secret("public_y_b_share" + str(expr.id), y_b_share)
-
-                z_share = beaver_triplet_shares[2] + (a*Scalar(y_b)) + (b*Scalar(x_a))
-                if self.client_id == self.client_zero:
-                    z_share = z_share - Scalar(x_a*y_b)
-
-                return z_share
-
-            return a * b
-             
-
-        if isinstance(expr, Secret):
-            if expr.id not in self.secret_shares_received:
-                self.secret_shares_received[expr.id] = Share.deserialize(self.comm.retrieve_private_message(expr.id))
-            return self.secret_shares_received[expr.id]
-
-        if isinstance(expr, Scalar):
-            return expr
-
-        pass
-
-
-    def get_beaver_triplet(self, id: str):
+            program: Program
+        ) -> Union[int, List[int]]:
+        """
+        Execute the instructions of a compiled program and reconstruct its output.
+        The consecutive Beaver multiplications form a layer which is computed in a single round.
+        Each round is a phase of the instrumentation, like the local evaluation between the rounds
+        and the opening of the output.
+        """
+
+        registers: List[Union[Share, ShareVector]] = [None] * program.num_registers # type: ignore
+        is_client_zero = self.client_id == self.client_zero
+
+        # The Beaver multiplications are grouped by level, the other instructions are all local.
+        blocks = itertools.groupby(
+            program.instructions,
+            key=lambda ins: ins.level if ins.opcode in BEAVER_OPCODES else -1
+        )
+        rounds = 0
+        for layer_index, (layer_level, block) in enumerate(blocks):
+            if layer_level >= 0:
+                rounds += 1
+                with self.instrumentation.phase(round_phase(rounds)):
+                    self.process_multiplication_layer(layer_index, list(block), registers)
+                continue
+
+            # The output is opened once the local instructions before it are computed.
+            output = None
+            with self.instrumentation.phase(LOCAL_PHASE):
+                for ins in block:
+                    opcode, args = ins.opcode, ins.args
+
+                    # The public constant is only added by one client, and the value is reduced once.
+                    if opcode == LINEAR and ins.length is not None:
+                        registers[ins.dst] = self.linear_vector(ins, registers, is_client_zero)
+
+                    elif opcode == LINEAR:
+                        constant, terms = args
+                        value = constant if is_client_zero else 0
+                        for coefficient, register in terms:
+                            value += coefficient * registers[register].value
+                        registers[ins.dst] = Share(value % self.prime, self.prime)
+
+                    elif opcode == LOAD_SECRET:
+                        registers[ins.dst] = self.retrieve_secret_share(args[0], ins.length)
+
+                    elif opcode == OPEN:
+                        output = registers[args[0]]
+                        break
+
+                    else:
+                        raise ValueError(f"Unknown opcode {opcode}")
+
+            if output is not None:
+                with self.instrumentation.phase(OUTPUT_PHASE):
+                    return self.reconstruction_of_secret("public_res", output)
+
+        raise ValueError("The program has no output")
+
+    def linear_vector(
+            self,
+            ins: Instruction,
+            registers: List[Union[Share, ShareVector]],
+            is_client_zero: bool
+        ) -> ShareVector:
+        """
+        Compute a LINEAR instruction on vectors, element-wise. Single values are broadcast.
+        """
+
+        p = self.prime
+        constant, terms = ins.args
+        result = ShareVector.broadcast(Share(constant if is_client_zero else 0, p), ins.length)
+        for coefficient, register in terms:
+            result = result + registers[register] * Share(coefficient % p, p)
+        return result
+
+    def send_input_shares(self) -> None:
+        """
+        Compute the shares of all the secrets of this client, and send to each client a single
+        message with all its shares, as frames indexed by secret. Clients without secrets send
+        empty messages.
+        """
+
+        participants = self.protocol_spec.participant_ids
+        bundles: Dict[str, Dict[str, bytes]] = {client: {} for client in participants}
+        for secretObj, value in self.value_dict.items():
+            key = secret_key(secretObj.id)
+            if isinstance(secretObj, SecretVector):
+                if len(value) != secretObj.length:
+                    raise ValueError(f"The secret vector {key} has {secretObj.length} elements")
+                my_vector_shares = share_vector(list(value), len(participants), self.prime)
+                for i, client in enumerate(participants):
+                    bundles[client][key] = pack_values(my_vector_shares[i].values, self.prime)
+                continue
+
+            my_secret_shares = share_secret(value, len(participants), self.prime)
+            for i, client in enumerate(participants):
+                bundles[client][key] = pack_values([my_secret_shares[i].value], self.prime)
+
+        for client in participants:
+            self.comm.send_private_message(client, INPUT_LABEL, encode_frames(bundles[client]))
+
+    def receive_input_shares(self) -> None:
+        """
+        Retrieve the messages of all the clients with the shares of their secrets, in a single request.
+        """
+
+        bundles = self.comm.retrieve_private_messages(self.protocol_spec.participant_ids, INPUT_LABEL)
+        for message in bundles.values():
+            for key, share in decode_frames(message).items():
+                self.secret_shares_received[key] = unpack_values(share, self.prime)
+
+    def retrieve_secret_share(
+            self,
+            secret_id: bytes,
+            length: Optional[int] = None
+        ) -> Union[Share, ShareVector]:
+        """
+        Share of a secret, or of a secret vector of the given length.
+        """
+        key = secret_key(secret_id)
+        if key not in self.secret_shares_received:
+            raise KeyError(f"No client holds a value for the secret {key}")
+
+        values = self.secret_shares_received[key]
+        if len(values) != (1 if length is None else length):
+            raise ValueError(f"The secret {key} was shared with {len(values)} elements")
+        if length is None:
+            return Share(values[0], self.prime)
+        return ShareVector(values, self.prime)
+
+    def process_multiplication_layer(
+            self,
+            index: int,
+            layer: List[Instruction],
+            registers: List[Union[Share, ShareVector]]
+        ) -> None:
+        """
+        Compute a layer of Beaver multiplications and dot products, opening all the masked values
+        in one round. Multiplications of vectors are element-wise, their masked vectors are opened
+        in the same round. The products of a dot product are summed before the public term d * e
+        is subtracted, once per instruction.
+        Names of the variables are similar to the docs on git.
+        """
+
+        products = [beaver_products(ins) for ins in layer]
+        triplets = []
+        masked_shares: List[Union[Share, ShareVector]] = []
+        for ins, ins_products in zip(layer, products):
+            for _, a_register, b_register, op_id in ins_products:
+                a, b = registers[a_register], registers[b_register]
+                if ins.length is not None:
+                    a, b = ShareVector.broadcast(a, ins.length), ShareVector.broadcast(b, ins.length)
+                beaver_triplet_shares = self.get_beaver_triplet(op_id, ins.length)
+
+                triplets.append(beaver_triplet_shares)
+                masked_shares.append(a - beaver_triplet_shares[0])
+                masked_shares.append(b - beaver_triplet_shares[1])
+
+        opened = self.reconstruction_of_secrets(
+            "public_beaver_layer" + str(index) + str(products[0][0][3]), masked_shares
+        )
+
+        p = self.prime
+        position = 0
+        for ins, ins_products in zip(layer, products):
+            z_share, public = None, None
+            for coefficient, a_register, b_register, _ in ins_products:
+                a, b = registers[a_register], registers[b_register]
+                x_a, y_b = opened[2*position], opened[2*position + 1]
+                c = triplets[position][2]
+                position += 1
+
+                if ins.length is not None:
+                    a, b = ShareVector.broadcast(a, ins.length), ShareVector.broadcast(b, ins.length)
+                    x_a, y_b = ShareVector(x_a, p), ShareVector(y_b, p)
+                else:
+                    x_a, y_b = Share(x_a, p), Share(y_b, p)
+
+                term = c + (a*y_b) + (b*x_a)
+                term_public = x_a*y_b
+                if coefficient != 1:
+                    term = term * Share(coefficient, p)
+                    term_public = term_public * Share(coefficient, p)
+                z_share = term if z_share is None else z_share + term
+                public = term_public if public is None else public + term_public
+
+            if self.client_id == self.client_zero:
+                z_share = z_share - public
+            registers[ins.dst] = z_share
+
+
+    def retrieve_beaver_triplets(self, program: Program) -> None:
+        """
+        Retrieve the Beaver triplets of all the multiplications of a program before executing it.
+        Seeded triplets are expanded from the seed of this client.
+        """
+        if not program.beaver_op_ids:
+            return
+        if self.protocol_spec.seeded_triplets:
+            self.beaver_triplets.update(self.comm.retrieve_seeded_triplets(program.beaver_op_ids))
+        else:
+            self.beaver_triplets.update(self.comm.retrieve_beaver_triplets_shares(program.beaver_op_ids))
+
+    def get_beaver_triplet(self, id: str, length: Optional[int] = None):
+        """
+        Shares of the Beaver triplet of a multiplication, or vectors of the shares of the triplets
+        of the elements of a multiplication of vectors, which are retrieved in one request.
+        """
+        if length is not None:
+            op_ids = vector_op_ids(id, length)
+            missing = [op_id for op_id in op_ids if op_id not in self.beaver_triplets]
+            if missing:
+                self.beaver_triplets.update(self.comm.retrieve_beaver_triplets_shares(missing))
+            element_triplets = [self.beaver_triplets[op_id] for op_id in op_ids]
+            return tuple(
+                ShareVector([triplet[j].value for triplet in element_triplets], self.prime)
+                for j in range(3)
+            )
+
+        if id in self.beaver_triplets:
+            return self.beaver_triplets[id]
         return self.comm.retrieve_beaver_triplet_shares(id)
     
-    def reconstruction_of_secret(self, label: str, myShare: Share) -> int: 
+    def reconstruction_of_secret(
+            self,
+            label: str,
+            myShare: Union[Share, ShareVector]
+        ) -> Union[int, List[int]]:
 
-        res_secret_shares = []
-        self.comm.publish_message(label, myShare.serialize())
-        for client in self.protocol_spec.participant_ids:
-            res_secret_shares.append(Share.deserialize(self.comm.retrieve_public_message(client, label)))
+        return self.reconstruction_of_secrets(label, [myShare])[0]
+
+    def reconstruction_of_secrets(
+            self,
+            label: str,
+            myShares: List[Union[Share, ShareVector]]
+        ) -> List[Union[int, List[int]]]:
+        """
+        Reconstruct several secrets at once: every client publishes a single message with all its shares.
+        Share vectors are reconstructed as lists.
+        """
+
+        values: List[int] = []
+        for share in myShares:
+            values += share.to_list() if isinstance(share, ShareVector) else [share.value]
+
+        self.comm.publish_message(label, pack_values(values, self.prime))
+        messages = self.comm.retrieve_public_messages(self.protocol_spec.participant_ids, label)
+        received_values = [unpack_values(message, self.prime) for message in messages.values()]
+        secrets = [sum(column) % self.prime for column in zip(*received_values)]
+
+        results: List[Union[int, List[int]]] = []
+        position = 0
+        for share in myShares:
+            if isinstance(share, ShareVector):
+                results.append(secrets[position:position + len(share)])
+                position += len(share)
+            else:
+                results.append(secrets[position])
+                position += 1
+        return results
+
+
+def secret_key(secret_id: Union[bytes, str]) -> str:
+    """
+    Key of a secret in the input messages.
+    """
+    if isinstance(secret_id, bytes):
+        return secret_id.decode("ASCII")
+    return secret_id
 
-        return reconstruct_secret(res_secret_shares)
\ No newline at end of file
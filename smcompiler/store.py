@@ -0,0 +1,138 @@
+"""
+Store of the messages exchanged by the SMC clients, shared by the server and the in-memory transport.
+"""
+
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+# Number of stripes of the store: requests on channels of different stripes do not contend.
+NUM_STRIPES = 64
+
+
+class Stripe:
+    """
+    Part of the store, with its own lock.
+
+    Attributes:
+        values: Messages indexed by pool and channel
+        indexes: Messages indexed by sender, for each index key
+        conditions: Conditions notified when a value is stored, all sharing the lock of the stripe
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, Tuple[str, str]], bytes] = {}
+        self.indexes: Dict[Tuple[str, ...], Dict[str, bytes]] = {}
+        self.conditions: Dict[Hashable, threading.Condition] = {}
+
+    def wait_for(self, key: Hashable, predicate: Callable[[], bool], wait: float) -> None:
+        """
+        Wait until the predicate holds, being woken up by the events of a key.
+        Must be called with the lock held.
+        """
+        if wait <= 0 or predicate():
+            return
+        if key not in self.conditions:
+            self.conditions[key] = threading.Condition(self.lock)
+        self.conditions[key].wait_for(predicate, wait)
+
+    def notify(self, key: Hashable) -> None:
+        """
+        Wake up the requests waiting on a key. Must be called with the lock held.
+        """
+        if key in self.conditions:
+            self.conditions[key].notify_all()
+
+
+class MessageStore:
+    """
+    Messages sent by the clients, organized in pools of channels.
+    Requests can wait until a message is stored in a channel.
+
+    The messages are spread over stripes by channel, so that concurrent requests on different
+    channels only contend if their channels fall in the same stripe.
+    Public messages are also indexed by sender for each label ("public", label), as are private
+    messages for each label of a receiver ("private", receiver, label) if their sender is given.
+    """
+
+    def __init__(self, num_stripes: int = NUM_STRIPES):
+        self.stripes: List[Stripe] = [Stripe() for _ in range(num_stripes)]
+
+    def stripe(self, key: Hashable) -> Stripe:
+        """
+        Stripe holding a channel or an index.
+        """
+        return self.stripes[hash(key) % len(self.stripes)]
+
+    def set_value(
+            self,
+            pool: str,
+            channel: Tuple[str, str],
+            data: bytes,
+            sender: Optional[str] = None
+        ) -> None:
+        """
+        Push data to a channel in a given pool and send an event.
+        Public messages are indexed by their sender, as are private messages if the sender is given.
+        """
+        key = (pool, channel)
+        stripe = self.stripe(key)
+        with stripe.lock:
+            stripe.values[key] = data
+            stripe.notify(key)
+
+        if pool == "public":
+            sender, label = channel
+            self._index(("public", label), sender, data)
+        elif sender is not None:
+            self._index((pool, *channel), sender, data)
+
+    def get_value(self, pool: str, channel: Tuple[str, str], wait: float = 0.0) -> Optional[bytes]:
+        """
+        Subscribe to a channel in a given pool and get it once ready, waiting at most wait seconds.
+        """
+        key = (pool, channel)
+        stripe = self.stripe(key)
+        with stripe.lock:
+            stripe.wait_for(key, lambda: key in stripe.values, wait)
+            return stripe.values.get(key)
+
+    def get_public_messages(self, label: str, count: int, wait: float = 0.0) -> Dict[str, bytes]:
+        """
+        Public messages with a label indexed by sender, waiting at most wait seconds until there
+        are at least count of them.
+        """
+        return self._get_indexed(("public", label), count, wait)
+
+    def get_private_messages(
+            self,
+            receiver: str,
+            label: str,
+            count: int,
+            wait: float = 0.0
+        ) -> Dict[str, bytes]:
+        """
+        Private messages of a receiver with a label indexed by sender, waiting at most wait seconds
+        until there are at least count of them.
+        """
+        return self._get_indexed(("private", receiver, label), count, wait)
+
+    def _index(self, key: Tuple[str, ...], sender: str, data: bytes) -> None:
+        """
+        Index a message by its sender.
+        """
+        stripe = self.stripe(key)
+        with stripe.lock:
+            messages = stripe.indexes.setdefault(key, {})
+            is_new_sender = sender not in messages
+            messages[sender] = data
+            # Each request only waits for a number of messages, so it is only woken up once.
+            if is_new_sender:
+                stripe.notify((key, len(messages)))
+
+    def _get_indexed(self, key: Tuple[str, ...], count: int, wait: float) -> Dict[str, bytes]:
+        stripe = self.stripe(key)
+        with stripe.lock:
+            stripe.wait_for((key, count), lambda: len(stripe.indexes.get(key, ())) >= count, wait)
+            return dict(stripe.indexes.get(key, {}))
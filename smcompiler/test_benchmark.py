@@ -0,0 +1,56 @@
+"""
+Unit tests for the benchmark harness.
+"""
+
+import pytest
+
+from benchmark import SWEEPS, Measurement, compare, load_results, main, measure, save_results
+
+
+@pytest.mark.parametrize("sweep", list(SWEEPS))
+def test_measure(sweep):
+    measurement = measure(sweep, 3, repeat=2, warmup=1)
+
+    assert (measurement.sweep, measurement.parameter) == (sweep, 3)
+    assert len(measurement.times) == 2
+    assert measurement.min_time <= measurement.median_time
+    assert measurement.bytes_sent > 0
+    # The products of the depth sweep are computed one round after the other.
+    expected_rounds = {"multiplications": 1, "depth": 3}
+    assert measurement.rounds == expected_rounds.get(sweep, 0)
+
+
+def test_results_file(tmp_path):
+    path = str(tmp_path / "results.json")
+    measurements = [Measurement("depth", 3, [0.1, 0.2], 0.15, 0.1, 100, 200, 3)]
+    save_results(path, measurements, {"python": "3"})
+
+    assert load_results(path) == measurements
+
+
+def test_compare():
+    baseline = [
+        Measurement("depth", 3, [1.0], 1.0, 1.0, 100, 100, 3),
+        Measurement("depth", 5, [1.0], 1.0, 1.0, 100, 100, 5),
+    ]
+    measurements = [
+        Measurement("depth", 3, [1.1], 1.1, 1.1, 200, 100, 4),
+        Measurement("depth", 5, [2.0], 2.0, 2.0, 100, 100, 5),
+        Measurement("depth", 10, [9.0], 9.0, 9.0, 900, 900, 10),
+    ]
+    regressions = compare(measurements, baseline, tolerance=0.25)
+
+    assert [(r.parameter, r.metric) for r in regressions] == [
+        (3, "bytes_sent"), (3, "rounds"), (5, "median_time")
+    ]
+    assert compare(baseline, baseline) == []
+
+
+def test_main_baseline(tmp_path):
+    path = str(tmp_path / "results.json")
+    assert main(["multiplications", "--parameters", "2", "--repeat", "1", "--output", path]) == 0
+
+    # A run exchanging more bytes than the baseline is a regression.
+    baseline = [m._replace(bytes_sent=m.bytes_sent // 2) for m in load_results(path)]
+    save_results(path, baseline, {})
+    assert main(["multiplications", "--parameters", "2", "--repeat", "1", "--baseline", path]) == 1
@@ -0,0 +1,52 @@
+"""
+Unit tests for the binary encoding of the messages.
+"""
+
+import jsonpickle
+import pytest
+
+from codec import (
+    SHARE_BYTES,
+    decode_frames,
+    encode_frames,
+    pack_shares,
+    pack_values,
+    unpack_shares,
+    unpack_values,
+)
+from secret_sharing import MERSENNE_61, Share, ShareVector
+
+
+def test_pack_shares():
+    shares = [Share(0), Share(1), Share(Share.prime - 1)]
+    packed = pack_shares(shares)
+
+    # Every share takes the same number of bytes, far less than its JSON representation.
+    assert SHARE_BYTES == 17
+    assert len(packed) == 3 * SHARE_BYTES
+    assert 5 * SHARE_BYTES < len(jsonpickle.encode(shares[2]))
+    assert [share.value for share in unpack_shares(packed)] == [share.value for share in shares]
+
+    with pytest.raises(ValueError):
+        unpack_shares(packed[:-1])
+
+
+def test_pack_mersenne_61():
+    values = [0, 1, MERSENNE_61 - 1]
+    packed = pack_values(values, MERSENNE_61)
+
+    # The elements of the 61-bit field take 8 bytes, however the vector stores them.
+    assert len(packed) == 3 * 8
+    assert pack_values(ShareVector(values, MERSENNE_61).values, MERSENNE_61) == packed
+    assert unpack_values(packed, MERSENNE_61) == values
+    assert [share.prime for share in unpack_shares(packed, MERSENNE_61)] == [MERSENNE_61] * 3
+
+
+def test_frames():
+    messages = {"Alice": b"", "Bob": b"\x00\xff binary", "Charlie/1": pack_shares([Share(42)])}
+    encoded = encode_frames(messages)
+
+    assert decode_frames(encoded) == messages
+    assert decode_frames(b"") == {}
+    with pytest.raises(ValueError):
+        decode_frames(encoded[:-1])
@@ -0,0 +1,156 @@
+"""
+Unit tests for the expression compiler.
+"""
+
+import pytest
+
+from compiler import (
+    compile_expression,
+    DOT_BEAVER,
+    LINEAR,
+    LOAD_SECRET,
+    MUL_BEAVER,
+    OPEN,
+    vector_op_ids
+)
+from expression import AddOp, MultOp, Secret, SecretVector, Scalar, dot_product
+
+
+def test_compile_public_subexpressions():
+    a = Secret()
+    expr = a * (Scalar(15) + Scalar(15) * Scalar(3)) + Scalar(2)
+    program = compile_expression(expr, optimized=False)
+
+    opcodes = [ins.opcode for ins in program.instructions]
+    assert opcodes == [LOAD_SECRET, LINEAR, OPEN]
+    assert program.instructions[1].args == (2, ((60, 0),))
+    assert program.beaver_op_ids == []
+
+
+def test_compile_linear_chain():
+    a = Secret()
+    b = Secret()
+    expr = a
+    for _ in range(499):
+        expr += a
+    expr = expr - b * Scalar(3) + Scalar(7)
+    program = compile_expression(expr, optimized=False)
+
+    # The whole chain is computed by a single instruction.
+    opcodes = [ins.opcode for ins in program.instructions]
+    assert opcodes == [LOAD_SECRET, LOAD_SECRET, LINEAR, OPEN]
+    constant, terms = program.instructions[2].args
+    assert constant == 7
+    assert sorted(coefficient for coefficient, _ in terms)[0] == 500
+
+
+def test_compile_binary_operations():
+    a = Secret()
+    b = Secret()
+    program = compile_expression(AddOp(AddOp(a, b), a), optimized=False)
+
+    opcodes = [ins.opcode for ins in program.instructions]
+    assert opcodes == [LOAD_SECRET, LOAD_SECRET, LINEAR, OPEN]
+    assert sorted(program.instructions[2].args[1]) == [(1, 1), (2, 0)]
+
+
+def test_compile_cancelled_terms():
+    a = Secret()
+    program = compile_expression(a - a + Scalar(4), optimized=False)
+
+    assert [ins.opcode for ins in program.instructions] == [LOAD_SECRET, LINEAR, OPEN]
+    assert program.instructions[1].args == (4, ())
+
+
+def test_compile_layers():
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    expr = (a * b) * c + (b * c) + (c * a)
+    program = compile_expression(expr, optimized=False)
+
+    # The three multiplications of depth 1 are consecutive, before the one of depth 2.
+    layers = [ins.level for ins in program.instructions if ins.opcode == MUL_BEAVER]
+    assert layers == [1, 1, 1, 2]
+    assert program.instructions[-1].opcode == OPEN
+
+
+def test_compile_shared_nodes_once():
+    a = Secret()
+    b = Secret()
+    product = a * b
+    program = compile_expression(product + product * product)
+
+    assert len(program.beaver_op_ids) == 2
+    assert [ins.opcode for ins in program.instructions].count(LOAD_SECRET) == 2
+
+
+def test_compile_common_subexpressions():
+    s = Secret()
+    t = Secret()
+    x = s * t
+    y = s * t
+    # The repeated product is built once, and is computed with a single triplet.
+    assert x is y
+    for optimized in (False, True):
+        program = compile_expression(x + y + x * y, optimized=optimized)
+        assert len(program.beaver_op_ids) == 2
+
+
+def test_compile_deep_expression():
+    a = Secret()
+    b = Secret()
+    expr = a
+    for i in range(100000):
+        expr = MultOp(expr, b, id=str(i).encode())
+    program = compile_expression(expr, optimized=False)
+
+    assert len(program.beaver_op_ids) == 100000
+    assert program.instructions[-1].level == 100000
+
+
+def test_compile_duplicate_ids():
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    # Different multiplications with the same ID would share a Beaver triplet.
+    expr = MultOp(a, b, id=b"x") + MultOp(a, c, id=b"x")
+
+    with pytest.raises(ValueError):
+        compile_expression(expr, optimized=False)
+
+
+def test_compile_vectors():
+    a = SecretVector(3)
+    b = SecretVector(3)
+    c = Secret()
+    program = compile_expression((a + c) * b * Scalar(2) + Scalar(1), optimized=False)
+
+    # Single values are broadcast, and the multiplication of vectors has a triplet per element.
+    assert program.instructions[-1].length == 3
+    multiplications = [ins for ins in program.instructions if ins.opcode == MUL_BEAVER]
+    assert len(multiplications) == 1
+    assert program.beaver_op_ids == vector_op_ids(multiplications[0].args[2], 3)
+
+    with pytest.raises(ValueError):
+        compile_expression(a * SecretVector(2))
+
+
+def test_compile_dot_product():
+    a = Secret()
+    b = Secret()
+    c = SecretVector(2)
+    expr = dot_product([a, b, a * b, Scalar(3)], [c, a, b, b]) + Scalar(1)
+    program = compile_expression(expr, optimized=False)
+
+    # The secret products are terms of a single gate, after the multiplication of its operands.
+    dots = [ins for ins in program.instructions if ins.opcode == DOT_BEAVER]
+    assert len(dots) == 1
+    terms, op_id = dots[0].args
+    assert len(terms) == 3
+    assert dots[0].level == 2
+    assert dots[0].length == 2
+    # The term with a scalar is linear, and each term of vectors has a triplet per element.
+    assert program.beaver_op_ids[1:] == [
+        element_id for term_id in vector_op_ids(op_id, 3) for element_id in vector_op_ids(term_id, 2)
+    ]
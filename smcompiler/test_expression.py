@@ -5,7 +5,20 @@ Testing expressions is not obligatory.
 MODIFY THIS FILE.
 """
 
-from expression import Secret, Scalar
+import pickle
+
+from expression import (
+    DotProduct,
+    LinearCombination,
+    MultOp,
+    Secret,
+    Scalar,
+    dot_product,
+    linear_combination,
+    postorder,
+    sum_of,
+)
+from protocol import ProtocolSpec
 
 
 # Example test, you can adapt it to your needs.
@@ -24,3 +37,90 @@ def test_expr_construction2():
     expr = (a + b) * c - Scalar(4) - Scalar(3) + Scalar(2) * Scalar(5)
     assert repr(expr) == "((((Secret(1) + Secret(2)) * Secret(3) - Scalar(4)) - Scalar(3)) + Scalar(2) * Scalar(5))"
 
+
+
+# Additions build a single flat linear combination, with the same representation as binary operations.
+def test_linear_combination():
+    a = Secret(1)
+    b = Secret(2)
+    c = Secret(3)
+    expr = a + b
+    extended = expr - c
+    other = expr + (b + c)
+
+    assert isinstance(extended, LinearCombination)
+    assert len(extended.terms) == 3
+    assert repr(expr) == "(Secret(1) + Secret(2))"
+    assert repr(extended) == "((Secret(1) + Secret(2)) - Secret(3))"
+    assert repr(other) == "((Secret(1) + Secret(2)) + (Secret(2) + Secret(3)))"
+
+
+def test_linear_combination_constructors():
+    secrets = [Secret(i) for i in range(3)]
+    assert repr(sum_of(secrets)) == "((Secret(0) + Secret(1)) + Secret(2))"
+
+    expr = linear_combination([(3, secrets[0]), (-2, secrets[1])], constant=5)
+    assert repr(expr) == "((Secret(0) * Scalar(3) - Secret(1) * Scalar(2)) + Scalar(5))"
+
+
+def test_dot_product():
+    secrets = [Secret(i) for i in range(4)]
+    expr = dot_product(secrets[:2], secrets[2:])
+    assert repr(expr) == "(Secret(0) * Secret(2) + Secret(1) * Secret(3))"
+    assert repr(DotProduct([(-2, secrets[0], secrets[1])])) == "Secret(0) * Secret(1) * Scalar(-2)"
+
+    # A dot product is pickled with the protocol specification.
+    prot = pickle.loads(pickle.dumps(ProtocolSpec(participant_ids=["Alice"], expr=expr)))
+    assert repr(prot.expr) == repr(expr)
+
+
+# Expressions much deeper than the recursion limit can be traversed, represented and pickled.
+def test_deep_expression():
+    a = Secret(1)
+    b = Secret(2)
+    expr = a
+    for _ in range(20000):
+        expr = expr * b + Scalar(1)
+
+    nodes = list(postorder(expr))
+    assert len(nodes) == 3 * 20000 + 2
+    assert nodes[-1] is expr
+    assert repr(expr).startswith("(" * 20000 + "Secret(1) * Secret(2) + Scalar(1)) * Secret(2)")
+
+    prot = pickle.loads(pickle.dumps(ProtocolSpec(["Alice"], expr)))
+    assert len(list(postorder(prot.expr))) == len(nodes)
+
+
+# Linear combinations have an id like the other expressions, so they can be hashed.
+def test_linear_combination_hash():
+    a = Secret()
+    b = Secret()
+    expr = a + b
+    extended = expr + Secret()
+    assert hash(expr) == hash(expr.id)
+    assert extended.id != expr.id
+    assert len({expr, extended, linear_combination([(2, a)])}) == 3
+
+
+def test_structural_ids():
+    a = Secret()
+    b = Secret()
+    # Operations have deterministic IDs, which do not depend on the order of commutative operands.
+    assert MultOp(a, b).id == MultOp(b, a).id == (a * b).id
+    assert Scalar(3).id == Scalar(3).id != Scalar(4).id
+    assert (a + b).id == linear_combination([(1, a), (1, b)]).id
+    assert (a - b).id != (a + b).id
+    assert hash(Scalar(3)) == hash(Scalar(3).id)
+    # Secrets are all different.
+    assert Secret().id != Secret().id
+
+
+def test_hash_consing():
+    a = Secret()
+    b = Secret()
+    # Identical subexpressions built by the operators are a single node.
+    assert a * b is a * b
+    assert b * a is a * b
+    assert (a + b) * a is (a + b) * a
+    assert sum_of([a, b]) is sum_of([a, b])
+    assert dot_product([a], [b]) is dot_product([a], [b])
@@ -0,0 +1,81 @@
+"""
+Unit tests for the measurements of the phases of the parties.
+"""
+
+import json
+
+from expression import Secret, Scalar
+from instrumentation import (
+    INPUT_PHASE,
+    LOCAL_PHASE,
+    OTHER_PHASE,
+    OUTPUT_PHASE,
+    SESSION_PHASE,
+    TRIPLETS_PHASE,
+    Instrumentation,
+    export_json,
+    export_prometheus,
+    round_phase
+)
+from protocol import ProtocolSpec
+from simulator import simulate
+
+
+def test_phases():
+    instrumentation = Instrumentation("Alice")
+    with instrumentation.phase(INPUT_PHASE):
+        instrumentation.record(0.5, bytes_sent=10)
+        instrumentation.record(0.25, bytes_received=20, polls=3)
+    with instrumentation.phase(INPUT_PHASE):
+        instrumentation.record(0.25)
+    instrumentation.record(0.1)
+
+    metrics = instrumentation.phases[INPUT_PHASE]
+    assert (metrics.requests, metrics.polls) == (3, 3)
+    assert (metrics.bytes_sent, metrics.bytes_received) == (10, 20)
+    assert metrics.wait_time == 1.0
+    assert metrics.compute_time >= 0
+    # The requests sent outside of the phases are recorded separately.
+    assert list(instrumentation.phases) == [INPUT_PHASE, OTHER_PHASE]
+    assert instrumentation.current is None
+
+
+def test_exports():
+    alice = Instrumentation("Alice")
+    bob = Instrumentation('Bob "B"')
+    with alice.phase(round_phase(1)):
+        alice.record(0.5, bytes_sent=10, polls=2)
+    with bob.phase(OUTPUT_PHASE):
+        bob.record(0.5)
+
+    exported = json.loads(export_json([alice, bob]))
+    assert exported["Alice"][round_phase(1)]["polls"] == 2
+    assert exported['Bob "B"'][OUTPUT_PHASE]["requests"] == 1
+
+    text = export_prometheus([alice, bob])
+    assert "# TYPE smc_phase_requests_total counter" in text
+    assert 'smc_phase_polls_total{party="Alice",phase="opening_round_1"} 2' in text
+    assert 'smc_phase_sent_bytes_total{party="Bob \\"B\\"",phase="output"} 0' in text
+
+
+def test_simulate_phases():
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    participants = ["Alice", "Bob"]
+    protocol_spec = ProtocolSpec(participants, a * b * c + Scalar(2))
+    simulation = simulate(protocol_spec, {"Alice": {a: 2, c: 3}, "Bob": {b: 5}}, timeout=60)
+
+    for metrics in simulation.metrics.values():
+        phases = metrics.phases
+        assert list(phases) == [
+            SESSION_PHASE, TRIPLETS_PHASE, INPUT_PHASE, LOCAL_PHASE,
+            round_phase(1), round_phase(2), OUTPUT_PHASE
+        ]
+        # One message to every client and one bulk retrieval, then one per round.
+        assert phases[INPUT_PHASE].requests == len(participants) + 1
+        assert phases[round_phase(1)].requests == 2
+        assert phases[round_phase(1)].polls >= 1
+        assert phases[TRIPLETS_PHASE].bytes_received > 0
+        assert sum(phase.bytes_sent for phase in phases.values()) == metrics.bytes_sent
+        assert sum(phase.bytes_received for phase in phases.values()) == metrics.bytes_received
@@ -0,0 +1,162 @@
+"""
+Unit tests for the expression optimizer.
+"""
+
+from compiler import compile_expression
+from expression import (
+    AddOp,
+    DotProduct,
+    LinearCombination,
+    MultOp,
+    Secret,
+    Scalar,
+    SubOp,
+    dot_product,
+    postorder,
+)
+from optimizer import optimize
+from secret_sharing import Share
+
+
+def test_fold_scalars():
+    a = Secret(1)
+    expr = a * (Scalar(5) + Scalar(5)) + (Scalar(15) - Scalar(15) * Scalar(3))
+    assert repr(optimize(expr)) == "(Secret(1) * Scalar(10) + Scalar(340282366920938463463374607431768211477))"
+
+
+def test_neutral_elements():
+    a = Secret(1)
+    b = Secret(2)
+    assert optimize(a + Scalar(0)) is a
+    assert optimize(Scalar(0) + a) is a
+    assert optimize(a - Scalar(0)) is a
+    assert optimize(a * Scalar(1)) is a
+    assert optimize(Scalar(1) * (Scalar(3) - Scalar(2)) * b) is b
+
+
+def test_multiplication_by_zero():
+    a = Secret(1)
+    b = Secret(2)
+    expr = a * b * (Scalar(2) - Scalar(2)) + a
+    assert optimize(expr) is a
+    assert compile_expression(expr).beaver_op_ids == []
+
+
+def test_hoist_scalar_factors():
+    a = Secret(1)
+    b = Secret(2)
+    product = (a * Scalar(2)) * (Scalar(3) * b)
+    optimized = optimize(product)
+
+    # A single scalar multiplication remains, applied to the product of the secrets which keeps its ID.
+    assert repr(optimized) == "Secret(1) * Secret(2) * Scalar(6)"
+    assert isinstance(optimized.a, MultOp)
+    assert optimized.a.id == product.id
+
+
+def test_unchanged_expression():
+    a = Secret(1)
+    b = Secret(2)
+    expr = (a + b) * a - b
+    assert optimize(expr) is expr
+
+
+def test_flatten_linear_combinations():
+    a = Secret(1)
+    b = Secret(2)
+    expr = (a + Scalar(5)) - (b * Scalar(2) - Scalar(3) * a) + Scalar(5) * Scalar(2)
+    optimized = optimize(expr)
+
+    assert isinstance(optimized, LinearCombination)
+    assert optimized.terms == [(4, a), (-2, b)]
+    assert optimized.constant == 15
+
+
+def evaluate(expr):
+    """Value of an expression whose secrets have a value."""
+    values = {}
+    for node in postorder(expr):
+        if isinstance(node, (Secret, Scalar)):
+            value = node.value
+        elif isinstance(node, MultOp):
+            value = values[id(node.a)] * values[id(node.b)]
+        elif isinstance(node, LinearCombination):
+            value = node.constant + sum(c * values[id(t)] for c, t in node.terms)
+        elif isinstance(node, DotProduct):
+            value = sum(c * values[id(a)] * values[id(b)] for c, a, b in node.terms)
+        else:
+            value = values[id(node.a)] + (1 if isinstance(node, AddOp) else -1) * values[id(node.b)]
+        values[id(node)] = value % Share.prime
+    return values[id(expr)]
+
+
+def test_rebalance_power():
+    a = Secret(3)
+    expr = a
+    for _ in range(499):
+        expr *= a
+    program = compile_expression(expr)
+
+    # Square-and-multiply: 8 squarings and 5 multiplications, with a depth of 9 instead of 499.
+    assert len(program.beaver_op_ids) == 13
+    assert program.instructions[-1].level == 9
+    assert set(program.beaver_op_ids) <= set(node.id for node in postorder(expr) if isinstance(node, MultOp))
+    assert evaluate(optimize(expr)) == pow(3, 500, Share.prime)
+
+
+def test_rebalance_chain():
+    secrets = [Secret(i + 2) for i in range(16)]
+    expr = secrets[0]
+    for secret in secrets[1:]:
+        expr = expr * secret * Scalar(2)
+    program = compile_expression(expr)
+
+    assert len(program.beaver_op_ids) == 15
+    assert program.instructions[-1].level == 4
+    assert evaluate(optimize(expr)) == evaluate(expr)
+
+
+def test_rebalance_shared_products():
+    a = Secret(3)
+    b = Secret(5)
+    c = Secret(7)
+    shared = a * b * c
+    expr = shared * a * b + shared * (c - a) * b * b + AddOp(SubOp(a, b), AddOp(c, a))
+    optimized = optimize(expr)
+
+    assert evaluate(optimized) == evaluate(expr)
+    assert not any(isinstance(node, (AddOp, SubOp)) for node in postorder(optimized))
+
+
+def test_fuse_dot_product():
+    weights = [Secret(50 + i) for i in range(4)]
+    heights = [Secret(150 + i) for i in range(4)]
+    products = [w * h for w, h in zip(weights, heights)]
+    expr = products[0] + products[1] * Scalar(2) - products[2] + products[3] + weights[0]
+    optimized = optimize(expr)
+
+    # The products only used by the sum are computed by a single gate, with the ID of the first one.
+    dots = [node for node in postorder(optimized) if isinstance(node, DotProduct)]
+    assert len(dots) == 1
+    assert [c for c, _, _ in dots[0].terms] == [1, 2, -1, 1]
+    assert dots[0].id == products[0].id
+    assert not any(isinstance(node, MultOp) for node in postorder(optimized))
+    assert evaluate(optimized) == evaluate(expr)
+
+    # A product also used elsewhere is computed once, outside of the dot product.
+    shared = products[0] + products[1] + products[2] * products[0]
+    optimized = optimize(shared)
+    assert evaluate(optimized) == evaluate(shared)
+    assert len(compile_expression(shared).beaver_op_ids) == 4
+
+
+def test_optimize_dot_product():
+    a = Secret(3)
+    b = Secret(5)
+    expr = dot_product([a * Scalar(2), Scalar(4), b], [b, a, Scalar(0)])
+    optimized = optimize(expr)
+
+    # The scalar factors move to the coefficients, and the products with a scalar are linear.
+    assert evaluate(optimized) == evaluate(expr)
+    dot = next(node for node in postorder(optimized) if isinstance(node, DotProduct))
+    assert dot.terms == [(2, a, b)]
@@ -0,0 +1,74 @@
+"""
+Unit tests for the on-disk cache of compiled programs.
+"""
+
+import os
+
+import program_cache
+from expression import Secret, Scalar
+from program_cache import ProgramCache, circuit_hash
+from protocol import ProtocolSpec
+from secret_sharing import MERSENNE_61
+from simulator import simulate
+
+
+def recurring_expression(a=None, b=None):
+    # The secrets of a recurring computation have the same IDs at each run.
+    a = Secret(id=b"a") if a is None else a
+    b = Secret(id=b"b") if b is None else b
+    return a * b + Scalar(3) * a
+
+
+def test_circuit_hash():
+    participants = ["Alice", "Bob"]
+    key = circuit_hash(recurring_expression(), participants)
+
+    assert circuit_hash(recurring_expression(), list(reversed(participants))) == key
+    assert circuit_hash(recurring_expression(), participants + ["Charlie"]) != key
+    assert circuit_hash(recurring_expression(), participants, MERSENNE_61) != key
+    assert circuit_hash(recurring_expression() + Secret(id=b"c"), participants) != key
+
+
+def test_cached_program(tmp_path, monkeypatch):
+    cache = ProgramCache(str(tmp_path / "programs"))
+    program = cache.compile(recurring_expression(), ["Alice", "Bob"])
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # The program of the next run is loaded without compiling the expression.
+    def fail(*args, **kwargs):
+        raise AssertionError("The program is compiled again")
+
+    monkeypatch.setattr(program_cache, "compile_expression", fail)
+    cached = ProgramCache(str(tmp_path / "programs")).compile(recurring_expression(), ["Alice", "Bob"])
+    assert cached.instructions == program.instructions
+    assert cached.beaver_op_ids == program.beaver_op_ids
+
+
+def test_corrupted_program(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    program = cache.compile(recurring_expression(), ["Alice", "Bob"])
+    key = circuit_hash(recurring_expression(), ["Alice", "Bob"])
+    with open(cache.path(key), "wb") as file:
+        file.write(b"truncated")
+
+    # An unreadable file is replaced by the compiled program.
+    assert cache.compile(recurring_expression(), ["Alice", "Bob"]).instructions == program.instructions
+    assert cache.misses == 2
+    assert cache.load(key) is not None
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_simulate_cached_program(tmp_path):
+    participants = ["Alice", "Bob"]
+    for _ in range(2):
+        a = Secret(id=b"a")
+        b = Secret(id=b"b")
+        protocol_spec = ProtocolSpec(
+            participants, recurring_expression(a, b), program_cache=str(tmp_path)
+        )
+        value_dicts = {"Alice": {a: 5}, "Bob": {b: 7}}
+
+        result = simulate(protocol_spec, value_dicts, timeout=60)
+        assert set(result.results.values()) == {5 * 7 + 3 * 5}
+
+    assert len(os.listdir(tmp_path)) == 1
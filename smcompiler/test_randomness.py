@@ -0,0 +1,64 @@
+"""
+Unit tests for the pool of randomness.
+"""
+
+import os
+
+import randomness
+from randomness import RandomPool
+from secret_sharing import MERSENNE_61, Share, reconstruct_secret
+from ttp import share_triplets
+
+
+def test_field_elements():
+    pool = RandomPool()
+    for prime in (Share.prime, MERSENNE_61, 251):
+        values = pool.field_elements(1000, prime)
+        assert len(values) == 1000
+        assert all(0 <= value < prime for value in values)
+
+    # The elements cover the whole field.
+    assert max(pool.field_elements(1000, Share.prime)) >= 2**127
+    assert len(set(pool.field_elements(1000, 5))) == 5
+
+
+def test_seeded_pool():
+    # A seeded pool gives the same elements, whatever the sizes of the reads.
+    pool = RandomPool(seed=b"seed", buffer_bytes=100)
+    other = RandomPool(seed=b"seed", buffer_bytes=100)
+    assert pool.read(30) + pool.read(200) == other.read(230)
+    seeded_values = [RandomPool(seed=b"seed").field_elements(5, MERSENNE_61) for _ in range(2)]
+    assert seeded_values[0] == seeded_values[1]
+    assert RandomPool(seed=b"other").read(32) != RandomPool(seed=b"seed").read(32)
+
+
+def test_field_array():
+    values = RandomPool().field_array(1000, MERSENNE_61)
+    assert len(values) == 1000
+    assert int(values.max()) < MERSENNE_61
+
+
+def test_fork_discards_buffer():
+    pool = RandomPool()
+    first = pool.read(16)
+    # A process forked with a filled buffer reads new bytes instead of the ones of its parent.
+    pool.buffer, pool.position, pool.pid = first * 2, 16, -1
+    assert pool.read(16) != first
+    assert pool.pid == os.getpid()
+
+
+def test_bulk_triplets(monkeypatch):
+    refills = []
+    pool = RandomPool()
+    original_refill = pool.refill
+    monkeypatch.setattr(pool, "refill", lambda size: refills.append(size) or original_refill(size))
+    monkeypatch.setattr(randomness, "default_pool", pool)
+
+    participants = ("Alice", "Bob", "Charlie")
+    triplets = share_triplets(participants, 1000, Share.prime)
+
+    # The randomness of a thousand triplets is read in a few calls.
+    assert len(refills) <= 3
+    for triplet in triplets[:10]:
+        a, b, c = [reconstruct_secret([triplet[client][j] for client in participants]) for j in range(3)]
+        assert c == a * b % Share.prime
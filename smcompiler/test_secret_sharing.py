@@ -5,8 +5,20 @@ Testing secret sharing is not obligatory.
 MODIFY THIS FILE.
 """
 
+import random
+
+import jsonpickle
+
 from expression import Secret, Scalar
-from secret_sharing import Share, share_secret, reconstruct_secret
+from secret_sharing import (
+    MERSENNE_61,
+    Share,
+    ShareVector,
+    share_secret,
+    share_vector,
+    reconstruct_secret,
+    reconstruct_vector,
+)
 
 def test_addition():
 
@@ -58,3 +70,48 @@ def test_scalar_multiplication():
 
     res = reconstruct_secret(res_shares)
     assert res == 21
+
+def test_serialization():
+
+    share = Share(Share.prime - 1)
+    serialized = share.serialize()
+
+    # The representation is the one of jsonpickle.
+    assert serialized == jsonpickle.encode(share)
+    assert Share.deserialize(serialized).value == share.value
+    assert Share.deserialize(serialized.encode("UTF-8")).value == share.value
+
+def test_share_vector():
+
+    a_shares = share_vector([1, 2, 3], 3)
+    b_shares = share_vector([4, 5, 6], 3)
+    assert [len(shares) for shares in a_shares] == [3, 3, 3]
+
+    sum_shares = [a + b for a, b in zip(a_shares, b_shares)]
+    res = [reconstruct_secret([Share(shares.values[i]) for shares in sum_shares]) for i in range(3)]
+    assert res == [5, 7, 9]
+
+    # A single share is multiplied with each element.
+    assert (ShareVector([1, 2, 3]) * Share(2)).values == [2, 4, 6]
+    assert ShareVector.broadcast(Share(7), 2).values == [7, 7]
+
+def test_mersenne_61():
+
+    p = MERSENNE_61
+    xs = [0, 1, p - 1, p - 1] + [random.randrange(p) for _ in range(1000)]
+    ys = [p - 1, p - 1, 0, p - 1] + [random.randrange(p) for _ in range(1000)]
+    x, y = ShareVector(xs, p), ShareVector(ys, p)
+
+    # The products of 61-bit values are reduced without overflowing 64 bits.
+    assert (x * y).to_list() == [a * b % p for a, b in zip(xs, ys)]
+    assert (x + y).to_list() == [(a + b) % p for a, b in zip(xs, ys)]
+    assert (x - y).to_list() == [(a - b) % p for a, b in zip(xs, ys)]
+    assert (x * Share(2, p)).to_list() == [2 * a % p for a in xs]
+
+    assert reconstruct_vector(share_vector([5, -3, 7], 3, p)) == [5, p - 3, 7]
+    shares = share_secret(-4, 3, p)
+    assert all(share.prime == p for share in shares)
+    assert reconstruct_secret(shares) == p - 4
+
+    # Shares of another field keep their prime once deserialized.
+    assert Share.deserialize(Share(3, p).serialize()).prime == p
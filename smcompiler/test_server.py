@@ -0,0 +1,174 @@
+"""
+Unit tests for the trusted server, using the Flask test client or a server in production mode.
+"""
+
+import socket
+import threading
+import time
+from multiprocessing import Process
+
+import requests
+
+import server
+from codec import BINARY_CONTENT_TYPE, decode_frames, unpack_shares
+from secret_sharing import MERSENNE_61
+
+
+def test_retrieve_public_messages():
+    client = server.app.test_client()
+
+    client.post("/public/Alice/bulk_label", data=b"alice message")
+    assert client.get("/public/Bob/bulk_label?count=2").status_code == 404
+
+    client.post("/public/Bob/bulk_label", data=b"bob message")
+    res = client.get("/public/Bob/bulk_label?count=2")
+    assert res.status_code == 200
+    assert res.get_json() == {"Alice": "alice message", "Bob": "bob message"}
+
+    # The messages of each sender can still be retrieved separately.
+    res = client.get("/public/Bob/Alice/bulk_label")
+    assert res.data == b"alice message"
+
+    # Clients accepting the binary encoding get the messages as frames.
+    res = client.get("/public/Bob/bulk_label?count=2", headers={"Accept": BINARY_CONTENT_TYPE})
+    assert res.mimetype == BINARY_CONTENT_TYPE
+    assert decode_frames(res.data) == {"Alice": b"alice message", "Bob": b"bob message"}
+
+
+def test_retrieve_private_messages():
+    client = server.app.test_client()
+
+    client.post("/private/Alice/Charlie/bulk_private_label", data=b"from alice")
+    client.post("/private/Alice/Bob/bulk_private_label", data=b"to bob")
+    assert client.get("/private/Charlie/bulk_private_label?count=2").status_code == 404
+
+    client.post("/private/Bob/Charlie/bulk_private_label", data=b"from bob")
+    res = client.get("/private/Charlie/bulk_private_label?count=2")
+    assert res.status_code == 200
+    assert res.get_json() == {"Alice": "from alice", "Bob": "from bob"}
+
+
+def test_retrieve_shares():
+    client = server.app.test_client()
+    client.post("/sessions/shares_session", json=["Alice", "Bob"])
+
+    # The triplets retrieved in one request are the ones retrieved one by one, sanitized ids included.
+    res = client.post("/sessions/shares_session/shares/Alice", json=["op1", "op/2"])
+    assert res.status_code == 200
+    assert res.get_json() == [
+        client.get("/sessions/shares_session/shares/Alice/op1").get_json(),
+        client.get("/sessions/shares_session/shares/Alice/op_2").get_json(),
+    ]
+    assert client.post("/sessions/shares_session/shares/Alice", data=b"op1").status_code == 400
+
+    # Clients accepting the binary encoding get the shares packed.
+    binary = {"Accept": BINARY_CONTENT_TYPE}
+    res = client.post("/sessions/shares_session/shares/Alice", json=["op1"], headers=binary)
+    assert res.mimetype == BINARY_CONTENT_TYPE
+    assert [share.serialize() for share in unpack_shares(res.data)] == client.get("/sessions/shares_session/shares/Alice/op1").get_json()
+
+    # Seeded triplets: the designated client, the first participant, is the only one with corrections.
+    alice = client.post("/sessions/shares_session/seeded/Alice", json=["op3"]).get_json()
+    bob = client.post("/sessions/shares_session/seeded/Bob", json=["op3"]).get_json()
+    assert len(bytes.fromhex(alice["seed"])) == len(bytes.fromhex(bob["seed"])) == 16
+    assert len(alice["corrections"]) == 1
+    assert bob["corrections"] is None
+
+
+def test_sessions():
+    client = server.app.test_client()
+
+    client.post("/sessions/first/public/Alice/session_label", data=b"first")
+    client.post("/sessions/second/public/Alice/session_label", data=b"second")
+    assert client.get("/sessions/first/public/Bob/Alice/session_label").data == b"first"
+    assert client.get("/sessions/second/public/Bob/Alice/session_label").data == b"second"
+    # The routes without session are the ones of the default session.
+    assert client.get("/public/Bob/Alice/session_label").status_code == 404
+
+    client.delete("/sessions/first")
+    assert client.get("/sessions/first/public/Bob/Alice/session_label").status_code == 410
+    assert client.get("/sessions/second/public/Bob/Alice/session_label").data == b"second"
+
+    # A session opened without body has the participants of the server.
+    assert client.post("/sessions/third").status_code == 200
+    assert client.post("/sessions/fourth", json=["Alice", "Bob"]).status_code == 200
+    assert server.sessions.get("fourth").ttp.participant_ids == {"Alice", "Bob"}
+    # The participants can be given with the prime of the field of the computation.
+    client.post("/sessions/mersenne", json={"participants": ["Alice", "Bob"], "prime": MERSENNE_61})
+    res = client.get("/sessions/mersenne/shares/Alice/op1", headers={"Accept": BINARY_CONTENT_TYPE})
+    assert len(res.data) == 3 * 8
+    assert server.sessions.get("mersenne").ttp.prime == MERSENNE_61
+
+    # The participants are closing with their ids sanitized as in the URLs.
+    client.post("/sessions/fifth", json=["Alice/1", "Bob+2"])
+    client.delete("/sessions/fifth/Alice_1")
+    client.delete("/sessions/fifth/Bob-2")
+    assert client.get("/sessions/fifth/public/Bob/Alice/session_label").status_code == 410
+
+
+def test_blocking_retrieval():
+    client = server.app.test_client()
+
+    # Without waiting, the server answers right away.
+    start = time.time()
+    assert client.get("/private/Bob/blocking_label").status_code == 404
+    assert time.time() - start < 1
+
+    def send():
+        time.sleep(0.2)
+        server.app.test_client().post("/private/Alice/Bob/blocking_label", data=b"message")
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    res = client.get("/private/Bob/blocking_label?wait=5")
+    sender.join()
+
+    assert res.status_code == 200
+    assert res.data == b"message"
+
+    # The request is answered with 404 once the waiting time expired.
+    start = time.time()
+    assert client.get("/private/Bob/other_label?wait=0.3").status_code == 404
+    assert time.time() - start >= 0.3
+
+
+def test_production_server():
+    port = free_port()
+    server_process = Process(target=server.run, args=("localhost", port, ["Alice", "Bob"], True))
+    server_process.start()
+    try:
+        base_url = f"http://localhost:{port}"
+        deadline = time.time() + 10
+        while True:
+            try:
+                requests.get(f"{base_url}/private/Bob/startup_label")
+                break
+            except requests.ConnectionError:
+                assert server_process.is_alive(), "The server exited before listening"
+                assert time.time() < deadline, "The server did not listen in time"
+                time.sleep(0.05)
+
+        # A request waiting for a message does not block the request sending it.
+        def send():
+            time.sleep(0.2)
+            requests.post(f"{base_url}/private/Alice/Bob/production_label", data=b"message")
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        res = requests.get(f"{base_url}/private/Bob/production_label", params={"wait": 5})
+        sender.join()
+
+        assert res.status_code == 200
+        assert res.content == b"message"
+    finally:
+        server_process.terminate()
+        server_process.join()
+
+
+def free_port() -> int:
+    """
+    Port which no server listens on, chosen by the operating system.
+    """
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,85 @@
+"""
+Unit tests for the sessions of the trusted server.
+"""
+
+import time
+
+import pytest
+
+from sessions import DEFAULT_SESSION, SessionClosedError, SessionRegistry
+
+
+def test_sessions_are_separate():
+    registry = SessionRegistry(["Alice", "Bob"])
+
+    registry.get("first").store.set_value("private", ("Bob", "label"), b"first message")
+    registry.get("second").store.set_value("private", ("Bob", "label"), b"second message")
+
+    assert registry.get("first").store.get_value("private", ("Bob", "label")) == b"first message"
+    assert registry.get("second").store.get_value("private", ("Bob", "label")) == b"second message"
+    assert registry.get("first").ttp.participant_ids == {"Alice", "Bob"}
+
+
+def test_close_by_all_participants():
+    registry = SessionRegistry(["Alice", "Bob"])
+    session = registry.get("session")
+
+    registry.close("session", "Alice")
+    assert registry.get("session") is session
+
+    registry.close("session", "Bob")
+    assert len(registry) == 0
+    # The Beaver triplets of the session are no longer generated.
+    assert session.ttp.pool.stopped
+
+    # Late requests do not bring the session back, but a new computation can open it again.
+    with pytest.raises(SessionClosedError):
+        registry.get("session")
+    assert registry.open("session") is not session
+    assert registry.get("session") is not session
+
+
+def test_open_with_participants():
+    registry = SessionRegistry(["Alice", "Bob"])
+
+    session = registry.open("session", ["Charlie", "Dave"])
+    assert session.ttp.participant_ids == {"Charlie", "Dave"}
+    # Opening an open session keeps it.
+    assert registry.open("session", ["Charlie", "Dave"]) is session
+
+    registry.close("session", "Charlie")
+    registry.close("session", "Dave")
+    assert len(registry) == 0
+
+
+def test_default_session_is_not_closed_by_clients():
+    registry = SessionRegistry(["Alice"])
+    session = registry.get(DEFAULT_SESSION)
+
+    registry.close(DEFAULT_SESSION, "Alice")
+    assert registry.get(DEFAULT_SESSION) is session
+
+
+def test_close_explicitly():
+    registry = SessionRegistry()
+    registry.open("session", ["Alice", "Bob", "Charlie"])
+    assert registry.get("session").ttp.participant_ids == {"Alice", "Bob", "Charlie"}
+
+    registry.close("session")
+    assert len(registry) == 0
+
+
+def test_evict_expired_sessions():
+    registry = SessionRegistry(["Alice"], ttl=0.2, closed_ttl=0.2)
+    registry.get("unused")
+    for _ in range(4):
+        time.sleep(0.1)
+        registry.get("used")
+
+    assert "unused" not in registry.sessions
+    assert "used" in registry.sessions
+
+    registry.close("used")
+    time.sleep(0.3)
+    registry.get("other")
+    assert "used" not in registry.closed
@@ -0,0 +1,135 @@
+"""
+Tests of the in-process simulation of the parties.
+"""
+
+import pytest
+
+from expression import DotProduct, Scalar, Secret, SecretVector, dot_product, sum_of
+from compiler import DOT_BEAVER, MUL_BEAVER
+from protocol import ProtocolSpec
+from secret_sharing import MERSENNE_61, Share
+from simulator import simulate
+
+
+def test_simulate():
+    alice_secret = Secret()
+    bob_secret = Secret()
+    charlie_secret = Secret()
+
+    parties = ["Alice", "Bob", "Charlie"]
+    value_dicts = {
+        "Alice": {alice_secret: 3},
+        "Bob": {bob_secret: 14},
+        "Charlie": {charlie_secret: 2},
+    }
+    expr = alice_secret * bob_secret * charlie_secret + Scalar(5)
+    simulation = simulate(ProtocolSpec(expr=expr, participant_ids=parties), value_dicts)
+
+    assert simulation.results == {"Alice": 89, "Bob": 89, "Charlie": 89}
+    for metrics in simulation.metrics.values():
+        assert metrics.bytes_sent > 0
+        assert metrics.bytes_received > 0
+        assert 0 <= metrics.computation_time <= metrics.total_time
+
+
+def test_simulate_seeded_triplets():
+    parties = [f"party{i}" for i in range(10)]
+    secrets = [Secret() for _ in parties]
+    value_dicts = {party: {secret: i + 1} for i, (party, secret) in enumerate(zip(parties, secrets))}
+    expr = secrets[0] * secrets[1] * secrets[2] + secrets[3] * secrets[4]
+
+    explicit = simulate(ProtocolSpec(expr=expr, participant_ids=parties), value_dicts)
+    seeded = simulate(ProtocolSpec(expr=expr, participant_ids=parties, seeded_triplets=True), value_dicts)
+
+    assert set(seeded.results.values()) == set(explicit.results.values()) == {1 * 2 * 3 + 4 * 5}
+    # The clients other than the designated one only download their seed.
+    assert seeded.metrics["party1"].bytes_received < explicit.metrics["party1"].bytes_received
+
+
+def test_simulate_vectors():
+    heights = SecretVector(4)
+    weights = SecretVector(4)
+    offset = Secret()
+
+    parties = ["Alice", "Bob", "Charlie"]
+    value_dicts = {
+        "Alice": {heights: [150, 160, 170, 180]},
+        "Bob": {weights: [50, 60, 70, 80]},
+        "Charlie": {offset: 7},
+    }
+    # The element-wise product is computed with a single opening, as for single values.
+    expr = heights * weights * Scalar(2) + offset - Scalar(1)
+    simulation = simulate(ProtocolSpec(expr=expr, participant_ids=parties), value_dicts)
+
+    expected = [2 * h * w + 6 for h, w in zip([150, 160, 170, 180], [50, 60, 70, 80])]
+    assert simulation.results == {party: expected for party in parties}
+
+
+@pytest.mark.parametrize("seeded_triplets", [False, True])
+def test_simulate_mersenne_61(seeded_triplets):
+    values = SecretVector(3)
+    factor = Secret()
+
+    parties = ["Alice", "Bob", "Charlie"]
+    value_dicts = {"Alice": {values: [3, 2**40, 5]}, "Bob": {factor: 2**30}}
+    expr = values * factor * values - Scalar(4)
+    prot = ProtocolSpec(
+        expr=expr, participant_ids=parties, seeded_triplets=seeded_triplets, prime=MERSENNE_61
+    )
+    simulation = simulate(prot, value_dicts)
+
+    # The results are reduced modulo 2^61 - 1.
+    expected = [(v * 2**30 * v - 4) % MERSENNE_61 for v in [3, 2**40, 5]]
+    assert simulation.results == {party: expected for party in parties}
+
+
+@pytest.mark.parametrize("seeded_triplets", [False, True])
+def test_simulate_dot_product(seeded_triplets):
+    weights = [Secret() for _ in range(3)]
+    heights = [Secret() for _ in range(3)]
+    vector = SecretVector(2)
+
+    parties = ["Alice", "Bob", "Charlie"]
+    value_dicts = {
+        "Alice": {weights[0]: 50, heights[0]: 15, vector: [1, 2]},
+        "Bob": {weights[1]: 60, heights[1]: 16},
+        "Charlie": {weights[2]: 70, heights[2]: 17},
+    }
+    # Sum of products written by the user, or fused by the optimizer.
+    by_user = dot_product(weights, heights) + Scalar(1)
+    by_optimizer = weights[0] * heights[0] + weights[1] * heights[1] * Scalar(2) - weights[2] * heights[2]
+    weighted_vector = DotProduct([(3, vector, weights[0]), (1, vector, vector)])
+
+    expected = {
+        by_user: 50 * 15 + 60 * 16 + 70 * 17 + 1,
+        by_optimizer: (50 * 15 + 2 * 60 * 16 - 70 * 17) % Share.prime,
+        weighted_vector: [3 * 1 * 50 + 1, 3 * 2 * 50 + 4],
+    }
+    for expr, result in expected.items():
+        prot = ProtocolSpec(expr=expr, participant_ids=parties, seeded_triplets=seeded_triplets)
+        # A single gate computes all the products.
+        opcodes = [ins.opcode for ins in prot.program.instructions]
+        assert opcodes.count(DOT_BEAVER) == 1 and MUL_BEAVER not in opcodes
+        simulation = simulate(prot, value_dicts)
+        assert simulation.results == {party: result for party in parties}
+
+
+def test_simulate_many_parties():
+    parties = [f"party{i}" for i in range(200)]
+    secrets = [Secret() for _ in parties]
+    value_dicts = {party: {secret: i} for i, (party, secret) in enumerate(zip(parties, secrets))}
+    # Parties without secrets only take part in the computation.
+    del value_dicts["party0"]
+
+    expr = sum_of(secrets[1:]) * secrets[1]
+    simulation = simulate(ProtocolSpec(expr=expr, participant_ids=parties), value_dicts)
+
+    assert set(simulation.results.values()) == {sum(range(200))}
+
+
+def test_simulate_missing_secret():
+    secret = Secret()
+    prot = ProtocolSpec(expr=secret * Scalar(2), participant_ids=["Alice", "Bob"])
+
+    with pytest.raises(KeyError):
+        simulate(prot, {}, timeout=10)
@@ -0,0 +1,121 @@
+"""
+Tests of the protocol over the transports that do not need a TCP server.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from multiprocessing import Process
+
+import pytest
+
+from expression import Scalar, Secret
+from protocol import ProtocolSpec
+from server import run
+from sessions import SessionClosedError
+from smc_party import SMCParty
+from transport import InMemoryRelay, InMemoryTransport, UnixSocketTransport
+
+
+def run_threads(prot, value_dicts, transports):
+    results = {}
+
+    def smc_client(client_id, value_dict, transport):
+        cli = SMCParty(
+            client_id,
+            None,
+            None,
+            protocol_spec=prot,
+            value_dict=value_dict,
+            transport=transport,
+            metrics_path=None
+        )
+        results[client_id] = cli.run()
+
+    clients = [
+        threading.Thread(target=smc_client, args=(client_id, value_dict, transports[client_id]))
+        for client_id, value_dict in value_dicts.items()
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+    return list(results.values())
+
+
+def build_protocol(seeded_triplets=False):
+    alice_secret = Secret()
+    bob_secret = Secret()
+    charlie_secret = Secret()
+
+    parties = ["Alice", "Bob", "Charlie"]
+    value_dicts = {
+        "Alice": {alice_secret: 3},
+        "Bob": {bob_secret: 14},
+        "Charlie": {charlie_secret: 2},
+    }
+    expr = alice_secret * bob_secret + charlie_secret * Scalar(5) - alice_secret
+    prot = ProtocolSpec(expr=expr, participant_ids=parties, seeded_triplets=seeded_triplets)
+    return prot, value_dicts, 3 * 14 + 2 * 5 - 3
+
+
+def test_in_memory_transport():
+    prot, value_dicts, expected = build_protocol()
+    relay = InMemoryRelay(prot.participant_ids)
+    transports = {client_id: InMemoryTransport(relay) for client_id in value_dicts}
+
+    results = run_threads(prot, value_dicts, transports)
+    assert results == [expected] * 3
+
+
+def test_in_memory_transport_cancel():
+    relay = InMemoryRelay(["Alice", "Bob"])
+    transport = InMemoryTransport(relay, wait_timeout=0.05)
+    errors = []
+
+    def wait_for_bob():
+        try:
+            transport.retrieve_public_messages("Alice", ["Alice", "Bob"], "label")
+        except SessionClosedError as error:
+            errors.append(error)
+
+    # A client waiting for a message which never comes gives up once the relay is cancelled.
+    waiting = threading.Thread(target=wait_for_bob)
+    waiting.start()
+    relay.cancel()
+    waiting.join(timeout=5)
+
+    assert not waiting.is_alive()
+    assert len(errors) == 1
+    with pytest.raises(SessionClosedError):
+        transport.retrieve_private_message("Alice", "label")
+
+
+@pytest.mark.parametrize("seeded_triplets", [False, True])
+def test_unix_socket_transport(seeded_triplets):
+    prot, value_dicts, expected = build_protocol(seeded_triplets)
+    socket_path = os.path.join(tempfile.mkdtemp(), "server.sock")
+
+    # The clients open their session with the participants of the protocol, unknown to the server.
+    server = Process(target=run, args=(f"unix://{socket_path}", 0, []))
+    server.start()
+
+    try:
+        deadline = time.time() + 10
+        while not os.path.exists(socket_path):
+            assert server.is_alive(), "The server exited before listening"
+            assert time.time() < deadline, "The server did not listen in time"
+            time.sleep(0.05)
+
+        transports = {
+            client_id: UnixSocketTransport(socket_path, session_id="unix_session")
+            for client_id in value_dicts
+        }
+        results = run_threads(prot, value_dicts, transports)
+    finally:
+        server.terminate()
+        server.join()
+
+    assert results == [expected] * 3
@@ -5,7 +5,15 @@ Testing ttp is not obligatory.
 MODIFY THIS FILE.
 """
 
-from ttp import TrustedParamGenerator
+import threading
+import time
+
+import pytest
+
+from compiler import compile_expression, vector_op_ids
+from expression import Secret
+from secret_sharing import Share, reconstruct_secret, seeded_triplet
+from ttp import TriplePool, TrustedParamGenerator
 
 
 def test_beaver_triplet_gen():
@@ -18,3 +26,156 @@ def test_beaver_triplet_gen():
     assert len(alice_share) == 3
     bob_share = ttp.retrieve_share("Bob", "MultOp1")
     assert len(bob_share) == 3
+
+
+def test_preprocess_program():
+
+    alice_secret = Secret()
+    bob_secret = Secret()
+    program = compile_expression(alice_secret * bob_secret + alice_secret * alice_secret)
+
+    ttp = TrustedParamGenerator()
+    ttp.add_participant("Alice")
+    ttp.add_participant("Bob")
+    ttp.preprocess(program)
+
+    assert len(program.beaver_op_ids) == 2
+    for op_id in program.beaver_op_ids:
+        alice_share = ttp.retrieve_share("Alice", op_id)
+        bob_share = ttp.retrieve_share("Bob", op_id)
+        a = reconstruct_secret([alice_share[0], bob_share[0]])
+        b = reconstruct_secret([alice_share[1], bob_share[1]])
+        c = reconstruct_secret([alice_share[2], bob_share[2]])
+        assert c == (a * b) % Share.prime
+
+
+def test_concurrent_retrieval():
+
+    ttp = TrustedParamGenerator()
+    participants = [f"party{i}" for i in range(20)]
+    for participant in participants:
+        ttp.add_participant(participant)
+
+    # All the clients request their shares at once, and must get shares of the same triplet.
+    shares = {}
+    barrier = threading.Barrier(len(participants))
+
+    def retrieve(client_id):
+        barrier.wait()
+        shares[client_id] = ttp.retrieve_share(client_id, "MultOp1")
+
+    threads = [threading.Thread(target=retrieve, args=(client_id,)) for client_id in participants]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    a, b, c = [reconstruct_secret([shares[client_id][i] for client_id in participants]) for i in range(3)]
+    assert c == (a * b) % Share.prime
+
+
+def wait_until(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "The condition did not hold in time"
+        time.sleep(0.01)
+
+
+def test_triple_pool():
+
+    ttp = TrustedParamGenerator(TriplePool(low_watermark=4, high_watermark=8))
+    ttp.add_participant("Alice")
+    ttp.add_participant("Bob")
+    ttp.start()
+
+    # The offline phase fills the pool up to the high watermark, and stops there.
+    wait_until(lambda: ttp.metrics().depth == 8)
+    assert ttp.metrics().produced == 8
+
+    # The online phase only binds triplets of the pool to the operations.
+    for i in range(5):
+        alice_share = ttp.retrieve_share("Alice", f"MultOp{i}")
+        bob_share = ttp.retrieve_share("Bob", f"MultOp{i}")
+        a, b, c = [reconstruct_secret([alice_share[j], bob_share[j]]) for j in range(3)]
+        assert c == (a * b) % Share.prime
+    assert ttp.metrics().taken == 5
+    assert ttp.metrics().misses == 0
+
+    # Below the low watermark, the pool is refilled.
+    wait_until(lambda: ttp.metrics().depth == 8)
+    assert ttp.metrics().produced == 13
+
+    ttp.stop()
+    assert ttp.metrics().depth == 0
+
+
+def test_triple_pool_participants():
+
+    pool = TriplePool(low_watermark=2, high_watermark=2)
+    ttp = TrustedParamGenerator(pool)
+    ttp.add_participant("Alice")
+    ttp.start()
+    wait_until(lambda: ttp.metrics().depth == 2)
+
+    # The triplets shared with the previous participants are discarded.
+    ttp.add_participant("Bob")
+    wait_until(lambda: ttp.metrics().depth == 2)
+    assert len(ttp.retrieve_share("Bob", "MultOp1")) == 3
+    assert set(pool.triplets[0]) == {"Alice", "Bob"}
+    ttp.stop()
+
+    # Without the producer, the retrievals generate their triplets.
+    ttp.retrieve_share("Alice", "MultOp2")
+    assert ttp.metrics().misses == 1
+
+
+def test_retrieve_gate_shares():
+
+    pool = TriplePool(low_watermark=0, high_watermark=0)
+    ttp = TrustedParamGenerator(pool)
+    ttp.add_participant("Alice")
+    ttp.add_participant("Bob")
+
+    # The triplets of all the terms of a gate are bound at once, the clients get the same ones.
+    op_ids = vector_op_ids("DotOp", 4)
+    alice_shares = ttp.retrieve_shares("Alice", op_ids)
+    bob_shares = ttp.retrieve_shares("Bob", op_ids)
+    assert pool.metrics().taken == 4
+    for alice_share, bob_share in zip(alice_shares, bob_shares):
+        a, b, c = [reconstruct_secret([alice_share[j], bob_share[j]]) for j in range(3)]
+        assert c == (a * b) % Share.prime
+    assert ttp.retrieve_share("Alice", op_ids[2]) == alice_shares[2]
+
+
+def test_seeded_triplets():
+
+    ttp = TrustedParamGenerator()
+    participants = ["Alice", "Bob", "Charlie"]
+    for participant in participants:
+        ttp.add_participant(participant)
+
+    # Only the designated client gets corrections, the others expand all their shares.
+    op_ids = ["MultOp1", "MultOp2"]
+    retrieved = {client_id: ttp.retrieve_seeded(client_id, op_ids) for client_id in participants}
+    assert retrieved["Bob"][1] is None
+    assert retrieved["Charlie"][1] is None
+    assert len(retrieved["Alice"][1]) == 2
+
+    for i, op_id in enumerate(op_ids):
+        shares = {
+            client_id: seeded_triplet(seed, op_id, None if corrections is None else corrections[i])
+            for client_id, (seed, corrections) in retrieved.items()
+        }
+        a, b, c = [reconstruct_secret([shares[client_id][j] for client_id in participants]) for j in range(3)]
+        assert c == (a * b) % Share.prime
+
+        # The explicit shares of a seeded triplet are the expanded ones.
+        for client_id in participants:
+            assert [share.value for share in ttp.retrieve_share(client_id, op_id)] == [
+                share.value for share in shares[client_id]
+            ]
+
+    # An operation cannot have both kinds of triplet.
+    ttp.retrieve_share("Alice", "MultOp3")
+    with pytest.raises(ValueError):
+        ttp.retrieve_seeded("Alice", ["MultOp3"])
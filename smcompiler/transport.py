@@ -0,0 +1,459 @@
+"""
+Transports used by the SMC clients to exchange messages through the trusted server.
+
+- HttpTransport: HTTP requests to the server of server.py (default).
+- UnixSocketTransport: HTTP requests to the server listening on a Unix domain socket, for clients
+  running on the same machine as the server.
+- InMemoryTransport: direct calls to a relay in the same process, without any network.
+"""
+
+import abc
+import http.client
+import json
+import socket
+import threading
+import time
+import urllib.parse
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import requests
+
+from codec import BINARY_CONTENT_TYPE, decode_frames, pack_shares
+from secret_sharing import Share
+from sessions import DEFAULT_SESSION, Session, SessionClosedError
+
+
+def sanitize_url_param(url_param: Union[bytes, str]) -> str:
+    """
+    Sanitize URL parameter to be URL-safe.
+    """
+    if isinstance(url_param, bytes):
+        # Mypy "dislikes" variable redefinition.
+        url_param = url_param.decode("ASCII") # type: ignore
+
+    # %2F is indistinguishable from / due to WSGI standard.
+    url_param = url_param.replace(r"%2F", "_").replace(r"%2f", "_")
+
+    return url_param.replace("/", "_").replace("+", "-") # type: ignore
+
+
+class Transport(abc.ABC):
+    """
+    Interface of the transports. The retrieval methods block until the messages are available.
+
+    Attributes:
+        polls: Number of poll iterations of the retrievals, e.g. requests sent until the messages
+            were available, counted by the transports which poll
+    """
+
+    polls = 0
+
+    @abc.abstractmethod
+    def send_private_message(self, sender_id: str, receiver_id: str, label: str, message: bytes) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def retrieve_private_message(self, receiver_id: str, label: str) -> bytes:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def retrieve_private_messages(
+            self,
+            receiver_id: str,
+            sender_ids: List[str],
+            label: str
+        ) -> Dict[str, bytes]:
+        """
+        Private messages of a receiver with a label of all the given senders, indexed by sender.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def publish_message(self, sender_id: str, label: str, message: bytes) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def retrieve_public_message(self, receiver_id: str, sender_id: str, label: str) -> bytes:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def retrieve_public_messages(
+            self,
+            receiver_id: str,
+            sender_ids: List[str],
+            label: str
+        ) -> Dict[str, bytes]:
+        """
+        Public messages with a label of all the given senders, indexed by sender.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def retrieve_beaver_triplet_shares(self, client_id: str, op_id: str) -> bytes:
+        """
+        Shares of the Beaver triplet of an operation, packed by codec.pack_shares.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def retrieve_beaver_triplets_shares(self, client_id: str, op_ids: List[str]) -> bytes:
+        """
+        Shares of the Beaver triplets of several operations packed by codec.pack_shares, three per
+        operation in the order of the operations.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def retrieve_seeded_triplets(self, client_id: str, op_ids: List[str]) -> bytes:
+        """
+        JSON object with the hexadecimal seed of the client, and the list of the corrections of the
+        triplets of the operations if the client is the designated one, or null.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def open_session(self, participants: List[str], prime: int = Share.prime) -> None:
+        """
+        Open the session of the computation with its participants and the prime of its field,
+        unless it is already open. The shares are then packed in the field of the prime.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def close_session(self, client_id: str) -> None:
+        """
+        Tell the server that the client is done with the session of the computation.
+        """
+        raise NotImplementedError
+
+
+class HttpResponse(NamedTuple):
+    """
+    Status code, content and content type of a response of the server.
+    """
+    status: int
+    content: bytes
+    content_type: str
+
+
+class HttpTransport(Transport):
+    """
+    Transport sending HTTP requests to the server. The requests accept the binary encoding of
+    codec.py, and the JSON responses of servers which do not support it are converted.
+
+    Attributes:
+        base_url: URL of the server
+        poll_delay: delay between requests in seconds, if the server does not hold them
+        wait_timeout: time in seconds the server can hold a request until the message is available
+        session_id: session of the computation on the server (default: the default session)
+        prime: prime of the field of the session, given when opening it
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            poll_delay: float = 0.2,
+            wait_timeout: float = 10.0,
+            session_id: Optional[str] = None
+        ):
+        self.base_url = base_url
+        self.poll_delay = poll_delay
+        self.wait_timeout = wait_timeout
+        self.session_id = DEFAULT_SESSION if session_id is None else session_id
+        # The routes without prefix are the ones of the default session.
+        self.prefix = "" if session_id is None else f"/sessions/{sanitize_url_param(session_id)}"
+        self.prime = Share.prime
+
+    def request(
+            self,
+            method: str,
+            path: str,
+            data: Optional[bytes] = None,
+            params: Optional[Dict[str, Union[str, int, float]]] = None
+        ) -> HttpResponse:
+        """
+        Send a request to the server, returning the status code and the content of the response.
+        """
+        url = f"{self.base_url}{path}"
+        print(f"{method:<4} {url}")
+        res = requests.request(method, url, data=data, params=params, headers={"Accept": BINARY_CONTENT_TYPE})
+        return HttpResponse(res.status_code, res.content, res.headers.get("Content-Type", ""))
+
+    def poll(self, path: str, params: Optional[Dict[str, Union[str, int, float]]] = None) -> HttpResponse:
+        """
+        Send GET requests until the server answers with the message.
+        The server holds each request until the message is available or wait_timeout expires,
+        so the client only sleeps between requests if the server answered right away.
+        """
+        params = dict(params or {}, wait=self.wait_timeout)
+        while True:
+            self.polls += 1
+            sent = time.time()
+            res = self.request("GET", path, params=params)
+            if res.status == 200:
+                return res
+            if res.status == 410:
+                raise SessionClosedError(res.content.decode("UTF-8"))
+            if time.time() - sent < self.wait_timeout:
+                time.sleep(self.poll_delay)
+
+    def send_private_message(self, sender_id: str, receiver_id: str, label: str, message: bytes) -> None:
+        sender_id_san = sanitize_url_param(sender_id)
+        receiver_id_san = sanitize_url_param(receiver_id)
+        label_san = sanitize_url_param(label)
+        path = f"{self.prefix}/private/{sender_id_san}/{receiver_id_san}/{label_san}"
+        self.request("POST", path, data=message)
+
+    def retrieve_private_message(self, receiver_id: str, label: str) -> bytes:
+        receiver_id_san = sanitize_url_param(receiver_id)
+        label_san = sanitize_url_param(label)
+        return self.poll(f"{self.prefix}/private/{receiver_id_san}/{label_san}").content
+
+    def retrieve_private_messages(
+            self,
+            receiver_id: str,
+            sender_ids: List[str],
+            label: str
+        ) -> Dict[str, bytes]:
+        receiver_id_san = sanitize_url_param(receiver_id)
+        label_san = sanitize_url_param(label)
+        return self.poll_messages(f"{self.prefix}/private/{receiver_id_san}/{label_san}", sender_ids)
+
+    def publish_message(self, sender_id: str, label: str, message: bytes) -> None:
+        sender_id_san = sanitize_url_param(sender_id)
+        label_san = sanitize_url_param(label)
+        self.request("POST", f"{self.prefix}/public/{sender_id_san}/{label_san}", data=message)
+
+    def retrieve_public_message(self, receiver_id: str, sender_id: str, label: str) -> bytes:
+        receiver_id_san = sanitize_url_param(receiver_id)
+        sender_id_san = sanitize_url_param(sender_id)
+        label_san = sanitize_url_param(label)
+        return self.poll(f"{self.prefix}/public/{receiver_id_san}/{sender_id_san}/{label_san}").content
+
+    def retrieve_public_messages(
+            self,
+            receiver_id: str,
+            sender_ids: List[str],
+            label: str
+        ) -> Dict[str, bytes]:
+        receiver_id_san = sanitize_url_param(receiver_id)
+        label_san = sanitize_url_param(label)
+        return self.poll_messages(f"{self.prefix}/public/{receiver_id_san}/{label_san}", sender_ids)
+
+    def poll_messages(self, path: str, sender_ids: List[str]) -> Dict[str, bytes]:
+        """
+        Poll the messages of all the given senders, which the server sends in a single response.
+        """
+        while True:
+            res = self.poll(path, {"count": len(sender_ids)})
+            if res.content_type.startswith(BINARY_CONTENT_TYPE):
+                messages = decode_frames(res.content)
+            else:
+                messages = {sender: data.encode("UTF-8") for sender, data in json.loads(res.content).items()}
+            # Messages from other senders with the same label are ignored.
+            if all(sanitize_url_param(sender_id) in messages for sender_id in sender_ids):
+                return {sender_id: messages[sanitize_url_param(sender_id)] for sender_id in sender_ids}
+            time.sleep(self.poll_delay)
+
+    def retrieve_beaver_triplet_shares(self, client_id: str, op_id: str) -> bytes:
+        client_id_san = sanitize_url_param(client_id)
+        op_id_san = sanitize_url_param(op_id)
+        res = self.request("GET", f"{self.prefix}/shares/{client_id_san}/{op_id_san}")
+        if res.content_type.startswith(BINARY_CONTENT_TYPE):
+            return res.content
+        return pack_shares((Share.deserialize(share) for share in json.loads(res.content)), self.prime)
+
+    def retrieve_beaver_triplets_shares(self, client_id: str, op_ids: List[str]) -> bytes:
+        client_id_san = sanitize_url_param(client_id)
+        # The operations are identified by their sanitized id, as in the URLs of single triplets.
+        op_ids_san = [sanitize_url_param(op_id) for op_id in op_ids]
+        res = self.request(
+            "POST", f"{self.prefix}/shares/{client_id_san}", data=json.dumps(op_ids_san).encode("UTF-8")
+        )
+        if res.content_type.startswith(BINARY_CONTENT_TYPE):
+            return res.content
+        return pack_shares(
+            (Share.deserialize(share) for shares in json.loads(res.content) for share in shares),
+            self.prime
+        )
+
+    def retrieve_seeded_triplets(self, client_id: str, op_ids: List[str]) -> bytes:
+        client_id_san = sanitize_url_param(client_id)
+        op_ids_san = [sanitize_url_param(op_id) for op_id in op_ids]
+        res = self.request(
+            "POST", f"{self.prefix}/seeded/{client_id_san}", data=json.dumps(op_ids_san).encode("UTF-8")
+        )
+        return res.content
+
+    def open_session(self, participants: List[str], prime: int = Share.prime) -> None:
+        self.prime = prime
+        session_id_san = sanitize_url_param(self.session_id)
+        body = {"participants": participants, "prime": prime}
+        self.request("POST", f"/sessions/{session_id_san}", data=json.dumps(body).encode("UTF-8"))
+
+    def close_session(self, client_id: str) -> None:
+        session_id_san = sanitize_url_param(self.session_id)
+        client_id_san = sanitize_url_param(client_id)
+        self.request("DELETE", f"/sessions/{session_id_san}/{client_id_san}")
+
+
+class UnixSocketTransport(HttpTransport):
+    """
+    Transport sending HTTP requests to a server listening on a Unix domain socket, which avoids
+    the TCP stack when the clients and the server run on the same machine.
+
+    Attributes:
+        socket_path: path of the socket of the server
+    """
+
+    def __init__(
+            self,
+            socket_path: str,
+            poll_delay: float = 0.2,
+            wait_timeout: float = 10.0,
+            session_id: Optional[str] = None
+        ):
+        super().__init__(f"unix://{socket_path}", poll_delay, wait_timeout, session_id)
+        self.socket_path = socket_path
+        self.connection = UnixSocketConnection(socket_path)
+
+    def request(
+            self,
+            method: str,
+            path: str,
+            data: Optional[bytes] = None,
+            params: Optional[Dict[str, Union[str, int, float]]] = None
+        ) -> HttpResponse:
+        url = urllib.parse.quote(path)
+        if params:
+            url = f"{url}?{urllib.parse.urlencode(params)}"
+        print(f"{method:<4} {self.base_url}{url}")
+
+        self.connection.request(method, url, body=data, headers={"Accept": BINARY_CONTENT_TYPE})
+        res = self.connection.getresponse()
+        return HttpResponse(res.status, res.read(), res.getheader("Content-Type", ""))
+
+
+class UnixSocketConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix domain socket.
+    """
+
+    def __init__(self, socket_path: str):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class InMemoryRelay(Session):
+    """
+    Replacement of the server for clients running in the same process: a single session holding
+    the messages exchanged by the clients and the Beaver triplets.
+
+    Attributes:
+        cancelled: Set once the computation is abandoned, so that the waiting clients give up
+    """
+
+    def __init__(self, participants: Iterable[str], prime: int = Share.prime):
+        super().__init__(participants, prime)
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """
+        Abandon the computation: the clients waiting for messages raise SessionClosedError.
+        """
+        self.cancelled.set()
+
+
+class InMemoryTransport(Transport):
+    """
+    Transport calling an in-memory relay directly. Retrievals wait on the relay until the
+    messages are available, or until the relay is cancelled.
+
+    Attributes:
+        relay: Relay shared by the clients
+        wait_timeout: time in seconds between two checks of the messages and of the cancellation
+    """
+
+    def __init__(self, relay: InMemoryRelay, wait_timeout: float = 10.0):
+        self.relay = relay
+        self.wait_timeout = wait_timeout
+
+    def check_cancelled(self) -> None:
+        """
+        Raise SessionClosedError if the relay was cancelled.
+        """
+        if self.relay.cancelled.is_set():
+            raise SessionClosedError("The computation was cancelled")
+
+    def wait_for_value(self, pool: str, channel: Tuple[str, str]) -> bytes:
+        while True:
+            self.polls += 1
+            res = self.relay.store.get_value(pool, channel, self.wait_timeout)
+            if res is not None:
+                return res
+            self.check_cancelled()
+
+    def send_private_message(self, sender_id: str, receiver_id: str, label: str, message: bytes) -> None:
+        self.relay.store.set_value("private", (receiver_id, label), message, sender_id)
+
+    def retrieve_private_message(self, receiver_id: str, label: str) -> bytes:
+        return self.wait_for_value("private", (receiver_id, label))
+
+    def retrieve_private_messages(
+            self,
+            receiver_id: str,
+            sender_ids: List[str],
+            label: str
+        ) -> Dict[str, bytes]:
+        while True:
+            self.polls += 1
+            messages = self.relay.store.get_private_messages(
+                receiver_id, label, len(sender_ids), self.wait_timeout
+            )
+            if all(sender_id in messages for sender_id in sender_ids):
+                return {sender_id: messages[sender_id] for sender_id in sender_ids}
+            self.check_cancelled()
+
+    def publish_message(self, sender_id: str, label: str, message: bytes) -> None:
+        self.relay.store.set_value("public", (sender_id, label), message)
+
+    def retrieve_public_message(self, receiver_id: str, sender_id: str, label: str) -> bytes:
+        return self.wait_for_value("public", (sender_id, label))
+
+    def retrieve_public_messages(
+            self,
+            receiver_id: str,
+            sender_ids: List[str],
+            label: str
+        ) -> Dict[str, bytes]:
+        while True:
+            self.polls += 1
+            messages = self.relay.store.get_public_messages(label, len(sender_ids), self.wait_timeout)
+            if all(sender_id in messages for sender_id in sender_ids):
+                return {sender_id: messages[sender_id] for sender_id in sender_ids}
+            self.check_cancelled()
+
+    def retrieve_beaver_triplet_shares(self, client_id: str, op_id: str) -> bytes:
+        return pack_shares(self.relay.ttp.retrieve_share(client_id, op_id), self.relay.ttp.prime)
+
+    def retrieve_beaver_triplets_shares(self, client_id: str, op_ids: List[str]) -> bytes:
+        ttp = self.relay.ttp
+        return pack_shares(
+            (share for shares in ttp.retrieve_shares(client_id, op_ids) for share in shares), ttp.prime
+        )
+
+    def retrieve_seeded_triplets(self, client_id: str, op_ids: List[str]) -> bytes:
+        seed, corrections = self.relay.ttp.retrieve_seeded(client_id, op_ids)
+        return json.dumps({"seed": seed.hex(), "corrections": corrections}).encode("UTF-8")
+
+    def open_session(self, participants: List[str], prime: int = Share.prime) -> None:
+        # The relay only holds one computation, whose participants and field it already has.
+        pass
+
+    def close_session(self, client_id: str) -> None:
+        # The relay is discarded with its computation.
+        pass
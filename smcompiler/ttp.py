@@ -5,63 +5,381 @@ MODIFY THIS FILE.
 """
 
 import collections
+import threading
 from typing import (
+    Deque,
     Dict,
+    List,
+    NamedTuple,
+    Optional,
     Set,
     Tuple,
 )
 
-from communication import Communication
+from compiler import Program
+from randomness import field_elements, token_bytes
 from secret_sharing import(
+    prg_value,
+    seeded_triplet,
     share_secret,
     Share,
 )
 
-import random
 from expression import Secret
 
 
+# Shares of a Beaver triplet indexed by client.
+TripletShares = Dict[str, Tuple[Share, Share, Share]]
+
+# The producer refills the pool up to the high watermark once it falls below the low watermark.
+LOW_WATERMARK = 16
+HIGH_WATERMARK = 64
+# Size in bytes of the seeds of the clients.
+SEED_BYTES = 16
+
+
+class PoolMetrics(NamedTuple):
+    """
+    Measurements of a triplet pool.
+
+    Attributes:
+        depth: Number of triplets ready in the pool
+        produced: Number of triplets generated by the producer
+        taken: Number of triplets taken from the pool or generated for a retrieval
+        misses: Number of triplets generated for a retrieval which found the pool empty
+    """
+    depth: int
+    produced: int
+    taken: int
+    misses: int
+
+
+class TriplePool:
+    """
+    Bounded pool of Beaver triplets shared in advance between the participants, filled by a
+    background producer so that the retrievals of the online phase do not generate them.
+
+    The producer starts refilling once the pool falls below low_watermark triplets, and stops at
+    high_watermark. The triplets are shared between the participants given to reset, and the
+    pool is emptied when they change. The triplets are in the field of the given prime.
+    """
+
+    def __init__(
+            self,
+            low_watermark: int = LOW_WATERMARK,
+            high_watermark: int = HIGH_WATERMARK,
+            prime: int = Share.prime
+        ):
+        if not 0 <= low_watermark <= high_watermark:
+            raise ValueError("The watermarks must satisfy 0 <= low_watermark <= high_watermark")
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.prime = prime
+
+        self.participant_ids: Tuple[str, ...] = ()
+        self.triplets: Deque[TripletShares] = collections.deque()
+        self.produced = 0
+        self.taken = 0
+        self.misses = 0
+
+        self.condition = threading.Condition()
+        self.producer: Optional[threading.Thread] = None
+        self.stopped = False
+
+    def reset(self, participant_ids: Set[str]) -> None:
+        """
+        Share the next triplets between new participants, discarding the ones of the previous ones.
+        """
+        with self.condition:
+            self.participant_ids = tuple(participant_ids)
+            self.triplets.clear()
+            self.condition.notify_all()
+
+    def start(self) -> None:
+        """
+        Start the background producer, unless it is already running.
+        """
+        with self.condition:
+            if self.producer is not None or self.stopped:
+                return
+            self.producer = threading.Thread(target=self.produce, name="triple-pool", daemon=True)
+            self.producer.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background producer and discard the triplets of the pool.
+        """
+        with self.condition:
+            self.stopped = True
+            self.triplets.clear()
+            self.condition.notify_all()
+
+    def take(self) -> TripletShares:
+        """
+        Take a triplet from the pool, or generate one if the pool is empty.
+        """
+        return self.take_many(1)[0]
+
+    def take_many(self, count: int) -> List[TripletShares]:
+        """
+        Take several triplets from the pool at once, e.g. for all the elements of a gate, and
+        generate the ones missing if the pool runs empty.
+        """
+        with self.condition:
+            self.taken += count
+            triplets = [self.triplets.popleft() for _ in range(min(count, len(self.triplets)))]
+            if len(self.triplets) <= self.low_watermark:
+                self.condition.notify_all()
+            self.misses += count - len(triplets)
+            participant_ids = self.participant_ids
+
+        return triplets + share_triplets(participant_ids, count - len(triplets), self.prime)
+
+    def metrics(self) -> PoolMetrics:
+        """
+        Current measurements of the pool.
+        """
+        with self.condition:
+            return PoolMetrics(len(self.triplets), self.produced, self.taken, self.misses)
+
+    def produce(self) -> None:
+        """
+        Loop of the producer: wait until the pool falls below the low watermark, then refill it.
+        The triplets of a refill are generated together without holding the lock, so retrievals
+        are not blocked.
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.stopped
+                    or (bool(self.participant_ids) and len(self.triplets) < self.low_watermark)
+                )
+                if self.stopped:
+                    return
+                participant_ids = self.participant_ids
+                count = self.high_watermark - len(self.triplets)
+
+            triplets = share_triplets(participant_ids, count, self.prime)
+            with self.condition:
+                # Triplets of previous participants are dropped.
+                if self.stopped or self.participant_ids != participant_ids:
+                    continue
+                triplets = triplets[:self.high_watermark - len(self.triplets)]
+                self.triplets.extend(triplets)
+                self.produced += len(triplets)
+
+
 class TrustedParamGenerator:
     """
     A trusted third party that generates random values for the Beaver triplet multiplication scheme.
+    The triplets are taken from a pool filled in advance, and bound to an operation on its first
+    retrieval.
+
+    Triplets can also be seeded: each client expands its shares from its seed, and only the
+    designated client, the first participant, receives its share of c as a correction.
+
+    The triplets are in the field of the given prime, which is the one of the pool if given.
     """
 
-    def __init__(self):
+    def __init__(self, pool: Optional[TriplePool] = None, prime: int = Share.prime):
         self.participant_ids: Set[str] = set()
-        self.triplet_map: Dict[str, Dict[str, Tuple[Share, Share, Share]]] = {}
+        self.triplet_map: Dict[str, TripletShares] = {}
+        self.pool = TriplePool(prime=prime) if pool is None else pool
+        self.prime = self.pool.prime
+        self.seeds: Dict[str, bytes] = {}
+        # Share of c of the designated client, for each operation with a seeded triplet.
+        self.corrections: Dict[str, int] = {}
+        # Only guards the binding of the triplets, which are generated without holding it.
+        self.lock = threading.Lock()
 
     def add_participant(self, participant_id: str) -> None:
         """
         Add a participant.
         """
         self.participant_ids.add(participant_id)
+        self.seeds[participant_id] = token_bytes(SEED_BYTES)
+        self.pool.reset(self.participant_ids)
+
+    def start(self) -> None:
+        """
+        Start generating triplets in the background, before they are retrieved.
+        """
+        self.pool.start()
+
+    def stop(self) -> None:
+        """
+        Stop generating triplets in the background.
+        """
+        self.pool.stop()
 
     def retrieve_share(self, client_id: str, op_id: str) -> Tuple[Share, Share, Share]:
         """
         Retrieve a triplet of shares for a given client_id.
+        Safe to call from concurrent requests: all the clients get shares of the same triplet.
         """
-        
-        if op_id not in self.triplet_map:
-            self.generate_triplet(op_id)
-        
-        return self.triplet_map[op_id][client_id]
 
+        # The shares of a seeded triplet are expanded as the client would.
+        correction = self.corrections.get(op_id)
+        if correction is not None:
+            return seeded_triplet(
+                self.seeds[client_id],
+                op_id,
+                correction if client_id == self.designated_id() else None,
+                self.prime
+            )
+
+        triplets = self.triplet_map.get(op_id)
+        if triplets is None:
+            triplets = self.generate_triplet(op_id)
+
+        return triplets[client_id]
+
+    def retrieve_shares(self, client_id: str, op_ids: List[str]) -> List[Tuple[Share, Share, Share]]:
+        """
+        Retrieve the triplets of shares of several operations for a client, e.g. of all the
+        elements of a gate. The triplets of the operations without one are taken from the pool
+        together.
+        """
+
+        unbound = [
+            op_id for op_id in dict.fromkeys(op_ids)
+            if op_id not in self.triplet_map and op_id not in self.corrections
+        ]
+        if unbound:
+            self.generate_triplets(unbound)
+        return [self.retrieve_share(client_id, op_id) for op_id in op_ids]
+
+
+    def preprocess(self, program: Program, seeded: bool = False) -> None:
+        """
+        Generate in advance the triplets of all the multiplications of a compiled program,
+        either explicit or seeded ones.
+        """
+
+        if seeded:
+            for op_id in program.beaver_op_ids:
+                self.seed_triplet(op_id)
+            return
+
+        unbound = [op_id for op_id in program.beaver_op_ids if op_id not in self.triplet_map]
+        if unbound:
+            self.generate_triplets(unbound)
+
+
+    def generate_triplet(self, op_id: str) -> TripletShares:
+        """
+        Bind a triplet of the pool to an operation, unless a concurrent request already bound
+        a triplet to it. Returns the shares of the bound triplet, indexed by client.
+        """
+
+        return self.generate_triplets([op_id])[0]
+
+    def generate_triplets(self, op_ids: List[str]) -> List[TripletShares]:
+        """
+        Bind triplets of the pool to several distinct operations at once, as generate_triplet.
+        """
+
+        triplets = self.pool.take_many(len(op_ids))
+
+        # Populate the map with the shares of the triplets, keeping the first triplet bound.
+        with self.lock:
+            for op_id in op_ids:
+                if op_id in self.corrections:
+                    raise ValueError(f"The operation {op_id} has a seeded triplet")
+            return [
+                self.triplet_map.setdefault(op_id, triplet)
+                for op_id, triplet in zip(op_ids, triplets)
+            ]
+
+    def designated_id(self) -> str:
+        """
+        Client receiving the corrections of the seeded triplets.
+        """
+        return min(self.participant_ids)
+
+    def retrieve_seeded(self, client_id: str, op_ids: List[str]) -> Tuple[bytes, Optional[List[int]]]:
+        """
+        Seed of a client, and the corrections of the triplets of the given operations if the client
+        is the designated one. The other clients expand all their shares from their seed.
+        """
+
+        corrections = [self.seed_triplet(op_id) for op_id in op_ids]
+        if client_id != self.designated_id():
+            return self.seeds[client_id], None
+        return self.seeds[client_id], corrections
+
+    def seed_triplet(self, op_id: str) -> int:
+        """
+        Bind a seeded triplet to an operation, unless it already has one. Returns the correction
+        of the designated client, which makes the shares of c add up to a * b.
+        """
+
+        correction = self.corrections.get(op_id)
+        if correction is not None:
+            return correction
+
+        p = self.prime
+        designated_id = self.designated_id()
+        a = sum(prg_value(seed, op_id, 0, p) for seed in self.seeds.values()) % p
+        b = sum(prg_value(seed, op_id, 1, p) for seed in self.seeds.values()) % p
+        other_c_shares = sum(
+            prg_value(seed, op_id, 2, p) for client_id, seed in self.seeds.items()
+            if client_id != designated_id
+        )
+        correction = (a * b - other_c_shares) % p
+
+        with self.lock:
+            if op_id in self.triplet_map:
+                raise ValueError(f"The operation {op_id} has an explicit triplet")
+            return self.corrections.setdefault(op_id, correction)
+
+    def metrics(self) -> PoolMetrics:
+        """
+        Measurements of the pool of triplets.
+        """
+        return self.pool.metrics()
+
+
+def share_triplet(participant_ids: Tuple[str, ...], prime: int = Share.prime) -> TripletShares:
+    """
+    Generate a Beaver triplet in the field of the given prime and share it between the participants.
+    """
+
+    return share_triplets(participant_ids, 1, prime)[0]
+
+
+def share_triplets(
+        participant_ids: Tuple[str, ...],
+        count: int,
+        prime: int = Share.prime
+    ) -> List[TripletShares]:
+    """
+    Generate several Beaver triplets and share them between the participants. The randomness of
+    all the triplets, a, b and the random shares, is drawn at once.
+    """
 
-    def generate_triplet(self, op_id: str):
+    p = prime
+    n = len(participant_ids)
+    per_triplet = 2 + 3 * (n - 1)
+    random_values = field_elements(count * per_triplet, p)
 
+    triplets = []
+    for start in range(0, count * per_triplet, per_triplet):
         # Generating the secrets a, b, and c for the Beaver triplet.
-        p = Share.prime
-        a = random.randint(0, p - 1)
-        b = random.randint(0, p - 1)
+        a, b = random_values[start:start + 2]
         c = (a * b) % p
 
-        # Creating the shares of the secrets 
-        a_shares = share_secret(a, len(self.participant_ids))
-        b_shares = share_secret(b, len(self.participant_ids))
-        c_shares = share_secret(c, len(self.participant_ids))
+        # Creating the shares of the secrets
+        shares_start = start + 2
+        a_shares = share_secret(a, n, p, random_values[shares_start:shares_start + n - 1])
+        shares_start += n - 1
+        b_shares = share_secret(b, n, p, random_values[shares_start:shares_start + n - 1])
+        shares_start += n - 1
+        c_shares = share_secret(c, n, p, random_values[shares_start:shares_start + n - 1])
 
-        # Populate the map with the shares of the triplet. Each client_id represents the share for that client. 
-        self.triplet_map[op_id] = {}
-        for i, client_id in enumerate(self.participant_ids):
-            self.triplet_map[op_id][client_id] = (a_shares[i], b_shares[i], c_shares[i])
-    
\ No newline at end of file
+        # Each client_id represents the share for that client.
+        triplets.append({
+            client_id: (a_shares[i], b_shares[i], c_shares[i])
+            for i, client_id in enumerate(participant_ids)
+        })
+    return triplets